@@ -0,0 +1,125 @@
+"""
+响应归档模块 — 保存原始查询响应，离线重放解析与写出
+
+每个 queryByCondition / 详情接口的 JSON 响应经 zlib 压缩后追加写入段文件（seg-000001.bin 等，
+超过大小上限后换新段，已写入的内容不再修改），SQLite 索引按 (单位, serviceType, dataId)
+记录所在段与偏移。--replay 从归档读取响应重新执行 process_response 与写出，不发起网络请求。
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import time
+import zlib
+from typing import Any, Dict, Iterator, List, Optional
+
+from constants import ARCHIVE_SEGMENT_BYTES
+from records import Record
+from utils import process_response
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    unit        TEXT,
+    serviceType INTEGER NOT NULL,
+    dataId      TEXT,              -- NULL 表示列表响应（queryByCondition）
+    segment     INTEGER NOT NULL,
+    offset      INTEGER NOT NULL,
+    length      INTEGER NOT NULL,
+    fetchedAt   REAL    NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_responses_unit ON responses(unit, serviceType, dataId);
+CREATE INDEX IF NOT EXISTS idx_responses_data_id ON responses(serviceType, dataId);
+"""
+
+
+class ResponseArchive:
+    """追加写入的压缩响应归档"""
+
+    def __init__(self, directory: str, segment_bytes: int = ARCHIVE_SEGMENT_BYTES, create: bool = True):
+        """
+        打开（create 为 True 时按需创建）归档目录
+
+        Raises:
+            FileNotFoundError: create 为 False 且目录中没有归档索引（如 --replay 的目录写错）
+        """
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        index_path = os.path.join(directory, "index.db")
+        if create:
+            os.makedirs(directory, exist_ok=True)
+        elif not os.path.isfile(index_path):
+            raise FileNotFoundError(f"归档索引不存在：{index_path}")
+        self.conn = sqlite3.connect(index_path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(_SCHEMA)
+        row = self.conn.execute("SELECT MAX(segment) FROM responses").fetchone()
+        self.segment = row[0] or 1
+        self._file = None
+        self.written = 0
+
+    def _segment_path(self, segment: int) -> str:
+        return os.path.join(self.directory, f"seg-{segment:06d}.bin")
+
+    def put(self, unit: Optional[str], service_type: int, data_id: Any, response: Dict[str, Any]) -> None:
+        """归档一个响应（data_id 为 None 表示列表响应）：先写段文件，再写索引"""
+        blob = zlib.compress(json.dumps(response, ensure_ascii=False, separators=(",", ":")).encode("utf-8"))
+        if self._file is None:
+            self._file = open(self._segment_path(self.segment), "ab")
+        if self._file.tell() and self._file.tell() + len(blob) > self.segment_bytes:
+            self._file.close()
+            self.segment += 1
+            self._file = open(self._segment_path(self.segment), "ab")
+        offset = self._file.tell()
+        self._file.write(blob)
+        self._file.flush()
+        self.conn.execute(
+            "INSERT INTO responses (unit, serviceType, dataId, segment, offset, length, fetchedAt) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (unit, service_type, None if data_id is None else str(data_id), self.segment, offset, len(blob), time.time()),
+        )
+        self.conn.commit()
+        self.written += 1
+
+    def _read(self, segment: int, offset: int, length: int) -> Dict[str, Any]:
+        with open(self._segment_path(segment), "rb") as f:
+            f.seek(offset)
+            return json.loads(zlib.decompress(f.read(length)))
+
+    def latest(self, unit: str, service_type: int) -> Optional[Dict[str, Any]]:
+        """单位在该类型下最近一次的列表响应"""
+        row = self.conn.execute(
+            "SELECT segment, offset, length FROM responses WHERE unit = ? AND serviceType = ? AND dataId IS NULL "
+            "ORDER BY rowid DESC LIMIT 1", (unit, service_type),
+        ).fetchone()
+        return self._read(*row) if row else None
+
+    def detail(self, service_type: int, data_id: Any) -> Optional[Dict[str, Any]]:
+        """dataId 最近一次的详情 params"""
+        row = self.conn.execute(
+            "SELECT segment, offset, length FROM responses WHERE serviceType = ? AND dataId = ? "
+            "ORDER BY rowid DESC LIMIT 1", (service_type, str(data_id)),
+        ).fetchone()
+        return self._read(*row).get("params") if row else None
+
+    def units(self) -> Iterator[str]:
+        """归档中出现过的全部单位（按首次归档顺序）"""
+        rows = self.conn.execute(
+            "SELECT unit FROM responses WHERE dataId IS NULL AND unit IS NOT NULL GROUP BY unit ORDER BY MIN(rowid)"
+        )
+        for (unit,) in rows:
+            yield unit
+
+    def replay(self, unit: str, service_type: int) -> Optional[List[Record]]:
+        """用归档的列表与详情响应重新执行 process_response；没有归档时返回 None"""
+        response = self.latest(unit, service_type)
+        if response is None:
+            return None
+        return process_response(response, service_type, lambda item: self.detail(service_type, item["dataId"]))
+
+    def close(self) -> None:
+        if self._file:
+            self._file.close()
+        self.conn.close()
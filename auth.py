@@ -8,13 +8,13 @@ import base64
 import hashlib
 import logging
 import random
+import threading
 import time
 import uuid
+from dataclasses import dataclass
 from typing import Any, Dict, Optional
 
-import requests
-import urllib3
-from urllib3.exceptions import InsecureRequestWarning
+from curl_cffi import requests as cffi_requests
 
 from captcha import Crack
 from constants import (
@@ -24,42 +24,166 @@ from constants import (
     MAX_AUTH_RETRIES,
     MAX_TOKEN_RETRIES,
     MAX_CAPTCHA_RETRIES,
-    USER_AGENTS,
     DEFAULT_TIMEOUT,
+    CREDENTIAL_STORE_PATH,
 )
-
-# 全局关闭未验证 HTTPS 请求的告警
-urllib3.disable_warnings(InsecureRequestWarning)
+from credential_store import CredentialStore
+from fingerprint import BrowserProfile, ProfilePool
+from utils import format_proxy
 
 logger = logging.getLogger(__name__)
 
 
+@dataclass
+class Credential:
+    """单个出口（代理或直连）的认证信息，只能与获取它时的出口和指纹配置一起使用"""
+    proxy: Optional[str]
+    profile: BrowserProfile
+    token: Optional[str] = None
+    sign: Optional[str] = None
+    uuid_token: Optional[str] = None
+    cookie: Optional[str] = None
+    issued_at: float = 0.0
+    version: int = 0  # 该出口的凭据版本，每次刷新加一；0 表示尚未认证
+
+    @property
+    def headers(self) -> Dict[str, str]:
+        return {
+            "Token": self.token or "",
+            "Sign": self.sign or "",
+            "Uuid": self.uuid_token or "",
+            "Cookie": self.cookie or "",
+        }
+
+
+def _default_field(name: str) -> property:
+    """把直连出口凭据的字段暴露为 AuthManager 属性（兼容旧接口）"""
+    return property(
+        lambda self: getattr(self._credential(None), name),
+        lambda self, value: setattr(self._credential(None), name, value),
+    )
+
+
 class AuthManager:
-    """认证管理器 — 处理工信部 ICP 接口的登录认证与滑块验证码"""
+    """
+    认证管理器 — 处理工信部 ICP 接口的登录认证与滑块验证码
+
+    proxy_affine=True 时每个代理出口各自持有一份凭据：认证与验证码请求经由该代理发出，
+    凭据按代理缓存，切换代理时直接使用该代理已有的凭据；否则所有出口共用直连获取的凭据。
+
+    刷新是单飞（single-flight）的：同一出口同时只有一个刷新在进行，其余调用方等待其完成；
+    调用方携带发送请求时的凭据版本，若该版本已被替换则直接使用新凭据，不再重复刷新。
+    指定 store_path 时凭据持久化到本地文件，在文件锁内刷新：其他进程或上次运行保存的
+    未过期凭据直接复用，多个进程同时启动也只有一个执行验证码。
+    """
 
     BASE_URL = "https://hlwicpfwc.miit.gov.cn/icpproject_query/api/"
 
-    def __init__(self):
+    token = _default_field("token")
+    sign = _default_field("sign")
+    uuid_token = _default_field("uuid_token")
+    cookie = _default_field("cookie")
+
+    def __init__(self, profile: Optional[BrowserProfile] = None, proxy_affine: bool = False,
+                 store_path: Optional[str] = CREDENTIAL_STORE_PATH):
         self.crack = Crack()
-        self.token: Optional[str] = None
-        self.sign: Optional[str] = None
-        self.uuid_token: Optional[str] = None
-        self.cookie: Optional[str] = None
-        self._reset_auth()  # 初始化认证信息
-
-    def _reset_auth(self) -> None:
-        """重置所有认证信息并重新初始化"""
-        self.token = None
-        self.sign = None
-        self.uuid_token = None
-        self.cookie = None
-        self._get_auth_token()     # 获取 Token
-        self._process_captcha()    # 处理滑块验证码
-        self._generate_cookie()    # 生成 Cookie
-
-    def _generate_cookie(self) -> None:
+        self.proxy_affine = proxy_affine
+        self.store = CredentialStore(store_path) if store_path else None
+        # 认证与查询共用指纹配置池：同一出口的 TLS 指纹与请求头始终一致
+        self.profiles = ProfilePool()
+        if profile:
+            self.profiles.assign(None, profile)
+        self._credentials: Dict[Optional[str], Credential] = {}
+        self._refresh_locks: Dict[Optional[str], threading.Lock] = {}
+        self._locks_guard = threading.Lock()
+        if not proxy_affine:
+            # 初始化认证信息（按代理认证时改为首次使用该代理时再认证）
+            self._shared_refresh(None, lambda: self._reset_auth(None))
+
+    def _egress(self, proxy: Optional[str]) -> Optional[str]:
+        """凭据所属的出口：按代理认证时为代理本身，否则统一为直连"""
+        return proxy if self.proxy_affine else None
+
+    @staticmethod
+    def _egress_label(proxy: Optional[str]) -> str:
+        return f"（代理 {proxy}）" if proxy else ""
+
+    def _credential(self, proxy: Optional[str]) -> Credential:
+        key = self._egress(proxy)
+        cred = self._credentials.get(key)
+        if cred is None:
+            cred = Credential(key, self.profiles.for_key(key))
+            self._credentials[key] = cred
+        return cred
+
+    def _refresh_lock(self, key: Optional[str]) -> threading.Lock:
+        with self._locks_guard:
+            return self._refresh_locks.setdefault(key, threading.Lock())
+
+    @property
+    def profile(self) -> BrowserProfile:
+        return self._credential(None).profile
+
+    def _reset_auth(self, proxy: Optional[str] = None) -> None:
+        """通过指定出口重新获取全部认证信息，成功后整体替换该出口的凭据（版本加一）"""
+        key = self._egress(proxy)
+        old = self._credentials.get(key)
+        cred = Credential(key, self.profiles.for_key(key))
+        self._get_auth_token(cred)     # 获取 Token
+        self._process_captcha(cred)    # 处理滑块验证码
+        self._generate_cookie(cred)    # 生成 Cookie
+        cred.issued_at = time.time()
+        cred.version = (old.version if old else 0) + 1
+        # 整体替换而不是原地修改：正在使用旧凭据的请求看到的始终是一组完整的 token/sign/uuid
+        self._credentials[key] = cred
+
+    def _adopt_stored(self, key: Optional[str]) -> bool:
+        """
+        采用持久化存储中该出口的凭据（其他进程或上次运行保存），返回是否采用
+
+        只采用未过期、指纹配置仍可用、且与本进程当前凭据不同的凭据（相同说明它正是失效的那一份）。
+        """
+        stored = self.store.load(key) if self.store else None
+        if stored is None:
+            return False
+        current = self._credentials.get(key)
+        if current is not None and current.token == stored["token"]:
+            return False
+        profile = self.profiles.find(stored["profile"])
+        if profile is None:
+            return False
+        cred = Credential(
+            key, profile, stored["token"], stored["sign"], stored["uuid_token"], stored.get("cookie"),
+            issued_at=stored["issued_at"], version=(current.version if current else 0) + 1,
+        )
+        self.profiles.assign(key, profile)
+        self._credentials[key] = cred
+        logger.info(f"复用已保存的凭据{self._egress_label(key)}（已签发 {time.time() - cred.issued_at:.0f} 秒）")
+        return True
+
+    def _shared_refresh(self, key: Optional[str], refresh) -> None:
+        """
+        跨进程单飞：持有该出口的文件锁时先尝试复用已保存的凭据，否则执行 refresh 并保存结果
+
+        锁只覆盖一次认证尝试；失败后的退避等待由调用方在锁外进行，其他进程可在此期间接手。
+        """
+        if not self.store:
+            refresh()
+            return
+        with self.store.lock(key):
+            if self._adopt_stored(key):
+                return
+            refresh()
+            cred = self._credentials[key]
+            self.store.save(key, {
+                "token": cred.token, "sign": cred.sign, "uuid_token": cred.uuid_token,
+                "cookie": cred.cookie, "issued_at": cred.issued_at, "profile": cred.profile.name,
+            })
+
+    @staticmethod
+    def _generate_cookie(cred: Credential) -> None:
         """生成随机 Cookie"""
-        self.cookie = f"__jsluid_s={uuid.uuid4().hex[:32]}"
+        cred.cookie = f"__jsluid_s={uuid.uuid4().hex[:32]}"
 
     @staticmethod
     def _auth_key(account: str, secret: str, ts_ms: int) -> str:
@@ -67,8 +191,20 @@ class AuthManager:
             f"{account}{secret}{ts_ms}".encode("utf-8")
         ).hexdigest()
 
-    def _get_auth_token(self) -> None:
-        """获取认证 Token（与 icp-query-tool 一致，使用 requests）"""
+    def _post(self, cred: Credential, url: str, headers: Dict[str, str], **kwargs: Any):
+        """经由凭据所属出口、以其指纹配置发送请求（headers 覆盖配置中的同名请求头）"""
+        return cffi_requests.post(
+            url,
+            headers=cred.profile.headers(headers),
+            impersonate=cred.profile.impersonate,
+            proxies=format_proxy(cred.proxy) if cred.proxy else None,
+            timeout=DEFAULT_TIMEOUT,
+            verify=False,
+            **kwargs,
+        )
+
+    def _get_auth_token(self, cred: Credential) -> None:
+        """获取认证 Token（与 icp-query-tool 一致）"""
         ts_ms = int(time.time() * 1000)
         payload = {
             "authKey": self._auth_key("test", "test", ts_ms),
@@ -76,18 +212,11 @@ class AuthManager:
         }
 
         # 同 icp-query-tool 的 auth 方法：使用 urlencoded 格式
-        resp = requests.post(
+        resp = self._post(
+            cred,
             AUTH_URL,
+            {"Content-Type": "application/x-www-form-urlencoded"},
             data=payload,
-            headers={
-                "User-Agent": USER_AGENTS[0],
-                "Content-Type": "application/x-www-form-urlencoded",
-                "Origin": "https://beian.miit.gov.cn",
-                "Referer": "https://beian.miit.gov.cn/",
-                "Accept": "application/json, text/plain, */*",
-            },
-            timeout=DEFAULT_TIMEOUT,
-            verify=False,
         )
         if resp.status_code == 403:
             raise RuntimeError(
@@ -101,37 +230,27 @@ class AuthManager:
         req_token = params.get("token") or params.get("bussiness")
         if not req_token:
             raise RuntimeError(f"auth response missing token: {data}")
-        self.token = req_token
+        cred.token = req_token
         logger.info(
-            f"Token 获取成功: {self.token[:10]}...{self.token[-10:]}"
+            f"Token 获取成功{self._egress_label(cred.proxy)}: {cred.token[:10]}...{cred.token[-10:]}"
         )
 
-    def _process_captcha(self) -> None:
+    def _process_captcha(self, cred: Credential) -> None:
         """处理滑块验证码（从 icp-query-tool 移植，带重试机制）"""
-        if not self.token:
+        if not cred.token:
             raise ValueError("Token 未初始化，无法处理验证码")
 
         # 内层重试：验证码识别失败时自动重新获取验证码
         for captcha_attempt in range(1, MAX_CAPTCHA_RETRIES + 1):
             try:
-                headers = {
-                    "User-Agent": USER_AGENTS[0],
-                    "Referer": "https://beian.miit.gov.cn/",
-                    "Token": self.token,
-                    "Connection": "keep-alive",
-                    "Accept": "application/json, text/plain, */*",
-                    "Accept-Encoding": "gzip, deflate, br",
-                    "Accept-Language": "zh-CN,zh;q=0.9",
-                    "Origin": "https://beian.miit.gov.cn",
-                }
+                headers = {"Token": cred.token}
 
                 client_uid = f"point-{uuid.uuid4()}"
-                resp = requests.post(
+                resp = self._post(
+                    cred,
                     CAPTCHA_IMAGE_URL,
-                    headers=headers,
+                    headers,
                     json={"clientUid": client_uid},
-                    timeout=DEFAULT_TIMEOUT,
-                    verify=False,
                 )
                 if resp.status_code != 200:
                     raise Exception(
@@ -150,20 +269,19 @@ class AuthManager:
                 big_img = base64.b64decode(big_b64)
                 small_img = base64.b64decode(small_b64)
                 offset = self.crack.calc_offset(big_img, small_img)
-                self.uuid_token = params.get("uuid", "")
+                cred.uuid_token = params.get("uuid", "")
 
                 logger.debug(f"滑块偏移量: {offset}")
 
                 # 提交验证
-                check_resp = requests.post(
+                check_resp = self._post(
+                    cred,
                     CAPTCHA_CHECK_URL,
-                    headers=headers,
+                    headers,
                     json={
-                        "key": self.uuid_token,
+                        "key": cred.uuid_token,
                         "value": str(offset),
                     },
-                    timeout=DEFAULT_TIMEOUT,
-                    verify=False,
                 )
                 if check_resp.status_code != 200:
                     raise Exception(
@@ -179,10 +297,10 @@ class AuthManager:
                 # 成功：保存 sign
                 check_params = check_data.get("params")
                 if isinstance(check_params, dict):
-                    self.sign = check_params.get("sign", "")
+                    cred.sign = check_params.get("sign", "")
                 else:
-                    self.sign = check_params or ""
-                if not self.sign:
+                    cred.sign = check_params or ""
+                if not cred.sign:
                     raise Exception(
                         f"验证码验证成功但 sign 缺失: {check_data}"
                     )
@@ -214,13 +332,30 @@ class AuthManager:
                         f"{error_msg}"
                     )
 
-    def update_headers(self) -> None:
-        """更新认证信息（带重试机制）"""
-        max_retries = 10
+    def update_headers(self, proxy: Optional[str] = None, stale_version: Optional[int] = None) -> None:
+        """
+        更新指定出口的认证信息（带重试机制）；未按代理认证时刷新全局凭据
+
+        stale_version 为调用方请求失败时所用的凭据版本：等到刷新锁后若当前版本已不同，
+        说明其他调用方已经完成刷新，直接返回。
+        """
+        key = self._egress(proxy)
+        with self._refresh_lock(key):
+            current = self._credentials.get(key)
+            if stale_version is not None and current is not None and current.version != stale_version:
+                logger.debug(f"凭据已由其他请求刷新（v{stale_version} -> v{current.version}）")
+                return
+            self._update_locked(key)
+
+    def _update_locked(self, key: Optional[str]) -> None:
+        """在持有该出口的进程内刷新锁时执行带重试的认证（每次尝试单独获取跨进程文件锁）"""
+        # 直连认证失败没有其他出口可用，多重试几次；代理出口失败由调用方切换代理
+        max_retries = 10 if key is None else MAX_AUTH_RETRIES
+        label = self._egress_label(key)
         for attempt in range(1, max_retries + 1):
             try:
-                logger.info(f"\n▶ 认证尝试 {attempt}/{max_retries}")
-                self._reset_auth()
+                logger.info(f"\n▶ 认证尝试{label} {attempt}/{max_retries}")
+                self._shared_refresh(key, lambda: self._reset_auth(key))
                 logger.info("✅ 认证成功")
                 return
             except Exception as e:
@@ -231,39 +366,61 @@ class AuthManager:
                     time.sleep(delay)
 
         raise RuntimeError(
-            "❗ 无法完成认证，请检查：\n1. 网络连接\n2. 验证码识别服务\n3. 目标网站状态"
+            f"❗ 无法完成认证{label}，请检查：\n1. 网络连接\n2. 验证码识别服务\n3. 目标网站状态"
         )
 
+    def has_credential(self, proxy: Optional[str]) -> bool:
+        """经由该出口发送请求时是否已有可直接使用的凭据（为 False 时 credential_for 会先认证）"""
+        key = self._egress(proxy)
+        cred = self._credentials.get(key)
+        return cred is not None and bool(cred.token) and cred.profile == self.profiles.for_key(key)
+
+    def credential_for(self, proxy: Optional[str]) -> Credential:
+        """
+        获取经由指定出口发送请求时使用的凭据（含版本号）
+
+        该出口还没有凭据、或其指纹配置已被停用时，先通过该出口完成认证（单飞）。
+        """
+        key = self._egress(proxy)
+        cred = self._credentials.get(key)
+        if not self.has_credential(proxy):
+            self.update_headers(key, stale_version=cred.version if cred else 0)
+            cred = self._credentials[key]
+        return cred
+
+    def refresh_stale(self, max_age: float) -> int:
+        """主动刷新签发时间超过 max_age 秒的凭据（常驻服务保持凭据新鲜），返回刷新的出口数"""
+        refreshed = 0
+        for key, cred in list(self._credentials.items()):
+            if cred.version and time.time() - cred.issued_at > max_age:
+                logger.info(f"凭据{self._egress_label(key)}已使用 {time.time() - cred.issued_at:.0f} 秒，主动刷新")
+                self.update_headers(key, stale_version=cred.version)
+                refreshed += 1
+        return refreshed
+
+    def headers_for(self, proxy: Optional[str]) -> Dict[str, str]:
+        """获取经由指定出口发送请求时使用的认证头"""
+        return self.credential_for(proxy).headers
+
     @property
     def headers(self) -> Dict[str, str]:
-        """获取当前认证头信息"""
-        return {
-            "Token": self.token or "",
-            "Sign": self.sign or "",
-            "Uuid": self.uuid_token or "",
-            "Cookie": self.cookie or "",
-        }
+        """获取当前认证头信息（直连出口）"""
+        return self._credential(None).headers
 
     # ── 以下是向后兼容的辅助方法（供外部直接使用，类似 icp-query-tool 的 MiitIcpAutoClient） ──
 
     def get_check_images(self, client_uid: str | None = None) -> dict[str, Any]:
         """获取验证码图片（兼容 icp-query-tool 接口）"""
-        if not self.token:
-            self._get_auth_token()
+        cred = self._credential(None)
+        if not cred.token:
+            self._get_auth_token(cred)
         if not client_uid:
             client_uid = str(uuid.uuid4())
-        resp = requests.post(
+        resp = self._post(
+            cred,
             CAPTCHA_IMAGE_URL,
+            {"Token": self.token},
             json={"clientUid": client_uid},
-            headers={
-                "User-Agent": USER_AGENTS[0],
-                "Referer": "https://beian.miit.gov.cn/",
-                "Token": self.token,
-                "Accept": "application/json, text/plain, */*",
-                "Origin": "https://beian.miit.gov.cn",
-            },
-            timeout=DEFAULT_TIMEOUT,
-            verify=False,
         )
         resp.raise_for_status()
         data = resp.json()
@@ -285,12 +442,11 @@ class AuthManager:
         small_img_bytes = base64.b64decode(small_b64)
         offset = self.crack.calc_offset(big_img_bytes, small_img_bytes)
 
-        resp = requests.post(
+        resp = self._post(
+            self._credential(None),
             CAPTCHA_CHECK_URL,
+            {"Token": self.token},
             json={"key": self.uuid_token, "value": str(offset)},
-            headers={"Token": self.token},
-            timeout=DEFAULT_TIMEOUT,
-            verify=False,
         )
         resp.raise_for_status()
         data = resp.json()
@@ -0,0 +1,330 @@
+"""
+基准测试 — 离线测量结果处理路径的耗时与内存
+
+使用合成的 API 响应（经 JSON 编解码，字符串对象与真实响应一样互不共享），不发起网络请求。
+
+    python benchmark.py --rows 100000
+    python benchmark.py --rows 100000 --export
+    python benchmark.py --suite --sizes 10000,100000 --save-baseline bench_baseline.json
+    python benchmark.py --suite --compare bench_baseline.json
+"""
+
+import argparse
+import json
+import os
+import tempfile
+import time
+import sys
+import tracemalloc
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from utils import process_response, generate_modern_headers, format_proxy
+
+ROWS_PER_PAGE = 100  # 与主查询 pageSize 一致
+ROWS_PER_UNIT = 200  # 每个单位的记录数，决定 unitName/mainLicence 的重复程度
+
+
+def make_pages(rows: int, service_type: int) -> List[bytes]:
+    """生成合成的 queryByCondition 响应（JSON 字节串，每页 ROWS_PER_PAGE 条）"""
+    pages = []
+    for start in range(0, rows, ROWS_PER_PAGE):
+        items = []
+        for i in range(start, min(start + ROWS_PER_PAGE, rows)):
+            unit = i // ROWS_PER_UNIT
+            item = {
+                "unitName": f"测试科技（深圳）有限公司{unit}",
+                "mainLicence": f"粤ICP备{10000000 + unit}号",
+                "serviceLicence": f"粤ICP备{10000000 + unit}号-{i % ROWS_PER_UNIT + 1}",
+                "updateRecordTime": "2024-01-01 00:00:00",
+            }
+            if service_type == 1:
+                item["domain"] = f"site{i}.example.com"
+            else:
+                item["dataId"] = 100000 + i
+            items.append(item)
+        pages.append(json.dumps({"success": True, "params": {"list": items}}, ensure_ascii=False).encode())
+    return pages
+
+
+def fake_detail(item: Dict[str, Any]) -> Dict[str, Any]:
+    """模拟详情接口返回（不发起请求）"""
+    return {"mainLicence": item["mainLicence"], "serviceName": f"应用{item['dataId']}"}
+
+
+def legacy_rows(response_data: Dict[str, Any], service_type: int) -> List[Dict[str, Any]]:
+    """改用记录类之前的逐行 dict 结构，作为对照组"""
+    results = []
+    for item in response_data["params"]["list"]:
+        result = {
+            "queryName": "测试输入",
+            "unitName": item.get("unitName"),
+            "mainLicence": item.get("mainLicence"),
+            "serviceLicence": item.get("serviceLicence"),
+            "updateRecordTime": item.get("updateRecordTime"),
+        }
+        if service_type == 1:
+            result["domain"] = item.get("domain")
+        else:
+            detail = fake_detail(item)
+            result["dataId"] = item.get("dataId")
+            result["mainLicence"] = detail.get("mainLicence", result["mainLicence"])
+            result["serviceName"] = detail.get("serviceName", "")
+        results.append(result)
+    return results
+
+
+def record_rows(response_data: Dict[str, Any], service_type: int) -> list:
+    records = process_response(response_data, service_type, fake_detail)
+    for r in records:
+        r.queryName = "测试输入"
+    return records
+
+
+def measure_retained(pages: List[bytes], service_type: int,
+                     build: Callable[[Dict[str, Any], int], list]) -> Tuple[float, int, int]:
+    """逐页解码并累积结果（与批量查询一致），返回 (耗时秒, 保留内存字节, 峰值内存字节)"""
+    tracemalloc.start()
+    start = time.perf_counter()
+    retained: list = []
+    for page in pages:
+        retained.extend(build(json.loads(page), service_type))
+    elapsed = time.perf_counter() - start
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del retained
+    return elapsed, current, peak
+
+
+def bench_records(rows: int) -> None:
+    print(f"结果记录内存对比（{rows} 行，每单位 {ROWS_PER_UNIT} 行）")
+    print(f"{'类型':<8}{'结构':<10}{'耗时(s)':>10}{'保留(MB)':>12}{'峰值(MB)':>12}{'字节/行':>10}")
+    for label, service_type in (("web", 1), ("app", 6)):
+        pages = make_pages(rows, service_type)
+        for name, build in (("dict", legacy_rows), ("record", record_rows)):
+            elapsed, current, peak = measure_retained(pages, service_type, build)
+            print(f"{label:<8}{name:<10}{elapsed:>10.3f}{current / 2**20:>12.1f}"
+                  f"{peak / 2**20:>12.1f}{current / rows:>10.0f}")
+
+
+def bench_export(rows: int, workdir: str) -> None:
+    """对比 Excel（openpyxl）与 Parquet 写出的耗时与文件大小"""
+    from parquet_sink import ParquetSink
+    from utils import write_to_excel
+
+    records = []
+    for page in make_pages(rows, 1):
+        records.extend(record_rows(json.loads(page), 1))
+
+    print(f"\n结果导出对比（web，{rows} 行）")
+    print(f"{'格式':<10}{'耗时(s)':>10}{'峰值(MB)':>12}{'文件(MB)':>12}")
+
+    def run(name: str, write: Callable[[], str]) -> None:
+        tracemalloc.start()
+        start = time.perf_counter()
+        path = write()
+        elapsed = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(f"{name:<10}{elapsed:>10.2f}{peak / 2**20:>12.1f}{os.path.getsize(path) / 2**20:>12.2f}")
+
+    def excel() -> str:
+        path = os.path.join(workdir, "bench.xlsx")
+        write_to_excel({"web": records}, path)
+        return path
+
+    def parquet() -> str:
+        sink = ParquetSink(os.path.join(workdir, "bench.parquet"))
+        # 按主查询页大小逐批追加，与批量查询时的增量写出一致
+        for i in range(0, len(records), ROWS_PER_PAGE):
+            sink.add("web", records[i:i + ROWS_PER_PAGE])
+        sink.close()
+        return sink.path_for("web")
+
+    run("xlsx", excel)
+    run("parquet", parquet)
+
+
+# ── 分阶段微基准：每个阶段先准备输入（不计时），再计时执行；结果可保存为基线并对比 ──
+
+class _MockResponse:
+    status_code = 200
+
+    def __init__(self, body: bytes):
+        self._body = body
+
+    def json(self) -> Dict[str, Any]:
+        return json.loads(self._body)
+
+
+class _MockAuth:
+    """替代 AuthManager：固定凭据，不发起认证"""
+
+    def credential_for(self, proxy: Optional[str]) -> SimpleNamespace:
+        return SimpleNamespace(headers={"Token": "t" * 32, "Sign": "s" * 32, "Uuid": "u" * 32, "Cookie": "c"}, version=1)
+
+    def update_headers(self, proxy: Optional[str] = None, stale_version: Optional[int] = None) -> None:
+        pass
+
+
+def _stage_json_decode(rows: int) -> Callable[[], Any]:
+    pages = make_pages(rows, 1)
+    return lambda: [json.loads(page) for page in pages]
+
+
+def _stage_process_web(rows: int) -> Callable[[], Any]:
+    pages = [json.loads(page) for page in make_pages(rows, 1)]
+    return lambda: [process_response(page, 1) for page in pages]
+
+
+def _stage_process_app(rows: int) -> Callable[[], Any]:
+    pages = [json.loads(page) for page in make_pages(rows, 6)]
+    return lambda: [process_response(page, 6, fake_detail) for page in pages]
+
+
+def _stage_headers(rows: int) -> Callable[[], Any]:
+    auth = _MockAuth().credential_for(None).headers
+    return lambda: [generate_modern_headers(auth) for _ in range(rows)]
+
+
+def _stage_format_proxy(rows: int) -> Callable[[], Any]:
+    proxies = [f"10.0.{i // 256 % 256}.{i % 256}:8080" if i % 2 else f"socks5://10.1.0.{i % 256}:1080"
+               for i in range(rows)]
+    return lambda: [format_proxy(p) for p in proxies]
+
+
+def _stage_query_mocked(rows: int) -> Callable[[], Any]:
+    """QueryClient.query 全流程（代理轮换、指纹请求头、响应处理），HTTP 替换为内存响应"""
+    import query
+
+    bodies = make_pages(rows, 1)
+    client = query.QueryClient(_MockAuth(), [f"10.0.0.{i}:8080" for i in range(1, 9)], proxy_rotate=5)
+
+    def run() -> list:
+        original = query.cffi_requests
+        it = iter(bodies)
+        session = SimpleNamespace(post=lambda url, **kw: _MockResponse(next(it)), cookies={})
+        query.cffi_requests = SimpleNamespace(Session=lambda **kw: session)
+        try:
+            return [client.query(f"单位{i}", 1) for i in range(len(bodies))]
+        finally:
+            query.cffi_requests = original
+            client._sessions.clear()  # 下一轮使用新的响应序列
+    return run
+
+
+def _stage_write_excel(rows: int) -> Callable[[], Any]:
+    import pandas, openpyxl  # noqa: F401  缺少时在准备阶段跳过，而不是计时中途失败
+    from utils import write_to_excel
+
+    records = []
+    for page in make_pages(rows, 1):
+        records.extend(record_rows(json.loads(page), 1))
+
+    def run() -> None:
+        with tempfile.TemporaryDirectory() as workdir:
+            write_to_excel({"web": records}, os.path.join(workdir, "bench.xlsx"))
+    return run
+
+
+STAGES: Dict[str, Callable[[int], Callable[[], Any]]] = {
+    "json_decode": _stage_json_decode,
+    "process_web": _stage_process_web,
+    "process_app": _stage_process_app,
+    "headers": _stage_headers,
+    "format_proxy": _stage_format_proxy,
+    "query_mocked": _stage_query_mocked,
+    "write_excel": _stage_write_excel,
+}
+
+
+def measure_stage(run: Callable[[], Any], repeat: int) -> Dict[str, float]:
+    """耗时取 repeat 次中的最小值（不开启 tracemalloc），峰值内存另行单独测量一次"""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        best = min(best, time.perf_counter() - start)
+    tracemalloc.start()
+    run()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"seconds": best, "peak_mb": peak / 2**20}
+
+
+def run_suite(stages: List[str], sizes: List[int], repeat: int) -> Dict[str, Dict[str, float]]:
+    results: Dict[str, Dict[str, float]] = {}
+    for name in stages:
+        for rows in sizes:
+            try:
+                run = STAGES[name](rows)
+            except ImportError as e:
+                print(f"{name}@{rows}: 跳过（缺少依赖 {e.name}）")
+                break
+            # 写 Excel 单次已足够稳定且耗时较长，不重复
+            results[f"{name}@{rows}"] = measure_stage(run, 1 if name == "write_excel" else repeat)
+            del run
+    return results
+
+
+def report_suite(results: Dict[str, Dict[str, float]], baseline: Optional[Dict[str, Dict[str, float]]],
+                 tolerance: float) -> int:
+    """打印结果（有基线时附带对比），返回超过容差的回归项数"""
+    regressions = 0
+    header = f"{'阶段@规模':<26}{'耗时(s)':>10}{'峰值(MB)':>10}"
+    print(header + (f"{'基线(s)':>10}{'比值':>8}" if baseline else ""))
+    for key, m in results.items():
+        line = f"{key:<26}{m['seconds']:>10.4f}{m['peak_mb']:>10.1f}"
+        base = (baseline or {}).get(key)
+        if base:
+            ratio = m["seconds"] / base["seconds"] if base["seconds"] else 1.0
+            line += f"{base['seconds']:>10.4f}{ratio:>8.2f}"
+            if ratio > 1 + tolerance:
+                regressions += 1
+                line += "  回归"
+        print(line)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ICP 查询结果处理基准测试（离线）")
+    parser.add_argument("--rows", type=int, default=100000, help="合成记录行数")
+    parser.add_argument("--export", action="store_true", help="同时对比 Excel 与 Parquet 导出（需要 pandas/openpyxl/pyarrow）")
+    parser.add_argument("--suite", action="store_true", help="运行分阶段微基准（JSON 解码、响应处理、请求头、代理格式化、模拟查询、写 Excel）")
+    parser.add_argument("--stages", default=",".join(STAGES), help=f"微基准阶段，逗号分隔（默认全部：{','.join(STAGES)}）")
+    parser.add_argument("--sizes", default="10000,100000", help="微基准规模（行数/调用次数），逗号分隔，例如 10000,100000,1000000")
+    parser.add_argument("--repeat", type=int, default=3, help="每个阶段的计时次数，取最小值（默认 3）")
+    parser.add_argument("--save-baseline", metavar="PATH", help="把微基准结果保存为基线 JSON")
+    parser.add_argument("--compare", metavar="PATH", help="与基线 JSON 对比，耗时超过容差时以非零状态退出")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="对比基线时允许的耗时增幅（默认 0.2，即 20%%）")
+    args = parser.parse_args()
+
+    if args.suite:
+        stages = [s for s in args.stages.split(",") if s]
+        unknown = [s for s in stages if s not in STAGES]
+        if unknown:
+            parser.error(f"未知阶段：{','.join(unknown)}")
+        results = run_suite(stages, [int(n) for n in args.sizes.split(",")], args.repeat)
+        baseline = None
+        if args.compare:
+            with open(args.compare, encoding="utf-8") as f:
+                baseline = json.load(f)["results"]
+        regressions = report_suite(results, baseline, args.tolerance)
+        if args.save_baseline:
+            with open(args.save_baseline, "w", encoding="utf-8") as f:
+                json.dump({"python": sys.version.split()[0], "created": time.strftime("%Y-%m-%d %H:%M:%S"),
+                           "results": results}, f, ensure_ascii=False, indent=2)
+            print(f"基线已保存至：{args.save_baseline}")
+        if regressions:
+            print(f"{regressions} 项超过基线 {args.tolerance:.0%}")
+            sys.exit(1)
+        return
+
+    bench_records(args.rows)
+    if args.export:
+        with tempfile.TemporaryDirectory() as workdir:
+            bench_export(args.rows, workdir)
+
+
+if __name__ == "__main__":
+    main()
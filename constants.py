@@ -18,12 +18,71 @@ MAX_CAPTCHA_RETRIES = 5  # 滑块验证码识别失败时的最大重试次数
 MAX_DETAIL_QUERY_RETRIES = 3  # 详情查询失败时的最大重试次数
 MAX_MAIN_QUERY_RETRIES = 3  # 主查询失败时的最大重试次数（未使用代理时）
 
+# 批量查询调度（失败任务进入延迟重试队列，不阻塞后续单位）
+WORK_TRY_REQUESTS = 3  # 每个任务单次执行（列表与全部详情请求合计）最多允许的失败请求数
+MAX_WORK_ATTEMPTS = 4  # 每个任务最多执行次数，仍失败则写入死信文件
+RETRY_BASE_DELAY = 30  # 首次重试延迟（秒），之后按指数退避
+RETRY_MAX_DELAY = 600  # 重试延迟上限（秒）
+
+# 凭据持久化（跨进程 / 跨运行复用未过期的 token）
+CREDENTIAL_STORE_PATH = "credentials.json"
+CREDENTIAL_TTL = 1800  # 凭据签发后复用的最长时间（秒），超过后重新认证
+
+# 对冲请求（--hedge）
+HEDGE_WINDOW = 200  # 统计请求耗时的滚动窗口（次）
+HEDGE_MIN_SAMPLES = 20  # 样本少于该数量时不对冲
+HEDGE_QUANTILE = 0.9  # 请求超过该分位数耗时仍未返回时对冲
+HEDGE_BUDGET = 0.1  # 对冲次数上限占总请求数的比例
+HEDGE_WORKERS = 8  # 发送主请求与对冲请求的线程数（仅在可能对冲时使用）
+
+# 响应归档（--archive / --replay）
+ARCHIVE_SEGMENT_BYTES = 64 * 2**20  # 单个段文件大小上限（字节），超过后换新段
+
 # 请求配置
 DEFAULT_TIMEOUT = 6  # 超时时间（秒），调整为6秒以应对慢速网络和限流场景
-USER_AGENTS = [
-    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/122.0.0.0 Safari/537.36",
-    "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/123.0.0.0 Safari/537.36"
-]
+
+# 浏览器指纹配置
+PROFILE_MIN_SAMPLES = 20  # 至少积累多少次请求后才评估配置的 403 比例
+PROFILE_MAX_403_RATE = 0.5  # 403 比例超过该值的指纹配置被停用
+
+# 输入配置
+INPUT_PREFETCH_SIZE = 1000  # 批量输入预读队列上限（条），队列满时读取线程阻塞
+
+# 本地结果库
+RESULTS_DB_PATH = "icp_results.db"
+
+# Parquet 输出
+PARQUET_ROW_GROUP_SIZE = 50000  # 每个行组的行数，缓冲满即写出
+
+# 监控模式
+MONITOR_WINDOW = 86400  # 一轮复查的时间窗口（秒），窗口内均匀分摊所有查询
+MONITOR_EVENTS_PATH = "events.jsonl"
+MONITOR_MIN_GAP = 3.0  # 相邻两次复查之间的最小间隔（秒），某次复查超时后不会连续补发积压的查询
+
+# 常驻查询服务（main.py serve）
+SERVE_HOST = "127.0.0.1"
+SERVE_PORT = 8765
+SERVE_CACHE_TTL = 3600  # 查询结果缓存时间（秒）
+SERVE_CACHE_MAX = 10000  # 缓存条目上限，超出时淘汰最早写入的条目
+SERVE_UPSTREAM_CONCURRENCY = 4  # 同时进行的上游查询数上限（不同单位并行，相同单位合并）
+SERVE_UPSTREAM_WAIT = 30  # 等待上游查询名额的最长时间（秒），超时返回 503
+SERVE_AUTH_MAX_AGE = 1800  # 凭据签发超过该时间（秒）后在后台主动刷新
+
+# 代理池
+PROXY_FILE = "proxy.txt"
+PROXY_RELOAD_INTERVAL = 5  # 检查 proxy.txt 是否修改的最小间隔（秒）
+PROXY_MAX_FAILURES = 5  # 代理连续失败（异常或 403）该次数后停用
+PROXY_POOL_MIN_SIZE = 2  # 可用代理少于该数量时从提供方补充
+PROXY_REFILL_INTERVAL = 30  # 两次向提供方补充代理的最小间隔（秒）
+PROXY_PROVIDER_TIMEOUT = 20  # 提供方命令 / HTTP 请求超时（秒）
+
+# 域名解析（--resolve）
+DNS_RESOLVER = "223.5.5.5"  # 递归解析服务器，可用 --dns-resolver 指定（host 或 host:port）
+DNS_CONCURRENCY = 50  # 同时解析的域名数上限
+DNS_TIMEOUT = 2  # 单次 UDP 查询超时（秒）
+DNS_RETRIES = 2  # 超时或服务器错误时的重试次数
+DNS_NEGATIVE_TTL = 300  # 无记录 / NXDOMAIN 应答的缓存时间（秒）
+DNS_CACHE_PATH = "dns_cache.json"
 
 # 代理测试地址
 PROXY_TEST_URL = "http://icanhazip.com"
@@ -0,0 +1,105 @@
+"""
+凭据持久化模块 — 跨进程、跨运行共享仍在有效期内的认证凭据
+
+凭据（Token/Sign/Uuid/Cookie、签发时间、指纹配置）按出口保存在本地 JSON 文件中。
+刷新在该出口自己的文件锁（POSIX 为 fcntl，Windows 为 msvcrt）内进行：同时启动的多个进程
+对同一出口只有一个会执行认证与验证码，其余进程等待后直接复用其结果；不同出口互不阻塞。
+写入文件时另持一个只覆盖读-改-写过程的短锁。
+"""
+
+import hashlib
+import json
+import logging
+import os
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional
+
+from constants import CREDENTIAL_STORE_PATH, CREDENTIAL_TTL
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+logger = logging.getLogger(__name__)
+
+DIRECT_KEY = "direct"  # 直连出口在文件中的键名
+
+
+def _key(proxy: Optional[str]) -> str:
+    return proxy or DIRECT_KEY
+
+
+@contextmanager
+def _file_lock(path: str) -> Iterator[None]:
+    """进程间互斥锁（阻塞等待）；进程退出时由操作系统自动释放"""
+    with open(path, "a+b") as f:
+        if fcntl:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:  # LK_LOCK 约 10 秒后仍未获得锁会报错，继续等待
+                    continue
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+class CredentialStore:
+    """带文件锁的凭据存储"""
+
+    def __init__(self, path: str = CREDENTIAL_STORE_PATH, ttl: float = CREDENTIAL_TTL):
+        self.path = path
+        self.ttl = ttl
+
+    def lock_path(self, proxy: Optional[str]) -> str:
+        """出口的刷新锁文件（代理地址含 : / 等字符，按摘要命名）"""
+        digest = hashlib.sha1(_key(proxy).encode("utf-8")).hexdigest()[:12]
+        return f"{self.path}.{digest}.lock"
+
+    def lock(self, proxy: Optional[str]):
+        """出口的进程间刷新锁（阻塞等待）：只与刷新同一出口的进程互斥"""
+        return _file_lock(self.lock_path(proxy))
+
+    def _read(self) -> Dict[str, Dict[str, Any]]:
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            logger.warning(f"凭据文件读取失败，忽略：{e}")
+            return {}
+
+    def load(self, proxy: Optional[str]) -> Optional[Dict[str, Any]]:
+        """读取出口的凭据，未过期且字段完整时返回，否则返回 None"""
+        entry = self._read().get(_key(proxy))
+        if not entry or not all(entry.get(k) for k in ("token", "sign", "uuid_token", "profile")):
+            return None
+        if time.time() - entry.get("issued_at", 0) >= self.ttl:
+            return None
+        return entry
+
+    def save(self, proxy: Optional[str], entry: Dict[str, Any]) -> None:
+        """写入出口的凭据并清理过期条目（整体替换文件，仅所有者可读写）"""
+        # 不同出口的刷新可能同时保存，读-改-写在文件锁内完成，避免互相覆盖
+        with _file_lock(self.path + ".lock"):
+            now = time.time()
+            data = {k: v for k, v in self._read().items() if now - v.get("issued_at", 0) < self.ttl}
+            data[_key(proxy)] = entry
+            tmp = self.path + ".tmp"
+            fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(tmp, self.path)
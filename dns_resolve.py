@@ -0,0 +1,320 @@
+"""
+域名解析模块 — 为网站备案记录并发解析 A / AAAA / CNAME
+
+基于 asyncio UDP 的最小 DNS 客户端（仅标准库），向指定的递归解析服务器查询，应答被截断时改用 TCP；
+CNAME 链取自 A / AAAA 应答。并发数受限，结果按应答 TTL 缓存在内存中，并保存到磁盘
+JSON 文件供下次运行复用（过期条目不会使用）。解析结果以 ipv4 / ipv6 / cname 列写出。
+整个运行期间复用同一个事件循环（后台线程），逐个单位解析时不重复创建。
+"""
+
+import asyncio
+import json
+import logging
+import os
+import random
+import socket
+import struct
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from constants import (
+    DNS_RESOLVER, DNS_CONCURRENCY, DNS_TIMEOUT, DNS_RETRIES, DNS_NEGATIVE_TTL, DNS_CACHE_PATH,
+)
+from records import ResolvedWebRecord, WebRecord
+
+logger = logging.getLogger(__name__)
+
+TYPE_A = 1
+TYPE_CNAME = 5
+TYPE_AAAA = 28
+_TYPE_OPT = 41
+_RCODE_NXDOMAIN = 3
+_FLAG_TC = 0x0200  # 应答被截断（超过 UDP 负载上限）
+
+Answer = Tuple[int, str]  # (记录类型, 值)
+
+
+def encode_name(name: str) -> bytes:
+    """域名编码为 DNS 报文格式（中文域名按 IDNA 转换）"""
+    out = b""
+    for label in name.rstrip(".").encode("idna").split(b"."):
+        if not label or len(label) > 63:
+            raise ValueError(f"无效域名：{name}")
+        out += bytes([len(label)]) + label
+    return out + b"\x00"
+
+
+def build_query(qid: int, name: str, qtype: int) -> bytes:
+    """构造递归查询报文，附带 EDNS0（UDP 负载 4096 字节，减少截断）"""
+    header = struct.pack("!HHHHHH", qid, 0x0100, 1, 0, 0, 1)
+    question = encode_name(name) + struct.pack("!HH", qtype, 1)
+    opt = b"\x00" + struct.pack("!HHIH", _TYPE_OPT, 4096, 0, 0)
+    return header + question + opt
+
+
+def _read_name(data: bytes, offset: int) -> Tuple[str, int]:
+    """读取（可能经过压缩的）域名，返回 (域名, 域名之后的偏移)"""
+    labels: List[str] = []
+    end = None
+    for _ in range(128):  # 防止恶意指针循环
+        length = data[offset]
+        if length & 0xC0 == 0xC0:
+            if end is None:
+                end = offset + 2
+            offset = ((length & 0x3F) << 8) | data[offset + 1]
+            continue
+        if length == 0:
+            return ".".join(labels), (end if end is not None else offset + 1)
+        labels.append(data[offset + 1:offset + 1 + length].decode("ascii", "replace"))
+        offset += 1 + length
+    raise ValueError("域名压缩指针过多")
+
+
+def parse_response(data: bytes) -> Tuple[int, int, List[Tuple[int, int, str]]]:
+    """解析应答报文，返回 (报文 ID, rcode, [(类型, TTL, 值)])；只保留 A / AAAA / CNAME"""
+    qid, flags, qdcount, ancount, _, _ = struct.unpack("!HHHHHH", data[:12])
+    offset = 12
+    for _ in range(qdcount):
+        _, offset = _read_name(data, offset)
+        offset += 4
+    answers = []
+    for _ in range(ancount):
+        _, offset = _read_name(data, offset)
+        rtype, _, ttl, rdlength = struct.unpack("!HHIH", data[offset:offset + 10])
+        offset += 10
+        rdata = data[offset:offset + rdlength]
+        if rtype == TYPE_A and rdlength == 4:
+            answers.append((rtype, ttl, socket.inet_ntop(socket.AF_INET, rdata)))
+        elif rtype == TYPE_AAAA and rdlength == 16:
+            answers.append((rtype, ttl, socket.inet_ntop(socket.AF_INET6, rdata)))
+        elif rtype == TYPE_CNAME:
+            answers.append((rtype, ttl, _read_name(data, offset)[0]))
+        offset += rdlength
+    return qid, flags & 0x000F, answers
+
+
+def parse_server(server: str) -> Tuple[str, int]:
+    """
+    解析 DNS 服务器地址：host、host:port、IPv6 地址（不带端口）或 [IPv6]:port
+
+    Raises:
+        ValueError: 地址或端口格式错误
+    """
+    server = server.strip()
+    if server.startswith("["):
+        host, sep, rest = server[1:].partition("]")
+        if not sep or not host or (rest and not rest.startswith(":")):
+            raise ValueError(f"无效的 DNS 服务器地址：{server}（IPv6 带端口时应为 [地址]:端口）")
+        port = rest[1:] if rest else "53"
+    elif server.count(":") == 1:
+        host, _, port = server.partition(":")
+    else:
+        host, port = server, "53"  # 含多个冒号时视为不带端口的 IPv6 地址
+    if not host or not port.isdigit() or not 0 < int(port) < 65536:
+        raise ValueError(f"无效的 DNS 服务器地址：{server}")
+    return host, int(port)
+
+
+class _DnsProtocol(asyncio.DatagramProtocol):
+    def __init__(self, qid: int, future: asyncio.Future):
+        self.qid = qid
+        self.future = future
+
+    def datagram_received(self, data: bytes, addr) -> None:
+        # 忽略 ID 不匹配的报文（迟到的应答或伪造报文）
+        if len(data) >= 12 and struct.unpack("!H", data[:2])[0] == self.qid and not self.future.done():
+            self.future.set_result(data)
+
+    def error_received(self, exc: Exception) -> None:
+        if not self.future.done():
+            self.future.set_exception(exc)
+
+
+class DnsCache:
+    """按 TTL 过期的解析缓存（内存 + 磁盘 JSON）"""
+
+    def __init__(self, path: Optional[str] = DNS_CACHE_PATH):
+        self.path = path
+        self._entries: Dict[str, Tuple[float, List[Answer]]] = {}  # "类型:域名" -> (过期时间戳, 应答)
+        if path and os.path.exists(path):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    raw = json.load(f)
+                now = time.time()
+                self._entries = {k: (exp, [tuple(a) for a in answers])
+                                 for k, (exp, answers) in raw.items() if exp > now}
+                logger.info(f"已加载 {len(self._entries)} 条未过期的解析缓存：{path}")
+            except (OSError, ValueError) as e:
+                logger.warning(f"解析缓存读取失败，忽略：{e}")
+
+    def get(self, name: str, qtype: int) -> Optional[List[Answer]]:
+        entry = self._entries.get(f"{qtype}:{name}")
+        if entry and entry[0] > time.time():
+            return entry[1]
+        return None
+
+    def put(self, name: str, qtype: int, answers: List[Answer], ttl: float) -> None:
+        self._entries[f"{qtype}:{name}"] = (time.time() + ttl, answers)
+
+    def save(self) -> None:
+        if not self.path:
+            return
+        now = time.time()
+        live = {k: v for k, v in self._entries.items() if v[0] > now}
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(live, f, ensure_ascii=False)
+        os.replace(tmp, self.path)
+
+
+@dataclass
+class Resolution:
+    ipv4: List[str]
+    ipv6: List[str]
+    cname: List[str]  # CNAME 链，按解析顺序
+
+
+class DnsResolver:
+    """并发受限的异步解析器"""
+
+    def __init__(self, server: str = DNS_RESOLVER, cache: Optional[DnsCache] = None,
+                 concurrency: int = DNS_CONCURRENCY, timeout: float = DNS_TIMEOUT, retries: int = DNS_RETRIES):
+        self.server = parse_server(server)
+        self.cache = cache or DnsCache(None)
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.retries = retries
+        self.stats = {"queries": 0, "cache_hits": 0, "failures": 0}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread: Optional[threading.Thread] = None
+        self._loop_lock = threading.Lock()
+
+    async def _exchange_udp(self, qid: int, query: bytes) -> bytes:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        transport, _ = await loop.create_datagram_endpoint(
+            lambda: _DnsProtocol(qid, future), remote_addr=self.server)
+        try:
+            self.stats["queries"] += 1
+            transport.sendto(query)
+            return await asyncio.wait_for(future, self.timeout)
+        finally:
+            transport.close()
+
+    async def _exchange_tcp(self, query: bytes) -> bytes:
+        """经由 TCP 重新查询（报文前加两字节长度）"""
+        async def exchange() -> bytes:
+            reader, writer = await asyncio.open_connection(*self.server)
+            try:
+                self.stats["queries"] += 1
+                writer.write(struct.pack("!H", len(query)) + query)
+                await writer.drain()
+                length = struct.unpack("!H", await reader.readexactly(2))[0]
+                return await reader.readexactly(length)
+            finally:
+                writer.close()
+
+        return await asyncio.wait_for(exchange(), self.timeout)
+
+    async def _query(self, name: str, qtype: int) -> List[Answer]:
+        cached = self.cache.get(name, qtype)
+        if cached is not None:
+            self.stats["cache_hits"] += 1
+            return cached
+
+        last_error: Optional[Exception] = None
+        for _ in range(self.retries + 1):
+            qid = random.getrandbits(16)
+            query = build_query(qid, name, qtype)
+            try:
+                data = await self._exchange_udp(qid, query)
+                if struct.unpack("!H", data[2:4])[0] & _FLAG_TC:
+                    # 截断的应答可能缺少记录，不使用也不缓存，改用 TCP 获取完整应答
+                    data = await self._exchange_tcp(query)
+            except (asyncio.TimeoutError, asyncio.IncompleteReadError, OSError) as e:
+                last_error = e
+                continue
+
+            try:
+                rqid, rcode, answers = parse_response(data)
+            except (struct.error, IndexError, ValueError) as e:
+                last_error = e  # 报文格式错误
+                continue
+            if rqid != qid or struct.unpack("!H", data[2:4])[0] & _FLAG_TC:
+                last_error = RuntimeError("TCP 应答 ID 不匹配或仍被截断")
+                continue
+            if rcode not in (0, _RCODE_NXDOMAIN):
+                last_error = RuntimeError(f"rcode={rcode}")
+                continue
+            result = [(rtype, value) for rtype, _, value in answers]
+            ttl = min((ttl for _, ttl, _ in answers), default=DNS_NEGATIVE_TTL)
+            self.cache.put(name, qtype, result, ttl)
+            return result
+        raise RuntimeError(f"解析 {name} 失败：{last_error!r}")
+
+    async def resolve(self, name: str) -> Resolution:
+        a, aaaa = await asyncio.gather(self._query(name, TYPE_A), self._query(name, TYPE_AAAA))
+        cname = list(dict.fromkeys(v for t, v in a + aaaa if t == TYPE_CNAME))
+        return Resolution(
+            ipv4=[v for t, v in a if t == TYPE_A],
+            ipv6=[v for t, v in aaaa if t == TYPE_AAAA],
+            cname=cname,
+        )
+
+    async def resolve_many(self, names: Iterable[str]) -> Dict[str, Optional[Resolution]]:
+        """并发解析（最多 concurrency 个域名同时进行），失败的域名结果为 None"""
+        semaphore = asyncio.Semaphore(self.concurrency)
+        results: Dict[str, Optional[Resolution]] = {}
+
+        async def one(name: str) -> None:
+            async with semaphore:
+                try:
+                    results[name] = await self.resolve(name)
+                except (RuntimeError, ValueError, OSError) as e:
+                    self.stats["failures"] += 1
+                    logger.debug(str(e))
+                    results[name] = None
+
+        await asyncio.gather(*(one(n) for n in dict.fromkeys(names)))
+        return results
+
+    def enrich(self, records: List[WebRecord]) -> List[ResolvedWebRecord]:
+        """解析一批网站记录的域名，返回带 ipv4 / ipv6 / cname 列的记录"""
+        names = [r.domain.strip().lower() for r in records if r.domain and r.domain.strip()]
+        resolved = self._run(self.resolve_many(names)) if names else {}
+        enriched = []
+        for r in records:
+            res = resolved.get(r.domain.strip().lower()) if r.domain else None
+            enriched.append(ResolvedWebRecord(
+                *r.as_tuple(),
+                ipv4=";".join(res.ipv4) if res else None,
+                ipv6=";".join(res.ipv6) if res else None,
+                cname=";".join(res.cname) if res else None,
+            ))
+        return enriched
+
+    def _run(self, coro):
+        """在解析器的事件循环中执行协程并等待结果；事件循环首次使用时在后台线程中启动，之后一直复用"""
+        with self._loop_lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                self._loop_thread = threading.Thread(target=self._loop.run_forever, name="dns", daemon=True)
+                self._loop_thread.start()
+            loop = self._loop
+        return asyncio.run_coroutine_threadsafe(coro, loop).result()
+
+    def close(self) -> None:
+        """停止并关闭事件循环"""
+        with self._loop_lock:
+            loop, thread = self._loop, self._loop_thread
+            self._loop = self._loop_thread = None
+        if loop:
+            loop.call_soon_threadsafe(loop.stop)
+            thread.join()
+            loop.close()
+
+    def report(self) -> None:
+        s = self.stats
+        logger.info(f"域名解析：上游查询 {s['queries']} 次，缓存命中 {s['cache_hits']} 次，失败 {s['failures']} 个域名")
@@ -0,0 +1,139 @@
+"""
+浏览器指纹配置模块 — 保证 TLS 指纹与请求头声明的浏览器一致
+
+每个配置把 curl_cffi 的 impersonate 目标、User-Agent、Sec-Ch-Ua 系列请求头及其顺序
+一次性固定下来。配置按代理（出口）粘滞分配，并按配置统计 403 比例，异常配置自动淘汰。
+"""
+
+import logging
+import random
+import threading
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from constants import PROFILE_MIN_SAMPLES, PROFILE_MAX_403_RATE
+
+logger = logging.getLogger(__name__)
+
+_PLATFORM_UA = {
+    "Windows": "Windows NT 10.0; Win64; x64",
+    "macOS": "Macintosh; Intel Mac OS X 10_15_7",
+}
+
+
+@dataclass(frozen=True)
+class BrowserProfile:
+    """一组自洽的浏览器指纹：impersonate 目标与请求头声明同一个浏览器版本"""
+    name: str
+    impersonate: str                        # curl_cffi 模拟目标（决定 TLS / HTTP2 指纹）
+    user_agent: str
+    base_headers: Tuple[Tuple[str, str], ...]  # 按 Chrome 发送顺序排列的浏览器请求头
+
+    def headers(self, extra: Optional[Dict[str, str]] = None) -> Dict[str, str]:
+        """生成请求头：extra（认证头等）覆盖同名头（保持原位置）或追加在后"""
+        headers = dict(self.base_headers)
+        if extra:
+            headers.update(extra)
+        return headers
+
+
+def _build(version: str, platform: str, sec_ch_ua: str) -> BrowserProfile:
+    user_agent = (
+        f"Mozilla/5.0 ({_PLATFORM_UA[platform]}) AppleWebKit/537.36 "
+        f"(KHTML, like Gecko) Chrome/{version}.0.0.0 Safari/537.36"
+    )
+    # Chrome 发起 XHR POST 时的请求头顺序
+    base = (
+        ("Sec-Ch-Ua", sec_ch_ua),
+        ("Sec-Ch-Ua-Mobile", "?0"),
+        ("User-Agent", user_agent),
+        ("Content-Type", "application/json"),
+        ("Accept", "application/json, text/plain, */*"),
+        ("Sec-Ch-Ua-Platform", f"\"{platform}\""),
+        ("Origin", "https://beian.miit.gov.cn"),
+        ("Sec-Fetch-Site", "same-site"),
+        ("Sec-Fetch-Mode", "cors"),
+        ("Sec-Fetch-Dest", "empty"),
+        ("Referer", "https://beian.miit.gov.cn/"),
+        ("Accept-Encoding", "gzip, deflate, br"),
+        ("Accept-Language", "zh-CN,zh;q=0.9"),
+    )
+    return BrowserProfile(f"chrome{version}-{platform}", f"chrome{version}", user_agent, base)
+
+
+_BRANDS = {
+    "110": "\"Chromium\";v=\"110\", \"Not A(Brand\";v=\"24\", \"Google Chrome\";v=\"110\"",
+    "120": "\"Not_A Brand\";v=\"8\", \"Chromium\";v=\"120\", \"Google Chrome\";v=\"120\"",
+    "123": "\"Google Chrome\";v=\"123\", \"Not:A-Brand\";v=\"8\", \"Chromium\";v=\"123\"",
+    "124": "\"Chromium\";v=\"124\", \"Google Chrome\";v=\"124\", \"Not-A.Brand\";v=\"99\"",
+}
+
+PROFILES: List[BrowserProfile] = [
+    _build(version, platform, brands)
+    for version, brands in _BRANDS.items()
+    for platform in ("Windows", "macOS")
+]
+
+
+class ProfilePool:
+    """指纹配置池：按代理粘滞分配配置，统计每个配置的 403 比例并淘汰异常配置"""
+
+    def __init__(self, profiles: Optional[List[BrowserProfile]] = None,
+                 min_samples: int = PROFILE_MIN_SAMPLES, max_403_rate: float = PROFILE_MAX_403_RATE):
+        self.profiles = list(profiles or PROFILES)
+        self.min_samples = min_samples
+        self.max_403_rate = max_403_rate
+        self._assigned: Dict[Optional[str], BrowserProfile] = {}
+        self._stats: Dict[str, List[int]] = {p.name: [0, 0] for p in self.profiles}  # [请求数, 403 数]
+        self._retired: set = set()
+        self._lock = threading.Lock()
+
+    def _active(self) -> List[BrowserProfile]:
+        return [p for p in self.profiles if p.name not in self._retired]
+
+    def for_key(self, key: Optional[str]) -> BrowserProfile:
+        """返回代理（None 表示直连）对应的配置，首次使用时随机分配并保持不变"""
+        with self._lock:
+            profile = self._assigned.get(key)
+            if profile is None or profile.name in self._retired:
+                profile = random.choice(self._active())
+                self._assigned[key] = profile
+            return profile
+
+    def find(self, name: str) -> Optional[BrowserProfile]:
+        """按名称查找未停用的配置"""
+        with self._lock:
+            for p in self.profiles:
+                if p.name == name and p.name not in self._retired:
+                    return p
+            return None
+
+    def assign(self, key: Optional[str], profile: BrowserProfile) -> None:
+        """固定某个出口使用的配置（例如认证时已使用的配置）"""
+        with self._lock:
+            self._assigned[key] = profile
+
+    def record(self, profile: BrowserProfile, status_code: int) -> None:
+        """记录一次响应状态；403 比例超过阈值的配置被淘汰（至少保留一个配置）"""
+        with self._lock:
+            stats = self._stats[profile.name]
+            stats[0] += 1
+            if status_code == 403:
+                stats[1] += 1
+            total, forbidden = stats
+            if (profile.name not in self._retired and total >= self.min_samples
+                    and forbidden / total > self.max_403_rate and len(self._active()) > 1):
+                self._retired.add(profile.name)
+                logger.warning(
+                    f"指纹配置 {profile.name} 403 比例 {forbidden}/{total} 过高，已停用"
+                )
+
+    def report(self) -> None:
+        for name, (total, forbidden) in self._stats.items():
+            if total:
+                state = "（已停用）" if name in self._retired else ""
+                logger.info(f"指纹配置 {name}: 请求 {total} 次，403 {forbidden} 次{state}")
+
+
+def random_profile() -> BrowserProfile:
+    return random.choice(PROFILES)
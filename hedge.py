@@ -0,0 +1,125 @@
+"""
+对冲请求模块 — 慢代理拖长尾延迟时，经由另一个代理补发同一请求，先成功者胜出
+
+按滚动窗口统计请求耗时的 p90：请求超过 p90 仍未返回时，经由另一个健康代理补发一次。
+对冲次数受预算限制（不超过总请求数的一定比例）；统计对冲次数及对冲请求先返回的次数。
+样本不足或预算已满时不可能对冲，请求直接在调用线程中发送，不经过线程池。
+curl_cffi 的同步请求无法从其他线程中断，落败的请求在后台自然结束，结果被丢弃
+（调用方据此不把落败请求计入代理池与轮换计数，见 query.QueryClient._post）。
+"""
+
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Callable, Deque, Optional, Tuple
+
+from constants import HEDGE_WINDOW, HEDGE_MIN_SAMPLES, HEDGE_QUANTILE, HEDGE_BUDGET, HEDGE_WORKERS
+
+logger = logging.getLogger(__name__)
+
+
+class Hedger:
+    """对冲请求调度：维护耗时分布、预算与统计"""
+
+    def __init__(self, window: int = HEDGE_WINDOW, min_samples: int = HEDGE_MIN_SAMPLES,
+                 quantile: float = HEDGE_QUANTILE, budget: float = HEDGE_BUDGET,
+                 workers: int = HEDGE_WORKERS):
+        self.min_samples = min_samples
+        self.quantile = quantile
+        self.budget = budget
+        self._latencies: Deque[float] = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="hedge")
+        self.requests = 0
+        self.hedged = 0
+        self.helped = 0  # 对冲请求先于主请求成功返回的次数
+
+    def observe(self, seconds: float) -> None:
+        with self._lock:
+            self._latencies.append(seconds)
+
+    def threshold(self) -> Optional[float]:
+        """当前的对冲触发时间（耗时分位数），样本不足时返回 None"""
+        with self._lock:
+            if len(self._latencies) < self.min_samples:
+                return None
+            ordered = sorted(self._latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * self.quantile))]
+
+    def _affordable(self) -> bool:
+        """预算内是否还能再对冲一次：对冲次数不超过请求数 × budget"""
+        return self.hedged + 1 <= self.requests * self.budget
+
+    def _acquire(self) -> bool:
+        """预算内返回 True 并计数"""
+        with self._lock:
+            if not self._affordable():
+                return False
+            self.hedged += 1
+            return True
+
+    def _run(self, send: Callable[[], Any]) -> Any:
+        """发送请求并记录耗时（失败的请求不计入耗时分布）"""
+        start = time.perf_counter()
+        result = send()
+        self.observe(time.perf_counter() - start)
+        return result
+
+    def _timed(self, send: Callable[[], Any]) -> Tuple[Future, threading.Event]:
+        """
+        在线程池中发送请求，返回 (结果, 开始事件)
+
+        线程池被仍在后台进行的落败请求占满时新请求需要排队；对冲等待从请求实际开始时计时，
+        排队时间不计入，不会因此误判为慢请求而对冲。
+        """
+        started = threading.Event()
+
+        def run():
+            started.set()
+            return self._run(send)
+
+        return self._executor.submit(run), started
+
+    def call(self, send: Callable[[Optional[str]], Any], primary: Optional[str],
+             pick_alternate: Callable[[Optional[str]], Optional[str]], succeeded: Callable[[Any], bool]) -> Any:
+        """
+        经由 primary 发送请求，超过分位数耗时仍未返回时经由备用代理补发，返回先成功的结果
+
+        send(proxy) 发送一次请求；succeeded(result) 判断结果是否可用；两个请求都失败时
+        返回（或抛出）主请求的结果。pick_alternate 返回 None 时不对冲（如没有可直接使用凭据的代理）。
+        """
+        with self._lock:
+            self.requests += 1
+            affordable = self._affordable()
+        delay = self.threshold()
+        if delay is None or not affordable:
+            return self._run(lambda: send(primary))
+
+        first, started = self._timed(lambda: send(primary))
+        started.wait()
+        if wait([first], timeout=delay).done:
+            return first.result()
+
+        alternate = pick_alternate(primary)
+        if alternate is None or not self._acquire():
+            return first.result()
+        logger.info(f"请求超过 {delay:.2f} 秒未返回，经由代理 {alternate} 对冲")
+        second, _ = self._timed(lambda: send(alternate))
+
+        pending = {first, second}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None and succeeded(future.result()):
+                    # 落败的请求无法中断，在后台结束后结果被丢弃
+                    if future is second:
+                        with self._lock:
+                            self.helped += 1
+                    return future.result()
+        return first.result()
+
+    def report(self) -> None:
+        if self.hedged:
+            logger.info(f"对冲请求 {self.hedged} 次（共 {self.requests} 次请求），其中 {self.helped} 次由对冲请求先返回")
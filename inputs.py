@@ -0,0 +1,166 @@
+"""
+批量查询输入模块 — 以流式方式读取查询单位名称
+
+支持纯文本（每行一个单位）、CSV/TSV（按列选择）、XLSX（只读模式）以及标准输入，
+逐条产出单位名称而不是一次性读入内存，适用于数百万行的资产导出文件。
+"""
+
+import csv
+import logging
+import os
+import queue
+import sys
+import threading
+from typing import Iterable, Iterator, List, Optional, Sequence, TextIO
+
+logger = logging.getLogger(__name__)
+
+STDIN_PATH = "-"
+CSV_EXTENSIONS = (".csv", ".tsv")
+XLSX_EXTENSIONS = (".xlsx", ".xlsm")
+
+_END = object()  # 预读队列结束标记
+
+
+def _resolve_column(header: Sequence, column: str) -> int:
+    """在表头中查找列名对应的下标"""
+    names = [str(h).strip() if h is not None else "" for h in header]
+    if column not in names:
+        raise ValueError(f"输入文件中未找到列 '{column}'，可用列: {names}")
+    return names.index(column)
+
+
+def _select_rows(rows: Iterable[Sequence], column: Optional[str], header: bool = True) -> Iterator[str]:
+    """
+    从行序列中按列选择单位名称
+
+    header 为真时首行视为表头并跳过；column 为列名时在表头中查找（需要表头），
+    为数字时表示从 1 开始的列序号，为空时取第一列。表头与列名在调用时立即检查，
+    不在迭代中途才报错。
+    """
+    rows = iter(rows)
+    index = 0
+    if column and column.isdigit():
+        index = int(column) - 1
+    elif column and not header:
+        raise ValueError(f"按列名 '{column}' 选择需要表头，无表头时请使用列序号")
+    if header:
+        first = next(rows, None)
+        if first is not None and column and not column.isdigit():
+            index = _resolve_column(first, column)
+    return _column_values(rows, index)
+
+
+def _column_values(rows: Iterator[Sequence], index: int) -> Iterator[str]:
+    for row in rows:
+        if index >= len(row):
+            continue
+        value = row[index]
+        if value is None:
+            continue
+        value = str(value).strip()
+        if value:
+            yield value
+
+
+def _iter_text(stream: TextIO) -> Iterator[str]:
+    for line in stream:
+        line = line.strip()
+        if line:
+            yield line
+
+
+def _closing(units: Iterator[str], resource) -> Iterator[str]:
+    """迭代结束（或生成器被关闭）时关闭文件 / 工作簿"""
+    try:
+        yield from units
+    finally:
+        resource.close()
+
+
+def _iter_csv(path: str, column: Optional[str], delimiter: str, header: bool) -> Iterator[str]:
+    # utf-8-sig 兼容 Excel 导出的带 BOM 的 CSV 文件
+    f = open(path, "r", encoding="utf-8-sig", newline="")
+    try:
+        units = _select_rows(csv.reader(f, delimiter=delimiter), column, header)
+    except BaseException:
+        f.close()
+        raise
+    return _closing(units, f)
+
+
+def _iter_xlsx(path: str, column: Optional[str], sheet: Optional[str], header: bool) -> Iterator[str]:
+    from openpyxl import load_workbook
+
+    # read_only 模式按行流式解析，不会把整个工作表加载进内存
+    wb = load_workbook(path, read_only=True, data_only=True)
+    try:
+        if sheet and sheet not in wb.sheetnames:
+            raise ValueError(f"输入文件中未找到工作表 '{sheet}'，可用工作表: {wb.sheetnames}")
+        ws = wb[sheet] if sheet else wb.worksheets[0]
+        units = _select_rows(ws.iter_rows(values_only=True), column, header)
+    except BaseException:
+        wb.close()
+        raise
+    return _closing(units, wb)
+
+
+def iter_units(path: str, column: Optional[str] = None, sheet: Optional[str] = None,
+               header: bool = True) -> Iterator[str]:
+    """
+    流式读取查询单位名称
+
+    打开文件、查找工作表与表头列在调用时立即完成，错误（ValueError / OSError）
+    在开始查询前抛出；之后按需逐条产出。
+
+    Args:
+        path: 输入文件路径，"-" 表示标准输入
+        column: CSV/XLSX 的列名或从 1 开始的列序号；标准输入指定列时按 CSV 解析
+        sheet: XLSX 工作表名称，默认第一个工作表
+        header: CSV/XLSX 首行是否为表头（默认是，跳过首行）；纯文本输入不受影响
+
+    Returns:
+        去除首尾空白后的非空单位名称迭代器
+    """
+    if path == STDIN_PATH:
+        if column:
+            return _select_rows(csv.reader(sys.stdin, delimiter=","), column, header)
+        return _iter_text(sys.stdin)
+
+    ext = os.path.splitext(path)[1].lower()
+    if ext in XLSX_EXTENSIONS:
+        return _iter_xlsx(path, column, sheet, header)
+    if ext in CSV_EXTENSIONS:
+        return _iter_csv(path, column, "\t" if ext == ".tsv" else ",", header)
+
+    f = open(path, "r", encoding="utf-8-sig", newline="")
+    return _closing(_iter_text(f), f)
+
+
+def prefetch(items: Iterable[str], maxsize: int) -> Iterator[str]:
+    """
+    在后台线程中预读输入，预读队列有上限
+
+    查询速度远低于文件读取速度，队列满时读取线程阻塞（背压），
+    因此内存中最多只保留 maxsize 条待查询单位。
+    """
+    q: "queue.Queue" = queue.Queue(maxsize=maxsize)
+    errors: List[BaseException] = []
+
+    def producer():
+        try:
+            for item in items:
+                q.put(item)
+        except BaseException as e:  # 读取异常转交给消费者线程抛出
+            errors.append(e)
+        finally:
+            q.put(_END)
+
+    threading.Thread(target=producer, name="unit-prefetch", daemon=True).start()
+    while True:
+        item = q.get()
+        if item is _END:
+            break
+        yield item
+    if errors:
+        raise errors[0]
@@ -3,14 +3,27 @@ import time
 import random
 import sys
 import logging
-from typing import List, Optional, Dict, Any
-from curl_cffi import requests as cffi_requests
-from auth import AuthManager
-from utils import (
-    generate_modern_headers, process_response, write_to_excel,
-    load_proxies, validate_proxies, format_proxy, retry
+import os
+from typing import Iterator, List, Dict, Optional
+from utils import write_results
+from proxy_pool import load_proxy_pool
+from query import QueryClient
+from hedge import Hedger
+from archive import ResponseArchive
+from scheduler import WorkScheduler, WorkItem, DeadLetterWriter
+from inputs import iter_units, prefetch, STDIN_PATH
+from normalize import UnitDeduplicator, clean_unit_name
+from parquet_sink import ParquetSink
+from dns_resolve import DnsResolver, DnsCache, parse_server
+from records import Record
+from store import ResultStore, lookup_main
+from monitor import monitor_main
+from server import serve_main
+from constants import (
+    TYPE_MAPPING, INPUT_PREFETCH_SIZE, RESULTS_DB_PATH, PARQUET_ROW_GROUP_SIZE,
+    WORK_TRY_REQUESTS, MAX_WORK_ATTEMPTS, DNS_RESOLVER, DNS_CONCURRENCY, DNS_CACHE_PATH,
+    CREDENTIAL_STORE_PATH,
 )
-from constants import QUERY_URL, TYPE_MAPPING, DEFAULT_TIMEOUT, MAX_MAIN_QUERY_RETRIES
 
 # 配置日志
 logging.basicConfig(
@@ -23,215 +36,190 @@ logger = logging.getLogger(__name__)
 def main():
     parser = argparse.ArgumentParser(description='ICP备案查询工具')
     parser.add_argument('unit_name', nargs='?', help='查询单位名称')
-    parser.add_argument('-f', '--file', help='批量查询文件')
-    parser.add_argument('-o', '--output', help='输出文件名')
+    parser.add_argument('-f', '--file', help='批量查询文件（txt/csv/tsv/xlsx，"-" 表示标准输入）')
+    parser.add_argument('-c', '--column', help='CSV/XLSX 中单位名称所在的列名或列序号（从1开始），默认第一列')
+    parser.add_argument('--sheet', help='XLSX 工作表名称，默认第一个工作表')
+    parser.add_argument('--no-header', action='store_true', help='CSV/XLSX 首行不是表头（默认首行为表头并跳过）')
+    parser.add_argument('-o', '--output', help='输出文件名（.csv / .parquet 结尾时按类型输出 CSV / Parquet，否则输出 Excel）')
+    parser.add_argument('--row-group-size', type=int, default=PARQUET_ROW_GROUP_SIZE, help=f'Parquet 行组大小，缓冲满即写出（默认 {PARQUET_ROW_GROUP_SIZE}）')
     parser.add_argument('-t', '--type', choices=['web', 'app', 'miniapp', 'quickapp', 'all'], default='web', help='查询类型:网站、APP、小程序、快应用、全部')
     parser.add_argument('-p', '--proxy_rotate', type=int, help='代理轮换间隔（每个代理处理N个请求后切换）')
+    parser.add_argument('--proxy-provider', action='append', default=[], metavar='SPEC', help='代理补充来源，可重复指定：cmd:命令 / dir:投放目录 / http(s)://接口；proxy.txt 运行中修改会自动重新加载')
+    parser.add_argument('--hedge', action='store_true', help='对冲请求：超过 p90 耗时仍未返回时经由另一个代理补发，先成功者胜出（需要至少两个代理）')
+    parser.add_argument('--proxy-auth', action='store_true', help='按代理分别认证：验证码与 token 经由各代理获取，切换代理时使用该代理的凭据')
+    parser.add_argument('--no-auth-cache', action='store_true', help='不复用也不保存凭据（默认复用 credentials.json 中未过期的凭据）')
+    parser.add_argument('--db', default=RESULTS_DB_PATH, help=f'本地结果库路径（默认 {RESULTS_DB_PATH}）')
+    parser.add_argument('--no-db', action='store_true', help='不写入本地结果库')
+    parser.add_argument('--resolve', action='store_true', help='解析网站备案域名的 A/AAAA/CNAME，结果写入 ipv4/ipv6/cname 列')
+    parser.add_argument('--dns-resolver', default=DNS_RESOLVER, help=f'域名解析使用的 DNS 服务器（host、host:port 或 [IPv6]:port，默认 {DNS_RESOLVER}）')
+    parser.add_argument('--dns-concurrency', type=int, default=DNS_CONCURRENCY, help=f'同时解析的域名数上限（默认 {DNS_CONCURRENCY}）')
+    parser.add_argument('--dns-cache', default=DNS_CACHE_PATH, help=f'解析缓存文件，按 TTL 跨次运行复用（默认 {DNS_CACHE_PATH}）')
+    parser.add_argument('--archive', metavar='DIR', help='把每个列表 / 详情接口的原始响应压缩归档到该目录，供 --replay 离线重放')
+    parser.add_argument('--replay', metavar='DIR', help='不联网：从归档目录重新解析并写出结果（未指定单位时重放归档中的全部单位）')
+    parser.add_argument('--dead-letter', default=f"dead_letter_{time.strftime('%Y%m%d_%H%M%S')}.txt",
+                        help=f'多次重试（{MAX_WORK_ATTEMPTS}次）仍失败的单位写入该文件，每行一个，可直接用 -f 重新查询')
     args = parser.parse_args()
+    if args.resolve:
+        try:
+            parse_server(args.dns_resolver)
+        except ValueError as e:
+            parser.error(str(e))
+
+    # Parquet 输出按行组增量写出，不在内存中累积结果
+    parquet = None
+    if args.output and args.output.lower().endswith(".parquet"):
+        parquet = ParquetSink(args.output, args.row_group_size)
 
-    auth_manager = AuthManager()
-    # 只有指定了 -p 参数时才加载和使用代理
-    use_proxy = args.proxy_rotate is not None
-    available_proxies = []
-    if use_proxy:
-        raw_proxies = load_proxies()
-        available_proxies = validate_proxies(raw_proxies)
-        if len(available_proxies) == 0:
-            logger.warning("指定了代理轮换参数但未找到有效代理，将不使用代理")
-            use_proxy = False
-    proxy_index = 0  # 代理索引，用于轮询
-    requests_per_proxy = 0  # 当前代理已处理的请求数
-    
     query_types = ["web", "app", "miniapp", "quickapp"] if args.type == "all" else [args.type]
-    units = load_units(args)
-    
-    all_results: Dict[str, List[Dict[str, Any]]] = {t: [] for t in query_types}
-    blocked = False
+    dedup = UnitDeduplicator()
+    if args.replay:
+        replay(args, query_types, dedup, parquet)
+        return
+
+    # 先检查输入（文件、工作表、表头列），输入有误时不进行认证，也不写出空结果文件
+    units = dedup.unique(load_units(args))
+
+    # 延迟导入：认证模块依赖 cv2/ddddocr，加载较慢，lookup 等离线子命令无需加载
+    from auth import AuthManager
+    pool = load_proxy_pool(args.proxy_rotate, args.proxy_provider)
+    auth_manager = AuthManager(proxy_affine=args.proxy_auth and pool is not None,
+                               store_path=None if args.no_auth_cache else CREDENTIAL_STORE_PATH)
+    store = None if args.no_db else ResultStore(args.db)
+    hedger = Hedger() if args.hedge else None
+    archive = ResponseArchive(args.archive) if args.archive else None
+    client = QueryClient(auth_manager, proxy_rotate=args.proxy_rotate, pool=pool, hedger=hedger, archive=archive)
+    resolver = DnsResolver(args.dns_resolver, DnsCache(args.dns_cache), args.dns_concurrency) if args.resolve else None
+
+    all_results: Dict[str, List[Record]] = {t: [] for t in query_types}
+    dead_letter = DeadLetterWriter(args.dead_letter)
+
+    def work_items() -> Iterator[WorkItem]:
+        for unit_idx, unit in enumerate(units):
+            logger.info(f"\n查询进度：第{unit_idx+1}个 - {unit}")
+            for query_type in query_types:
+                yield WorkItem(unit, query_type)
+
+    def run(work: WorkItem) -> None:
+        service_type = TYPE_MAPPING[work.query_type]
+        if client.use_proxy:
+            logger.info(f"当前使用代理：{client.current_proxy} ")
+        logger.info(f"正在查询 {work.query_type} 类型...")
+        # 单次执行只发出有限次请求，失败由调度器放入重试队列，后续单位继续查询
+        records = client.query(clean_unit_name(work.unit), service_type, max_attempts=WORK_TRY_REQUESTS)
+
+        if store:
+            store.upsert(service_type, records)
+        if resolver and service_type == TYPE_MAPPING["web"]:
+            records = resolver.enrich(records)
+        # 记录原始输入写法，写出时回填到同一单位的其他写法
+        for r in records:
+            r.queryName = work.unit
+        if parquet:
+            parquet.add(work.query_type, records)
+        else:
+            all_results[work.query_type].extend(records)
+
+        # 智能延时
+        delay = random.uniform(2, 3) if client.current_proxy else random.uniform(3, 4)
+        time.sleep(delay)
+        logger.info(f"请求成功，随机延迟: {delay:.2f}秒")
+
+    scheduler = WorkScheduler(run, on_dead=lambda work, e: dead_letter.write(work.unit, f"{work.query_type}: {e}"))
 
     try:
-        for unit_idx, unit in enumerate(units):
-            logger.info(f"\n查询进度：{unit_idx+1}/{len(units)} - {unit}")
-            
-            # 确定当前使用的代理
-            current_proxy: Optional[str] = None
-            if use_proxy and available_proxies:
-                current_proxy = available_proxies[proxy_index]
-                logger.info(f"当前使用代理：{current_proxy} ")
+        scheduler.run(work_items())
 
-            for query_type in query_types:
-                if blocked:
-                    break
-                
-                service_type = TYPE_MAPPING[query_type]
-                logger.info(f"正在查询 {query_type} 类型...")
-                success = False
-                retry_count = 0
-                tried_proxies = set()  # 记录已尝试的代理索引（用于避免无限循环）
-
-                while not success:
-                    # 使用代理时：在每次请求前检查是否需要轮换代理
-                    if use_proxy and available_proxies and args.proxy_rotate:
-                        if requests_per_proxy >= args.proxy_rotate:
-                            proxy_index = (proxy_index + 1) % len(available_proxies)
-                            requests_per_proxy = 0  # 重置计数
-                            current_proxy = available_proxies[proxy_index]
-                            logger.info(f"达到轮换间隔，切换到代理 #{proxy_index + 1}: {current_proxy}")
-                    
-                    headers = generate_modern_headers(auth_manager.headers)
-
-                    try:
-                        # 发送请求
-                        response = cffi_requests.post(
-                            QUERY_URL,
-                            headers=headers,
-                            json={"pageNum": "1", "pageSize": "100", "unitName": unit, "serviceType": service_type},
-                            impersonate="chrome110",
-                            proxies=format_proxy(current_proxy) if current_proxy else None,
-                            timeout=DEFAULT_TIMEOUT,
-                            verify=False  # 禁用SSL证书验证
-                        )
-                        
-                        # 增加当前代理的请求计数（每次请求都计数，包括重试）
-                        if current_proxy:
-                            requests_per_proxy += 1
-
-                        # 403 处理逻辑
-                        if response.status_code == 403:
-                            logger.warning(f"代理 {current_proxy} 返回403，尝试切换代理...")
-                            if available_proxies and len(available_proxies) > 1:
-                                # 立即切换到下一个代理
-                                proxy_index = (proxy_index + 1) % len(available_proxies)
-                                current_proxy = available_proxies[proxy_index]
-                                requests_per_proxy = 0  # 重置计数
-                                logger.info(f"已切换到新代理：{current_proxy}")
-                                continue
-                            else:
-                                logger.error("无其他代理可用，退出程序")
-                                sys.exit(1)
-
-                        # 处理响应数据
-                        if response.status_code == 200:
-                            response_data = response.json()
-                            if response_data.get("code") == 401:
-                                auth_manager.update_headers()
-                                logger.info("Token已更新，正在重试...")
-                                continue
-                            
-                            if response_data.get("success"):
-                                # 创建引用列表，用于在process_response中更新计数
-                                requests_per_proxy_ref = [requests_per_proxy] if use_proxy else None
-                                proxy_index_ref = [proxy_index] if use_proxy else None
-                                
-                                all_results[query_type].extend(
-                                    process_response(
-                                        response_data, service_type, headers,
-                                        current_proxy=current_proxy if use_proxy else None,
-                                        available_proxies=available_proxies if use_proxy else None,
-                                        proxy_index_ref=proxy_index_ref,
-                                        proxy_rotate=args.proxy_rotate if use_proxy else None,
-                                        requests_per_proxy_ref=requests_per_proxy_ref,
-                                        auth_manager=auth_manager,
-                                    )
-                                )
-                                
-                                # 同步详情查询更新后的计数和代理索引
-                                if use_proxy and requests_per_proxy_ref:
-                                    requests_per_proxy = requests_per_proxy_ref[0]
-                                if use_proxy and proxy_index_ref:
-                                    proxy_index = proxy_index_ref[0]
-                                    current_proxy = available_proxies[proxy_index] if available_proxies else current_proxy
-                                
-                                success = True
-                                # 智能延时
-                                delay = random.uniform(3, 4) if not current_proxy else random.uniform(2, 3)
-                                time.sleep(delay)
-                                logger.info(f"请求成功，随机延迟: {delay:.2f}秒")
-                            else:
-                                raise Exception(f"API返回错误：{response_data.get('msg')}")
-                        else:
-                            raise Exception(f"HTTP错误代码：{response.status_code}")
-
-                    except Exception as e:
-                        logger.error(f"请求失败：{str(e)}")
-                        # 增加当前代理的请求计数（失败也计数）
-                        if current_proxy:
-                            requests_per_proxy += 1
-                        
-                        # 增加重试计数（仅用于日志显示）
-                        retry_count += 1
-                        
-                        if use_proxy and available_proxies:
-                            # 使用代理时：不检查重试次数限制，只要还有代理可用就继续尝试
-                            # 检查是否达到使用次数限制
-                            if args.proxy_rotate and requests_per_proxy >= args.proxy_rotate:
-                                # 达到限制，切换到下一个代理
-                                if len(available_proxies) > 1:
-                                    # 记录当前代理已尝试过
-                                    tried_proxies.add(proxy_index)
-                                    
-                                    # 切换到下一个代理
-                                    proxy_index = (proxy_index + 1) % len(available_proxies)
-                                    current_proxy = available_proxies[proxy_index]
-                                    requests_per_proxy = 0  # 重置计数
-                                    logger.info(f"代理使用次数已达上限，切换到新代理：{current_proxy}")
-                                    
-                                    # 如果所有代理都尝试过一遍，重置记录（允许再次轮换）
-                                    if len(tried_proxies) >= len(available_proxies):
-                                        tried_proxies.clear()
-                                    
-                                    delay = random.uniform(1, 2)
-                                    logger.info(f"正在重试（第{retry_count}次），{delay:.1f}秒后重试...")
-                                    time.sleep(delay)
-                                    continue
-                                else:
-                                    # 只有一个代理，无法切换，但继续重试（不限制次数）
-                                    delay = random.uniform(1, 2)
-                                    logger.info(f"正在重试（第{retry_count}次），{delay:.1f}秒后重试...")
-                                    time.sleep(delay)
-                                    continue
-                            else:
-                                # 未达到限制，使用当前代理重试（不限制次数）
-                                delay = random.uniform(1, 2)
-                                logger.info(f"正在重试（第{retry_count}次，当前代理已使用{requests_per_proxy}/{args.proxy_rotate or '无限'}次），{delay:.1f}秒后重试...")
-                                time.sleep(delay)
-                                continue
-                        else:
-                            # 未使用代理时：重试当前请求
-                            if retry_count < MAX_MAIN_QUERY_RETRIES:
-                                delay = random.uniform(2, 4)
-                                logger.info(f"正在重试（第{retry_count}/{MAX_MAIN_QUERY_RETRIES}次），{delay:.1f}秒后重试...")
-                                time.sleep(delay)
-                                continue
-                            else:
-                                logger.warning(f"{query_type} 类型查询失败（已重试{MAX_MAIN_QUERY_RETRIES}次），跳过该类型")
-                                break  # 跳出while循环，继续下一个查询类型
-
-                if not success:
-                    logger.warning(f"{query_type} 类型查询失败")
-                    
     except KeyboardInterrupt:
         logger.info("\n操作中断，正在保存数据...")
     finally:
-        write_to_excel(all_results, args.output)
+        dedup.report(len(query_types))
+        for work in scheduler.pending():
+            dead_letter.write(work.unit, f"{work.query_type}: 中断时仍在重试队列")
+        if scheduler.retried:
+            logger.info(f"失败任务重试 {scheduler.retried} 次，最终失败 {scheduler.dead} 个")
+        if dead_letter.count:
+            logger.warning(f"{dead_letter.count} 个单位查询失败，已写入 {args.dead_letter}（可用 -f 重新查询）")
+        client.close()
+        client.profiles.report()
+        if hedger:
+            hedger.report()
+        if resolver:
+            resolver.close()
+            resolver.report()
+            resolver.cache.save()
+        if archive:
+            logger.info(f"已归档 {archive.written} 个原始响应至：{args.archive}")
+            archive.close()
+        save_results(args, dedup, parquet, all_results)
+        if store:
+            store.close()
+
+
+def save_results(args, dedup: UnitDeduplicator, parquet: Optional[ParquetSink],
+                 all_results: Dict[str, List[Record]]) -> None:
+    """写出结果：Parquet 已增量写出，只需关闭；其余格式按输入写法回填后一次写出"""
+    if parquet:
+        parquet.close(dedup.alias_pairs())
+    else:
+        write_results({t: list(dedup.fan_out(rows)) for t, rows in all_results.items()}, args.output)
 
 
-def load_units(args) -> List[str]:
-    """加载查询单位列表"""
+def replay(args, query_types: List[str], dedup: UnitDeduplicator, parquet: Optional[ParquetSink]) -> None:
+    """--replay：从响应归档重新执行 process_response 并写出，不发起网络请求"""
+    try:
+        archive = ResponseArchive(args.replay, create=False)
+    except FileNotFoundError as e:
+        logger.error(f"无法重放：{e}")
+        sys.exit(1)
+    source = load_units(args) if args.file or args.unit_name else archive.units()
+    all_results: Dict[str, List[Record]] = {t: [] for t in query_types}
+    replayed = missing = 0
+    try:
+        for unit in dedup.unique(source):
+            for query_type in query_types:
+                records = archive.replay(clean_unit_name(unit), TYPE_MAPPING[query_type])
+                if records is None:
+                    missing += 1
+                    continue
+                replayed += 1
+                for r in records:
+                    r.queryName = unit
+                if parquet:
+                    parquet.add(query_type, records)
+                else:
+                    all_results[query_type].extend(records)
+    finally:
+        archive.close()
+    logger.info(f"重放完成：{replayed} 个（单位, 类型）来自归档，{missing} 个无归档")
+    save_results(args, dedup, parquet, all_results)
+
+
+def load_units(args) -> Iterator[str]:
+    """加载查询单位（流式读取，按需产出）"""
     if args.file:
+        if args.file != STDIN_PATH and not os.path.isfile(args.file):
+            logger.error(f"加载文件失败: 文件不存在 {args.file}")
+            sys.exit(1)
+        logger.info(f"从 {'标准输入' if args.file == STDIN_PATH else args.file} 流式读取查询单位")
         try:
-            with open(args.file, 'r', encoding='utf-8') as f:
-                units = [line.strip() for line in f if line.strip()]
-                logger.info(f"从文件加载 {len(units)} 个查询单位")
-                return units
-        except Exception as e:
-            logger.error(f"加载文件失败: {str(e)}")
+            units = iter_units(args.file, args.column, args.sheet, header=not args.no_header)
+        except (ValueError, OSError) as e:
+            logger.error(f"加载文件失败: {e}")
             sys.exit(1)
+        return prefetch(units, INPUT_PREFETCH_SIZE)
     elif args.unit_name:
-        return [args.unit_name]
+        return iter([args.unit_name])
     else:
         logger.error("请指定查询单位名称或批量查询文件")
         sys.exit(1)
 
 
 if __name__ == '__main__':
+    # 子命令：lookup 离线查询本地结果库、monitor 定时复查、serve 常驻 HTTP 服务，其余参数按原有方式解析
+    if sys.argv[1:2] == ['lookup']:
+        sys.exit(lookup_main(sys.argv[2:]))
+    if sys.argv[1:2] == ['monitor']:
+        sys.exit(monitor_main(sys.argv[2:]))
+    if sys.argv[1:2] == ['serve']:
+        sys.exit(serve_main(sys.argv[2:]))
     main()
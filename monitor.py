@@ -0,0 +1,202 @@
+"""
+监控模式 — 定期复查固定单位清单，只输出备案新增、注销和变更事件
+
+每一轮把全部 (单位, 类型) 查询均匀分摊到 --window 时间窗口内，相邻查询至少间隔 --min-gap 秒，
+避免突发请求；
+结果与本地结果库中的上一次快照按条目（serviceLicence + 域名）及 dataId / updateRecordTime 比较，
+未变化条目直接复用上次的详情，跳过详情接口调用。事件以 JSON Lines 追加写出。
+"""
+
+import argparse
+import json
+import logging
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from constants import (
+    TYPE_MAPPING, RESULTS_DB_PATH, MONITOR_WINDOW, MONITOR_EVENTS_PATH, MONITOR_MIN_GAP, WORK_TRY_REQUESTS,
+)
+from inputs import iter_units
+from normalize import UnitDeduplicator, canonical_unit_name, clean_unit_name
+from query import DetailLookup, QueryClient, QueryError
+from records import Record
+from store import EntryKey, ResultStore, entry_key
+from proxy_pool import load_proxy_pool
+
+logger = logging.getLogger(__name__)
+
+# 判断同一条目是否发生变更的字段
+CHANGE_FIELDS = ("dataId", "updateRecordTime")
+# 详情接口补充的字段，未变更时从快照复用
+DETAIL_FIELDS = ("mainLicence", "serviceName")
+
+Event = Tuple[str, str, Optional[Record], Optional[Dict[str, Any]]]
+
+
+def diff_snapshot(previous: Dict[EntryKey, Dict[str, Any]], current: List[Record]) -> List[Event]:
+    """
+    比较快照与本次结果，返回 (事件类型, serviceLicence, 当前记录, 上次记录) 列表
+
+    按条目键 (serviceLicence, 域名) 比较：已有网站备案号下增加或删除域名同样输出 add / remove。
+    """
+    events: List[Event] = []
+    seen = set()
+    for record in current:
+        key = entry_key(record)
+        if key is None:
+            continue
+        seen.add(key)
+        old = previous.get(key)
+        if old is None:
+            events.append(("add", key[0], record, None))
+        elif any(old.get(f) != record.get(f) for f in CHANGE_FIELDS):
+            events.append(("change", key[0], record, old))
+    for key, old in previous.items():
+        if key not in seen:
+            events.append(("remove", key[0], None, old))
+    return events
+
+
+def snapshot_detail_lookup(previous: Dict[EntryKey, Dict[str, Any]]) -> DetailLookup:
+    """构造详情缓存回调：dataId 与 updateRecordTime 均未变化时复用快照中的详情字段"""
+    by_data_id = {r["dataId"]: r for r in previous.values() if r.get("dataId") and r.get("serviceName") is not None}
+
+    def lookup(item: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        old = by_data_id.get(item.get("dataId"))
+        if old is None or old.get("updateRecordTime") != item.get("updateRecordTime"):
+            return None
+        return {f: old.get(f) for f in DETAIL_FIELDS}
+
+    return lookup
+
+
+class EventWriter:
+    """JSON Lines 事件输出（追加写入，每条立即落盘）"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.count = 0
+
+    def emit(self, event: str, unit: str, query_type: str, licence: str,
+             record: Optional[Record], previous: Optional[Dict[str, Any]]) -> None:
+        domain = (record.get("domain") if record else None) or (previous or {}).get("domain")
+        line = {
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "event": event,
+            "unit": unit,
+            "type": query_type,
+            "serviceLicence": licence,
+            "domain": domain,
+            "record": record.as_dict() if record else None,
+            "previous": previous,
+        }
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(line, ensure_ascii=False) + "\n")
+        self.count += 1
+        logger.info(f"[{event}] {unit} {query_type} {licence}{f' {domain}' if domain else ''}")
+
+
+def check(client: QueryClient, store: ResultStore, events: EventWriter,
+          unit: str, query_type: str) -> None:
+    """复查一个 (单位, 类型)，输出事件并更新快照"""
+    service_type = TYPE_MAPPING[query_type]
+    key = canonical_unit_name(unit)
+    previous = store.load_snapshot(key, service_type)
+    lookup = snapshot_detail_lookup(previous) if previous else None
+
+    # 限制单次请求数，失败的单位留到下一轮复查，不占用后续单位的时间片
+    records = client.query(clean_unit_name(unit), service_type, detail_lookup=lookup,
+                           max_attempts=WORK_TRY_REQUESTS)
+    for r in records:
+        r.queryName = unit
+    store.upsert(service_type, records)
+    if previous is None:
+        logger.info(f"{unit} {query_type} 首次检查，建立基线（{len(records)} 条）")
+    else:
+        for event, licence, record, old in diff_snapshot(previous, records):
+            events.emit(event, unit, query_type, licence, record, old)
+    store.save_snapshot(key, service_type, records)
+
+
+def run_cycle(client: QueryClient, store: ResultStore, events: EventWriter,
+              units: List[str], query_types: List[str], window: float,
+              min_gap: float = MONITOR_MIN_GAP) -> None:
+    """
+    执行一轮复查：第 i 个查询在 start + i * window / N 时刻发出
+
+    与上一次复查结束至少间隔 min_gap 秒：某次复查超出时间片（认证刷新、多次重试）
+    或窗口过小时，后续查询按 min_gap 逐个发出，而不是连续补发积压的查询。
+    """
+    jobs = [(unit, t) for unit in units for t in query_types]
+    if not jobs:
+        return
+    slot = window / len(jobs)
+    start = time.monotonic()
+    last_done = float("-inf")
+    for i, (unit, query_type) in enumerate(jobs):
+        wait = max(start + i * slot, last_done + min_gap) - time.monotonic()
+        if wait > 0:
+            time.sleep(wait)
+        logger.info(f"\n复查进度：{i + 1}/{len(jobs)} - {unit} ({query_type})")
+        try:
+            check(client, store, events, unit, query_type)
+        except QueryError as e:
+            # 查询失败时不更新快照，也不输出注销事件
+            logger.warning(f"{unit} {query_type} 复查失败，保留上次快照: {e}")
+        last_done = time.monotonic()
+
+
+def monitor_main(argv: List[str]) -> int:
+    """monitor 子命令：长期运行的定时复查"""
+    parser = argparse.ArgumentParser(prog="main.py monitor", description="定期复查单位清单并输出备案变更事件")
+    parser.add_argument("-f", "--file", required=True, help="单位清单文件（txt/csv/tsv/xlsx），每轮重新读取")
+    parser.add_argument("-c", "--column", help="CSV/XLSX 中单位名称所在的列名或列序号（从1开始）")
+    parser.add_argument("--sheet", help="XLSX 工作表名称")
+    parser.add_argument("--no-header", action="store_true", help="CSV/XLSX 首行不是表头（默认首行为表头并跳过）")
+    parser.add_argument("-t", "--type", choices=["web", "app", "miniapp", "quickapp", "all"], default="all",
+                        help="查询类型（默认全部）")
+    parser.add_argument("-p", "--proxy_rotate", type=int, help="代理轮换间隔（每个代理处理N个请求后切换）")
+    parser.add_argument("--proxy-provider", action="append", default=[], metavar="SPEC",
+                        help="代理补充来源，可重复指定：cmd:命令 / dir:投放目录 / http(s)://接口")
+    parser.add_argument("--proxy-auth", action="store_true", help="按代理分别认证（验证码与 token 经由各代理获取）")
+    parser.add_argument("-w", "--window", type=float, default=MONITOR_WINDOW,
+                        help=f"一轮复查的时间窗口（秒，默认 {MONITOR_WINDOW}）")
+    parser.add_argument("--min-gap", type=float, default=MONITOR_MIN_GAP,
+                        help=f"相邻两次复查的最小间隔（秒，默认 {MONITOR_MIN_GAP}）")
+    parser.add_argument("-e", "--events", default=MONITOR_EVENTS_PATH, help=f"事件输出文件（默认 {MONITOR_EVENTS_PATH}）")
+    parser.add_argument("--db", default=RESULTS_DB_PATH, help=f"结果库路径（默认 {RESULTS_DB_PATH}）")
+    parser.add_argument("--once", action="store_true", help="只执行一轮后退出")
+    args = parser.parse_args(argv)
+
+    from auth import AuthManager
+
+    query_types = list(TYPE_MAPPING) if args.type == "all" else [args.type]
+    pool = load_proxy_pool(args.proxy_rotate, args.proxy_provider)
+    client = QueryClient(AuthManager(proxy_affine=args.proxy_auth and pool is not None),
+                         proxy_rotate=args.proxy_rotate, pool=pool)
+    store = ResultStore(args.db)
+    events = EventWriter(args.events)
+
+    try:
+        while True:
+            cycle_start = time.monotonic()
+            try:
+                units = list(UnitDeduplicator().unique(
+                    iter_units(args.file, args.column, args.sheet, header=not args.no_header)))
+            except (ValueError, OSError) as e:
+                logger.error(f"加载单位清单失败: {e}")
+                return 1
+            logger.info(f"开始新一轮复查：{len(units)} 个单位 × {len(query_types)} 种类型，窗口 {args.window:.0f} 秒")
+            run_cycle(client, store, events, units, query_types, args.window, args.min_gap)
+            logger.info(f"本轮复查完成，累计输出 {events.count} 条事件")
+            if args.once:
+                return 0
+            rest = cycle_start + args.window - time.monotonic()
+            if rest > 0:
+                time.sleep(rest)
+    except KeyboardInterrupt:
+        logger.info("\n监控已停止")
+        return 0
+    finally:
+        client.close()
+        store.close()
@@ -0,0 +1,124 @@
+"""
+单位名称规范化与去重模块
+
+同一单位在输入中常以多种写法出现（全角/半角括号、多余空白、结尾标点等），
+将每个输入映射为规范键后每个键只查询一次，结果再回填到所有原始写法。
+实际查询使用清理后的写法（clean_unit_name），与哪种写法先出现无关。
+"""
+
+import logging
+import re
+import unicodedata
+from typing import Dict, Iterable, Iterator, List, Tuple
+
+from records import Record
+
+logger = logging.getLogger(__name__)
+
+_WHITESPACE_RE = re.compile(r"\s+")
+# 括号内侧、CJK 字符之间的空白均视为多余空白
+_SPACE_AROUND_PAREN_RE = re.compile(r"\s*([()])\s*")
+_CJK_SPACE_RE = re.compile(r"(?<=[一-鿿])\s+(?=[一-鿿])")
+# 中文名称与括号之间、括号内侧的空白
+_CJK_PAREN_SPACE_RE = re.compile(r"(?<=[一-鿿])\s+(?=\()|(?<=\))\s+(?=[一-鿿])|(?<=\()\s+|\s+(?=\))")
+_CJK_RE = re.compile(r"[一-鿿]")
+_EDGE_PUNCTUATION = " \t\r\n.,;:!?'\"`、。，；：！？“”‘’·-_"
+_FULLWIDTH_PARENS = str.maketrans("()", "（）")
+
+
+def _strip_edges(name: str) -> str:
+    """去除首尾标点；拉丁字母后的结尾句点是缩写的一部分（如 "Apple Inc."），予以保留"""
+    name = name.lstrip(_EDGE_PUNCTUATION)
+    end = len(name)
+    while end and name[end - 1] in _EDGE_PUNCTUATION:
+        if name[end - 1] == "." and end > 1 and name[end - 2].isascii() and name[end - 2].isalpha():
+            break
+        end -= 1
+    return name[:end]
+
+
+def clean_unit_name(name: str) -> str:
+    """
+    实际查询使用的单位名称：括号、空白、首尾标点不同的各种写法清理后得到同一个查询名称
+
+    NFKC 统一全角字母数字与括号，合并多余空白并去除中文之间、括号内侧的空白，
+    去除首尾标点（保留 "Apple Inc." 这类缩写句点）；含中文的名称使用全角括号，
+    与备案系统中的写法一致，否则使用半角括号。拉丁字母大小写保持不变。
+    """
+    name = unicodedata.normalize("NFKC", name)
+    name = _strip_edges(_WHITESPACE_RE.sub(" ", name).strip())
+    name = _CJK_PAREN_SPACE_RE.sub("", _CJK_SPACE_RE.sub("", name))
+    if _CJK_RE.search(name):
+        name = name.translate(_FULLWIDTH_PARENS)
+    return name
+
+
+def _strip_noise(name: str) -> str:
+    """去除多余空白与首尾标点，仅用于计算规范键"""
+    name = _WHITESPACE_RE.sub(" ", name).strip(_EDGE_PUNCTUATION)
+    return _CJK_SPACE_RE.sub("", name)
+
+
+def canonical_unit_name(name: str) -> str:
+    """
+    计算单位名称的规范键
+
+    NFKC 规范化把全角括号、全角空格、全角字母数字统一为半角，
+    再去除多余空白、首尾标点并忽略拉丁字母大小写。
+    """
+    name = unicodedata.normalize("NFKC", name)
+    name = _strip_noise(name)
+    name = _SPACE_AROUND_PAREN_RE.sub(r"\1", name)
+    return name.casefold()
+
+
+class UnitDeduplicator:
+    """单位去重索引：记录每个规范键的全部原始写法，并统计节省的查询次数"""
+
+    def __init__(self):
+        self._first: Dict[str, str] = {}  # 规范键 -> 首次出现的原始写法
+        # 仅为出现多种写法的键保存额外写法，避免为每个单位都分配列表
+        self._aliases: Dict[str, List[str]] = {}
+        self.total = 0       # 输入条数
+        self.duplicates = 0  # 因重复而跳过的条数
+
+    def unique(self, units: Iterable[str]) -> Iterator[str]:
+        """流式去重：每个规范键只产出首次出现的原始写法"""
+        for unit in units:
+            self.total += 1
+            key = canonical_unit_name(unit)
+            if key not in self._first:
+                self._first[key] = unit
+                yield unit
+                continue
+            self.duplicates += 1
+            aliases = self._aliases.setdefault(key, [])
+            if unit not in aliases:
+                aliases.append(unit)
+
+    def spellings(self, first: str) -> List[str]:
+        """返回与首次写法同键的所有不同原始写法（首次写法在前）"""
+        aliases = self._aliases.get(canonical_unit_name(first), ())
+        return [first] + [a for a in aliases if a != first]
+
+    def alias_pairs(self) -> Iterator[Tuple[str, str]]:
+        """产出 (首次写法, 其他写法) 对，供不回填结果行的输出格式写出映射表"""
+        for key, aliases in self._aliases.items():
+            first = self._first[key]
+            for alias in aliases:
+                if alias != first:
+                    yield first, alias
+
+    def fan_out(self, rows: Iterable[Record]) -> Iterator[Record]:
+        """把按首次写法查询到的结果记录复制到该单位的每种原始写法"""
+        for row in rows:
+            yield row
+            for alias in self.spellings(row.queryName)[1:]:
+                yield row.with_query_name(alias)
+
+    def report(self, types_per_unit: int = 1) -> None:
+        saved = self.duplicates * types_per_unit
+        logger.info(
+            f"输入 {self.total} 条，去重后 {self.total - self.duplicates} 个单位，"
+            f"节省 {saved} 次 API 调用"
+        )
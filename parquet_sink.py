@@ -0,0 +1,101 @@
+"""
+Parquet 输出模块 — 按服务类型写列式文件，查询过程中按行组增量落盘
+
+需要安装可选依赖 pyarrow。每种类型一个文件（<文件名>_<类型>.parquet），
+queryName / unitName / mainLicence 使用字典编码；缓冲满 row_group_size 行即写出一个行组，
+结果不需要全部驻留内存。同一单位的其他输入写法写入 <文件名>_aliases.parquet 映射表。
+"""
+
+import logging
+import os
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from constants import PARQUET_ROW_GROUP_SIZE
+from records import Record
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # 可选依赖
+    pa = pq = None
+
+logger = logging.getLogger(__name__)
+
+# 重复度高的列使用字典编码
+DICTIONARY_FIELDS = ("queryName", "unitName", "mainLicence")
+
+
+def _schema(fields: Tuple[str, ...]):
+    return pa.schema([
+        pa.field(name, pa.dictionary(pa.int32(), pa.string()) if name in DICTIONARY_FIELDS else pa.string())
+        for name in fields
+    ])
+
+
+def _column(values: tuple, dictionary: bool):
+    # dataId 等非字符串字段统一按字符串存储，避免不同批次推断出不同类型
+    arr = pa.array([None if v is None else str(v) for v in values], type=pa.string())
+    return arr.dictionary_encode() if dictionary else arr
+
+
+class ParquetSink:
+    """增量写出的 Parquet 结果输出"""
+
+    def __init__(self, output_file: str, row_group_size: int = PARQUET_ROW_GROUP_SIZE):
+        if pa is None:
+            raise RuntimeError("Parquet 输出需要安装 pyarrow：pip install pyarrow")
+        self.stem = os.path.splitext(output_file)[0]
+        self.row_group_size = row_group_size
+        self._buffers: Dict[str, List[Record]] = {}
+        self._writers: Dict[str, "pq.ParquetWriter"] = {}
+        self._schemas: Dict[str, "pa.Schema"] = {}
+        self.rows_written = 0
+
+    def path_for(self, query_type: str) -> str:
+        return f"{self.stem}_{query_type}.parquet"
+
+    def add(self, query_type: str, records: Iterable[Record]) -> None:
+        """追加记录，缓冲达到行组大小时写出"""
+        buffer = self._buffers.setdefault(query_type, [])
+        buffer.extend(records)
+        if len(buffer) >= self.row_group_size:
+            self.flush(query_type)
+
+    def flush(self, query_type: str) -> None:
+        """把缓冲区写成一个行组"""
+        buffer = self._buffers.get(query_type)
+        if not buffer:
+            return
+        fields = type(buffer[0]).FIELDS
+        writer = self._writers.get(query_type)
+        if writer is None:
+            self._schemas[query_type] = _schema(fields)
+            writer = pq.ParquetWriter(
+                self.path_for(query_type), self._schemas[query_type],
+                compression="zstd", use_dictionary=list(DICTIONARY_FIELDS),
+            )
+            self._writers[query_type] = writer
+        columns = list(zip(*(r.as_tuple() for r in buffer)))
+        arrays = [_column(col, name in DICTIONARY_FIELDS) for name, col in zip(fields, columns)]
+        writer.write_table(pa.Table.from_arrays(arrays, schema=self._schemas[query_type]))
+        self.rows_written += len(buffer)
+        buffer.clear()
+
+    def close(self, alias_pairs: Optional[Iterable[Tuple[str, str]]] = None) -> None:
+        """写出剩余缓冲与输入写法映射表并关闭文件"""
+        for query_type in list(self._buffers):
+            self.flush(query_type)
+        for query_type, writer in self._writers.items():
+            writer.close()
+            logger.info(f"结果已保存至：{self.path_for(query_type)}")
+        if not self._writers:
+            logger.info("无备案数据，未生成 Parquet 文件")
+
+        pairs = list(alias_pairs or ())
+        if pairs:
+            table = pa.Table.from_arrays(
+                [pa.array([p[0] for p in pairs]), pa.array([p[1] for p in pairs])],
+                names=["queryName", "alias"],
+            )
+            pq.write_table(table, f"{self.stem}_aliases.parquet", compression="zstd")
+            logger.info(f"输入写法映射已保存至：{self.stem}_aliases.parquet（{len(pairs)} 条）")
@@ -0,0 +1,237 @@
+"""
+代理池模块 — 运行中热加载 proxy.txt，并可从外部来源补充代理
+
+proxy.txt 修改后自动重新加载（按修改时间检测）；连续失败的代理被停用（至少保留一个），
+可用代理不足时从提供方补充。提供方支持：
+
+    cmd:./get_proxies.sh        执行命令，标准输出每行一个代理
+    dir:./proxy_drop            读取目录中新放入的 *.txt 文件（读取后重命名为 *.loaded）
+    http(s)://host/proxies      GET 接口，返回每行一个代理的文本或 JSON 数组
+
+查询客户端在每次请求前同步代理列表，正在进行的请求继续使用原代理，不会中断批量任务。
+"""
+
+import glob
+import json
+import logging
+import os
+import subprocess
+import threading
+import time
+import urllib.request
+from typing import Dict, List, Optional, Sequence, Set
+
+from constants import (
+    PROXY_FILE, PROXY_RELOAD_INTERVAL, PROXY_MAX_FAILURES, PROXY_POOL_MIN_SIZE,
+    PROXY_REFILL_INTERVAL, PROXY_PROVIDER_TIMEOUT,
+)
+from utils import load_proxies, validate_proxies
+
+logger = logging.getLogger(__name__)
+
+
+def _lines(text: str) -> List[str]:
+    text = text.strip()
+    if text.startswith("["):
+        return [str(p).strip() for p in json.loads(text) if str(p).strip()]
+    return [line.strip() for line in text.splitlines() if line.strip() and not line.startswith("#")]
+
+
+class CommandProvider:
+    """执行命令获取代理（标准输出每行一个）"""
+
+    def __init__(self, command: str):
+        self.command = command
+
+    def __str__(self) -> str:
+        return f"cmd:{self.command}"
+
+    def fetch(self) -> List[str]:
+        result = subprocess.run(self.command, shell=True, capture_output=True, text=True,
+                                timeout=PROXY_PROVIDER_TIMEOUT)
+        if result.returncode != 0:
+            raise RuntimeError(f"命令退出码 {result.returncode}: {result.stderr.strip()[:200]}")
+        return _lines(result.stdout)
+
+
+class FileDropProvider:
+    """读取投放目录中的 *.txt 文件，读取后重命名为 *.loaded，同一文件只加载一次"""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+
+    def __str__(self) -> str:
+        return f"dir:{self.directory}"
+
+    def fetch(self) -> List[str]:
+        proxies: List[str] = []
+        for path in sorted(glob.glob(os.path.join(self.directory, "*.txt"))):
+            with open(path, "r", encoding="utf-8") as f:
+                proxies.extend(_lines(f.read()))
+            os.replace(path, path[:-len(".txt")] + ".loaded")
+        return proxies
+
+
+class HttpProvider:
+    """从 HTTP 接口获取代理（文本每行一个或 JSON 数组）"""
+
+    def __init__(self, url: str):
+        self.url = url
+
+    def __str__(self) -> str:
+        return self.url
+
+    def fetch(self) -> List[str]:
+        with urllib.request.urlopen(self.url, timeout=PROXY_PROVIDER_TIMEOUT) as resp:
+            return _lines(resp.read().decode("utf-8"))
+
+
+def make_provider(spec: str):
+    """按前缀解析提供方：cmd:命令、dir:目录、http(s)://地址"""
+    if spec.startswith("cmd:"):
+        return CommandProvider(spec[4:])
+    if spec.startswith("dir:"):
+        return FileDropProvider(spec[4:])
+    if spec.startswith(("http://", "https://")):
+        return HttpProvider(spec)
+    raise ValueError(f"无法识别的代理提供方：{spec}（应为 cmd:/dir:/http(s)://）")
+
+
+class ProxyPool:
+    """可热更新的代理池（线程安全）；version 在代理列表变化时递增，客户端据此同步"""
+
+    def __init__(self, path: str = PROXY_FILE, providers: Sequence = (),
+                 min_size: int = PROXY_POOL_MIN_SIZE, max_failures: int = PROXY_MAX_FAILURES,
+                 reload_interval: float = PROXY_RELOAD_INTERVAL, refill_interval: float = PROXY_REFILL_INTERVAL):
+        self.path = path
+        self.providers = list(providers)
+        self.min_size = min_size
+        self.max_failures = max_failures
+        self.reload_interval = reload_interval
+        self.refill_interval = refill_interval
+        self.version = 0
+        self._proxies: List[str] = []
+        self._file_proxies: List[str] = []
+        self._provided: List[str] = []
+        self._retired: Set[str] = set()
+        self._failures: Dict[str, int] = {}
+        self._mtime: Optional[float] = None
+        self._last_check = 0.0
+        self._last_refill = float("-inf")
+        self._refilling = False  # 正在从提供方获取代理（同时只进行一次）
+        self._lock = threading.RLock()
+        with self._lock:
+            self._reload_file()
+            if len(self._proxies) < self.min_size:
+                self.refill()
+
+    def snapshot(self) -> List[str]:
+        with self._lock:
+            return list(self._proxies)
+
+    def _rebuild(self) -> None:
+        """按 文件 + 提供方 顺序去重并排除已停用代理；列表变化时 version 加一"""
+        proxies = [p for p in dict.fromkeys(self._file_proxies + self._provided) if p not in self._retired]
+        if proxies != self._proxies:
+            added = len(set(proxies) - set(self._proxies))
+            removed = len(set(self._proxies) - set(proxies))
+            self._proxies = proxies
+            self.version += 1
+            logger.info(f"代理池已更新：新增 {added} 个，移除 {removed} 个，当前 {len(proxies)} 个")
+
+    def _reload_file(self) -> None:
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            return  # 文件不存在（或运行中被删除）时保留现有代理
+        if mtime == self._mtime:
+            return
+        if self._mtime is not None:
+            logger.info(f"{self.path} 已修改，重新加载代理")
+        self._mtime = mtime
+        proxies = validate_proxies(load_proxies(self.path))
+        # 文件中重新列出的代理视为人工确认可用，解除停用
+        self._retired.difference_update(proxies)
+        for p in proxies:
+            self._failures.pop(p, None)
+        self._file_proxies = proxies
+        self._rebuild()
+
+    def refresh(self) -> None:
+        """检查 proxy.txt 是否修改（最多每 reload_interval 秒检查一次）"""
+        now = time.monotonic()
+        with self._lock:
+            if now - self._last_check < self.reload_interval:
+                return
+            self._last_check = now
+            self._reload_file()
+
+    def refill(self) -> int:
+        """
+        从提供方补充代理（最多每 refill_interval 秒一次），返回新增数量
+
+        获取代理（执行命令、请求接口）时不持有锁，期间其他线程照常报告结果与读取代理列表；
+        已有补充正在进行时直接返回 0。
+        """
+        with self._lock:
+            now = time.monotonic()
+            if not self.providers or self._refilling or now - self._last_refill < self.refill_interval:
+                return 0
+            self._last_refill = now
+            self._refilling = True
+        try:
+            results = []
+            for provider in self.providers:
+                try:
+                    results.append((provider, validate_proxies(provider.fetch())))
+                except Exception as e:
+                    logger.error(f"代理提供方 {provider} 获取失败: {e}")
+            with self._lock:
+                before = set(self._proxies)
+                for provider, fetched in results:
+                    fresh = [p for p in fetched if p not in self._retired]
+                    logger.info(f"代理提供方 {provider} 返回 {len(fetched)} 个代理，可用 {len(fresh)} 个")
+                    self._provided.extend(p for p in fresh if p not in self._provided)
+                self._rebuild()
+                return len(set(self._proxies) - before)
+        finally:
+            with self._lock:
+                self._refilling = False
+
+    def _refill_in_background(self) -> None:
+        """在后台线程中补充代理，不阻塞报告请求结果的查询线程"""
+        with self._lock:
+            if not self.providers or self._refilling:
+                return
+        threading.Thread(target=self.refill, name="proxy-refill", daemon=True).start()
+
+    def failures(self, proxy: str) -> int:
+        """代理当前的连续失败次数"""
+        with self._lock:
+            return self._failures.get(proxy, 0)
+
+    def report(self, proxy: str, ok: bool) -> None:
+        """记录一次请求结果；连续失败 max_failures 次的代理停用（至少保留一个），不足时在后台补充"""
+        with self._lock:
+            if ok:
+                self._failures.pop(proxy, None)
+                return
+            failures = self._failures.get(proxy, 0) + 1
+            self._failures[proxy] = failures
+            if failures < self.max_failures or proxy not in self._proxies or len(self._proxies) <= 1:
+                return
+            self._retired.add(proxy)
+            logger.warning(f"代理 {proxy} 连续失败 {failures} 次，已停用")
+            self._rebuild()
+            if len(self._proxies) < self.min_size:
+                self._refill_in_background()
+
+
+def load_proxy_pool(proxy_rotate: Optional[int], provider_specs: Sequence[str] = ()) -> Optional[ProxyPool]:
+    """创建代理池（只有指定了 -p 参数时才使用代理）"""
+    if proxy_rotate is None:
+        return None
+    pool = ProxyPool(providers=[make_provider(spec) for spec in provider_specs])
+    if not pool.snapshot():
+        logger.warning("指定了代理轮换参数但暂无有效代理，将直连查询，proxy.txt 更新或提供方补充后自动启用代理")
+    return pool
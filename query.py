@@ -0,0 +1,485 @@
+"""
+查询客户端模块 — 封装主查询与详情查询的请求、重试、代理轮换和 token 刷新逻辑
+
+批量查询（main）、监控模式（monitor）共用同一个客户端，代理轮换计数保存在客户端实例上。
+请求经由按 (出口, 指纹配置) 复用的 curl_cffi 会话发出，连续请求不再重复 TCP/TLS 握手；
+代理轮换状态由锁保护，常驻服务可以在多个线程中同时查询不同单位。
+"""
+
+import logging
+import random
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from curl_cffi import requests as cffi_requests
+
+from constants import (
+    QUERY_URL,
+    DETAIL_QUERY_URL,
+    DEFAULT_TIMEOUT,
+    MAX_MAIN_QUERY_RETRIES,
+    MAX_DETAIL_QUERY_RETRIES,
+)
+from fingerprint import BrowserProfile, ProfilePool
+from archive import ResponseArchive
+from hedge import Hedger
+from proxy_pool import ProxyPool
+from records import Record
+from utils import process_response, format_proxy
+
+logger = logging.getLogger(__name__)
+
+# 详情缓存回调：传入列表项，返回可复用的详情（mainLicence/serviceName），None 表示需要实际查询
+DetailLookup = Callable[[Dict[str, Any]], Optional[Dict[str, Any]]]
+
+
+class QueryError(Exception):
+    """查询失败（已达到重试上限）"""
+
+
+class NoProxyAvailableError(QueryError):
+    """返回 403 且没有其他代理可以切换"""
+
+
+class RetryBudget:
+    """一次 query 调用（列表与全部详情查询）共用的失败请求次数上限，limit 为 None 时不限"""
+
+    def __init__(self, limit: Optional[int] = None):
+        self.limit = limit
+        self.failures = 0
+
+    @property
+    def exhausted(self) -> bool:
+        return self.limit is not None and self.failures >= self.limit
+
+    def fail(self) -> None:
+        """记录一次失败的请求（异常、403、401 或错误响应），达到上限时抛出 QueryError"""
+        self.failures += 1
+        if self.exhausted:
+            raise QueryError(f"本轮失败请求已达{self.limit}次")
+
+
+class QueryClient:
+    """ICP 备案查询客户端"""
+
+    def __init__(self, auth_manager: Any, proxies: Optional[List[str]] = None,
+                 proxy_rotate: Optional[int] = None, pool: Optional[ProxyPool] = None,
+                 hedger: Optional[Hedger] = None, archive: Optional[ResponseArchive] = None):
+        self.auth_manager = auth_manager
+        # 指定代理池时代理列表随池热更新（proxies 参数被忽略）
+        self.pool = pool
+        self._pool_version = pool.version if pool else 0
+        self.proxies: List[str] = pool.snapshot() if pool else (proxies or [])
+        self.proxy_rotate = proxy_rotate
+        self.hedger = hedger  # 指定时慢请求经由另一个代理对冲（需要至少两个代理）
+        self.archive = archive  # 指定时保存每个成功的列表 / 详情原始响应，供离线重放
+        self.proxy_index = 0         # 代理索引，用于轮询
+        self.requests_per_proxy = 0  # 当前代理已处理的请求数
+        self._pending_counts: Dict[str, int] = {}  # 非当前代理（对冲请求）已处理的请求数，轮换到该代理时计入
+        # 浏览器指纹按代理粘滞分配；与认证共用同一个配置池，token 与查询请求的指纹保持一致
+        self.profiles: ProfilePool = getattr(auth_manager, "profiles", None) or ProfilePool()
+        # 保护代理列表、轮换索引与计数（常驻服务多个线程共用一个客户端）
+        self._lock = threading.RLock()
+        self._sessions: Dict[Tuple[Optional[str], str], List[Any]] = {}  # (代理, 指纹配置名) -> 空闲会话
+
+    @property
+    def use_proxy(self) -> bool:
+        return len(self.proxies) > 0
+
+    @property
+    def current_proxy(self) -> Optional[str]:
+        with self._lock:
+            return self.proxies[self.proxy_index] if self.proxies else None
+
+    def _rotate_proxy(self) -> Optional[str]:
+        """切换到下一个代理并重置计数"""
+        with self._lock:
+            self.proxy_index = (self.proxy_index + 1) % len(self.proxies)
+            self.requests_per_proxy = self._pending_counts.pop(self.current_proxy, 0)
+            return self.current_proxy
+
+    def _count_request(self, proxy: Optional[str]) -> None:
+        """
+        经由代理发出的请求（成功或失败）计入该代理的轮换计数
+
+        非当前代理的请求（对冲补发）先记下，轮换到该代理时计入，每个代理处理的请求总数仍受 -p N 限制。
+        """
+        if proxy:
+            with self._lock:
+                if proxy == self.current_proxy:
+                    self.requests_per_proxy += 1
+                else:
+                    self._pending_counts[proxy] = self._pending_counts.get(proxy, 0) + 1
+
+    def _sync_pool(self) -> None:
+        """代理池有变化时同步代理列表：当前代理仍可用则继续使用，否则从第一个开始"""
+        if not self.pool:
+            return
+        self.pool.refresh()
+        with self._lock:
+            if self.pool.version == self._pool_version:
+                return
+            current = self.current_proxy
+            self.proxies = self.pool.snapshot()
+            self._pool_version = self.pool.version
+            if current in self.proxies:
+                self.proxy_index = self.proxies.index(current)
+            else:
+                self.proxy_index = 0
+                self.requests_per_proxy = self._pending_counts.pop(self.current_proxy, 0)
+                if self.proxies:
+                    logger.info(f"代理列表已更新，切换到代理 #1: {self.current_proxy}")
+
+    def _replenish(self) -> bool:
+        """没有其他代理可切换时尝试从代理池补充，返回补充后是否有其他代理可用"""
+        if not self.pool:
+            return False
+        self.pool.refill()
+        self._sync_pool()
+        with self._lock:
+            if len(self.proxies) > 1:
+                self._rotate_proxy()
+                return True
+        return False
+
+    def _switch_from(self, proxy: Optional[str]) -> Optional[str]:
+        """
+        经由 proxy 的请求被拒绝（403）后切换到下一个代理，返回之后使用的代理；没有其他代理时返回 None
+
+        同时失败的多个请求只切换一次：其他线程已从 proxy 切走时沿用其结果。
+        """
+        with self._lock:
+            if len(self.proxies) < 2:
+                return None
+            if self.current_proxy == proxy:
+                self._rotate_proxy()
+            return self.current_proxy
+
+    def _rotate_if_spent(self, proxy: Optional[str]) -> Tuple[Optional[str], int]:
+        """
+        经由 proxy 的请求失败后检查轮换间隔：proxy 仍是当前代理且已用满时切换
+
+        返回 (切换后的代理，未切换时为 None, 当前代理已处理的请求数)。
+        """
+        with self._lock:
+            if (proxy == self.current_proxy and self.proxy_rotate and len(self.proxies) > 1
+                    and self.requests_per_proxy >= self.proxy_rotate):
+                return self._rotate_proxy(), self.requests_per_proxy
+            return None, self.requests_per_proxy
+
+    def _reset_count(self, proxy: Optional[str]) -> None:
+        """proxy 仍是当前代理时重新开始计数（如其凭据刚刚刷新）"""
+        with self._lock:
+            if proxy == self.current_proxy:
+                self.requests_per_proxy = 0
+
+    def _rotate_if_due(self) -> Optional[str]:
+        """使用代理时：在每次请求前同步代理池，并检查是否需要轮换代理；返回本次请求使用的代理"""
+        self._sync_pool()
+        with self._lock:
+            if self.use_proxy and self.proxy_rotate and self.requests_per_proxy >= self.proxy_rotate:
+                proxy = self._rotate_proxy()
+                logger.info(f"达到轮换间隔，切换到代理 #{self.proxy_index + 1}: {proxy}")
+            return self.current_proxy
+
+    @contextmanager
+    def _session(self, proxy: Optional[str], profile: BrowserProfile) -> Iterator[Any]:
+        """
+        取出该出口与指纹配置的一个空闲会话（没有时新建），请求结束后放回
+
+        会话保持到目标站点（经由代理时为到代理）的连接，后续请求不再重复 TCP/TLS 握手；
+        同一会话同时只被一个请求使用，并发请求各自取用不同会话。
+        """
+        key = (proxy, profile.name)
+        with self._lock:
+            idle = self._sessions.get(key)
+            session = idle.pop() if idle else None
+        if session is None:
+            session = cffi_requests.Session(impersonate=profile.impersonate)
+        try:
+            yield session
+        finally:
+            # 认证信息由请求头携带，不沿用响应设置的 Cookie，与此前的独立请求一致
+            session.cookies.clear()
+            with self._lock:
+                self._sessions.setdefault(key, []).append(session)
+
+    def close(self) -> None:
+        """关闭全部空闲会话（释放保持的连接）"""
+        with self._lock:
+            sessions = [s for idle in self._sessions.values() for s in idle]
+            self._sessions.clear()
+        for session in sessions:
+            session.close()
+
+    def _send(self, url: str, payload: Dict[str, Any], proxy: Optional[str],
+              settled: Optional[threading.Event] = None):
+        """
+        通过指定代理发送请求，TLS 指纹与请求头使用该代理粘滞的同一个指纹配置
+
+        按代理认证时使用该代理自己的凭据（尚未认证的代理先经由它完成认证）。
+        返回 (响应, 本次请求所用凭据的版本, 代理)，收到 401 时据此判断 token 是否已被其他请求刷新。
+        settled 已设置时（对冲已由另一个请求胜出）本次结果被丢弃，不再向代理池报告成败。
+        """
+        profile = self.profiles.for_key(proxy)
+        try:
+            # 认证失败（按代理认证时经由该代理获取 token / 验证码）同样计为该代理的一次失败
+            cred = self.auth_manager.credential_for(proxy)
+            with self._session(proxy, profile) as session:
+                response = session.post(
+                    url,
+                    headers=profile.headers(cred.headers),
+                    json=payload,
+                    proxies=format_proxy(proxy) if proxy else None,
+                    timeout=DEFAULT_TIMEOUT,
+                    verify=False  # 禁用SSL证书验证
+                )
+        except Exception:
+            if proxy and self.pool and not (settled and settled.is_set()):
+                self.pool.report(proxy, ok=False)
+            raise
+        self.profiles.record(profile, response.status_code)
+        if proxy and self.pool and not (settled and settled.is_set()):
+            self.pool.report(proxy, ok=response.status_code != 403)
+        return response, cred.version, proxy
+
+    def _alternate_proxy(self, primary: Optional[str]) -> Optional[str]:
+        """
+        对冲使用的备用代理：列表中 primary 之后第一个没有连续失败记录、且已有可用凭据的代理
+
+        按代理认证时尚未认证的代理会先识别验证码，比直接等待主请求还慢，不用于对冲。
+        """
+        with self._lock:
+            proxies = list(self.proxies)
+        n = len(proxies)
+        start = proxies.index(primary) if primary in proxies else -1
+        for i in range(1, n):
+            candidate = proxies[(start + i) % n]
+            if candidate == primary or (self.pool and self.pool.failures(candidate)):
+                continue
+            if self.auth_manager.has_credential(candidate):
+                return candidate
+        return None
+
+    def _post(self, url: str, payload: Dict[str, Any], proxy: Optional[str]):
+        """
+        发送请求（启用对冲且有其他代理时可能由备用代理返回），返回 (响应, 凭据版本, 实际使用的代理)
+
+        经由 proxy 的请求由调用方计数；对冲补发的请求胜出时在这里计入备用代理。
+        落败的请求无法中断，在后台结束后既不计入轮换计数，也不向代理池报告成败。
+        """
+        with self._lock:
+            alternatives = len(self.proxies) > 1
+        if not (self.hedger and proxy and alternatives):
+            return self._send(url, payload, proxy)
+
+        settled = threading.Event()
+        try:
+            result = self.hedger.call(
+                lambda p: self._send(url, payload, p, settled), proxy, self._alternate_proxy,
+                succeeded=lambda result: result[0].status_code == 200,
+            )
+        finally:
+            settled.set()
+        if result[2] != proxy:
+            self._count_request(result[2])
+        return result
+
+    def query(self, unit_name: str, service_type: int,
+              detail_lookup: Optional[DetailLookup] = None,
+              max_attempts: Optional[int] = None) -> List[Record]:
+        """
+        查询单位在指定服务类型下的备案信息
+
+        使用代理时无限重试（按轮换规则切换代理），未使用代理时最多重试 MAX_MAIN_QUERY_RETRIES 次。
+        指定 max_attempts 时，列表请求与全部详情请求合计最多失败 max_attempts 次（成功的请求不计），
+        即本次调用最多发出 1 + 详情数 + max_attempts 次请求；列表请求失败时交由调用方稍后重试
+        （见 scheduler.WorkScheduler）。详情未能获取的条目保留列表字段（serviceName 为空）并记录日志，
+        预算在详情查询中用尽后其余条目不再查询详情。
+
+        Raises:
+            NoProxyAvailableError: 返回 403 且无其他代理可用
+            QueryError: 未使用代理且达到重试上限，或列表请求失败次数达到 max_attempts
+        """
+        retry_count = 0
+        budget = RetryBudget(max_attempts)
+        first = True
+
+        while True:
+            if not first:
+                budget.fail()  # 回到循环开头说明上一次请求失败
+            first = False
+            current_proxy = self._rotate_if_due()
+
+            try:
+                response, version, egress = self._post(
+                    QUERY_URL,
+                    {"pageNum": "1", "pageSize": "100", "unitName": unit_name, "serviceType": service_type},
+                    current_proxy,
+                )
+
+                # 增加当前代理的请求计数（每次请求都计数，包括重试）
+                self._count_request(current_proxy)
+
+                # 403 处理逻辑
+                if response.status_code == 403:
+                    logger.warning(f"代理 {current_proxy} 返回403，尝试切换代理...")
+                    switched = self._switch_from(current_proxy)
+                    if switched:
+                        # 立即切换到下一个代理
+                        logger.info(f"已切换到新代理：{switched}")
+                        continue
+                    if self._replenish():
+                        logger.info(f"已从代理池补充代理，切换到：{self.current_proxy}")
+                        continue
+                    logger.error("无其他代理可用")
+                    raise NoProxyAvailableError("返回403且无其他代理可用")
+
+                # 处理响应数据
+                if response.status_code == 200:
+                    response_data = response.json()
+                    if response_data.get("code") == 401:
+                        self.auth_manager.update_headers(egress, stale_version=version)
+                        logger.info("Token已更新，正在重试...")
+                        continue
+
+                    if response_data.get("success"):
+                        if self.archive:
+                            self.archive.put(unit_name, service_type, None, response_data)
+
+                        def fetch_detail(item: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+                            if detail_lookup:
+                                cached = detail_lookup(item)
+                                if cached is not None:
+                                    return cached
+                            if budget.exhausted:
+                                logger.warning(f"本轮失败请求已达上限，跳过详情查询 (dataId={item['dataId']})")
+                                return None
+                            try:
+                                detail = self.fetch_detail(item["dataId"], service_type, budget, unit_name)
+                            except QueryError as e:
+                                detail = None
+                                logger.warning(f"详情查询失败 (dataId={item['dataId']}): {e}")
+                            if detail is None:
+                                logger.warning(f"详情未能获取，保留列表记录 (dataId={item['dataId']})")
+                            return detail
+
+                        return process_response(response_data, service_type, fetch_detail)
+                    raise Exception(f"API返回错误：{response_data.get('msg')}")
+                raise Exception(f"HTTP错误代码：{response.status_code}")
+
+            except QueryError:
+                raise
+            except Exception as e:
+                logger.error(f"请求失败：{str(e)}")
+                # 增加当前代理的请求计数（失败也计数）
+                self._count_request(current_proxy)
+
+                # 增加重试计数（仅用于日志显示）
+                retry_count += 1
+
+                if self.use_proxy:
+                    # 使用代理时：不检查重试次数限制，只要还有代理可用就继续尝试
+                    switched, used = self._rotate_if_spent(current_proxy)
+                    delay = random.uniform(1, 2)
+                    if switched:
+                        # 达到限制，切换到下一个代理
+                        logger.info(f"代理使用次数已达上限，切换到新代理：{switched}")
+                        logger.info(f"正在重试（第{retry_count}次），{delay:.1f}秒后重试...")
+                    else:
+                        # 未达到限制或只有一个代理：使用当前代理重试（不限制次数）
+                        logger.info(f"正在重试（第{retry_count}次，当前代理已使用{used}/{self.proxy_rotate or '无限'}次），{delay:.1f}秒后重试...")
+                    time.sleep(delay)
+                    continue
+
+                # 未使用代理时：重试当前请求
+                if retry_count < MAX_MAIN_QUERY_RETRIES:
+                    delay = random.uniform(2, 4)
+                    logger.info(f"正在重试（第{retry_count}/{MAX_MAIN_QUERY_RETRIES}次），{delay:.1f}秒后重试...")
+                    time.sleep(delay)
+                    continue
+                raise QueryError(f"已重试{MAX_MAIN_QUERY_RETRIES}次仍失败：{e}") from e
+
+    def _refresh_auth(self, proxy: Optional[str], stale_version: int) -> bool:
+        """刷新该出口的认证（已被其他请求刷新时直接复用），返回是否成功"""
+        try:
+            self.auth_manager.update_headers(proxy, stale_version=stale_version)
+            return True
+        except Exception as refresh_err:
+            logger.error(f"刷新认证失败: {refresh_err}")
+            return False
+
+    def fetch_detail(self, data_id: str, service_type: int, budget: Optional[RetryBudget] = None,
+                     unit_name: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """
+        调用详情接口获取 APP/小程序/快应用的详细信息（支持代理轮换 + token 过期自动刷新）
+
+        使用代理时无限重试，未使用代理时最多重试 MAX_DETAIL_QUERY_RETRIES 次，失败返回 None；
+        指定 budget 时每次失败的请求计入其中（与列表请求共用），达到上限时抛出 QueryError。
+        """
+        detail_retry = 0
+        budget = budget or RetryBudget()
+        # token 是否已刷新过（避免反复刷新还失败时无限循环）
+        token_refreshed = False
+        max_detail_retries = float('inf') if self.use_proxy else MAX_DETAIL_QUERY_RETRIES
+        first = True
+
+        while True:
+            detail_retry += 1
+            if not first:
+                budget.fail()  # 回到循环开头说明上一次请求失败
+            first = False
+            detail_proxy = self._rotate_if_due()
+
+            try:
+                detail_resp, version, egress = self._post(
+                    DETAIL_QUERY_URL, {"dataId": data_id, "serviceType": service_type}, detail_proxy
+                )
+                self._count_request(detail_proxy)
+
+                if detail_resp.status_code == 200:
+                    detail_data = detail_resp.json()
+                    if detail_data.get("success") and "params" in detail_data:
+                        if self.archive:
+                            self.archive.put(unit_name, service_type, data_id, detail_data)
+                        return detail_data["params"]
+
+                    # HTTP 200 但 code=401 或提示 token 失效：刷新认证后用新 token 重新尝试
+                    expired = detail_data.get("code") == 401
+                    error_msg = "code=401" if expired else detail_data.get('msg', '未知错误')
+                    if (expired or "token" in error_msg.lower()) and not token_refreshed:
+                        logger.warning(f"详情查询 token 过期 (dataId={data_id})，正在刷新认证...")
+                        # 刷新失败也标记已尝试过，避免无限刷新
+                        token_refreshed = True
+                        if self._refresh_auth(egress, version):
+                            detail_retry = 0  # 重置重试计数
+                            self._reset_count(detail_proxy)  # 新 token 意味着新开始
+                            logger.info("认证已刷新，继续重试详情查询...")
+                            time.sleep(random.uniform(1, 2))
+                            continue
+                elif detail_resp.status_code == 403 and self._switch_from(detail_proxy):
+                    # 403错误：切换代理（请求已计数，切换代理时重置计数）
+                    logger.warning(f"详情查询403错误 (dataId={data_id}, 第{detail_retry}次)，切换到代理: {self.current_proxy}")
+                    time.sleep(random.uniform(1, 2))
+                    continue
+                else:
+                    error_msg = f"HTTP错误 状态码{detail_resp.status_code}"
+            except Exception as e:
+                error_msg = str(e)
+                # 增加代理请求计数（失败也计数）
+                self._count_request(detail_proxy)
+                # 达到代理使用次数限制时切换代理后继续重试（不检查重试次数）
+                switched, _ = self._rotate_if_spent(detail_proxy)
+                if switched:
+                    logger.warning(f"详情查询异常 (dataId={data_id}, 第{detail_retry}次): {error_msg}，代理使用次数达上限，切换到代理: {switched}")
+                    time.sleep(random.uniform(1, 2))
+                    continue
+
+            if detail_retry < max_detail_retries:
+                logger.warning(f"详情查询失败 (dataId={data_id}, 第{detail_retry}次): {error_msg}，正在重试...")
+                time.sleep(random.uniform(1, 2))  # 短暂延迟后重试
+                continue
+            logger.warning(f"详情查询失败 (dataId={data_id}, 已重试{detail_retry}次): {error_msg}")
+            return None
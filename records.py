@@ -0,0 +1,82 @@
+"""
+结果记录类型 — 以 __slots__ 数据类代替逐行 dict
+
+每行 dict 都要保存一份键名哈希表，批量查询时数十万行全部驻留在内存中；
+slots 数据类只保存字段值，同时对大量重复的单位名称/备案号做字符串驻留。
+"""
+
+import sys
+from dataclasses import dataclass, replace
+from typing import Any, Dict, Optional, Tuple, Union
+
+
+def intern_str(value: Optional[str]) -> Optional[str]:
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+class _RecordMixin:
+    """记录公共方法：兼容 dict 风格的 get，并提供按列顺序导出"""
+
+    __slots__ = ()
+    FIELDS: Tuple[str, ...] = ()
+
+    def __post_init__(self):
+        # 同一单位的所有记录共享这些字段值
+        self.queryName = intern_str(self.queryName)
+        self.unitName = intern_str(self.unitName)
+        self.mainLicence = intern_str(self.mainLicence)
+
+    def get(self, name: str, default: Any = None) -> Any:
+        return getattr(self, name, default)
+
+    def as_tuple(self) -> tuple:
+        return tuple(getattr(self, f) for f in self.FIELDS)
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {f: getattr(self, f) for f in self.FIELDS}
+
+    def with_query_name(self, query_name: str) -> "Record":
+        return replace(self, queryName=query_name)
+
+
+@dataclass(slots=True)
+class WebRecord(_RecordMixin):
+    """网站备案记录（serviceType=1）"""
+    queryName: Optional[str] = None  # 原始输入写法
+    unitName: Optional[str] = None
+    mainLicence: Optional[str] = None
+    serviceLicence: Optional[str] = None
+    updateRecordTime: Optional[str] = None
+    domain: Optional[str] = None
+
+
+@dataclass(slots=True)
+class AppRecord(_RecordMixin):
+    """APP / 小程序 / 快应用备案记录（serviceType=6/7/8），详情字段来自详情接口"""
+    queryName: Optional[str] = None
+    unitName: Optional[str] = None
+    mainLicence: Optional[str] = None
+    serviceLicence: Optional[str] = None
+    updateRecordTime: Optional[str] = None
+    dataId: Optional[Any] = None
+    serviceName: Optional[str] = None
+
+
+@dataclass(slots=True)
+class ResolvedWebRecord(WebRecord):
+    """附带域名解析结果的网站备案记录（--resolve），多个值以分号分隔"""
+    ipv4: Optional[str] = None
+    ipv6: Optional[str] = None
+    cname: Optional[str] = None
+
+
+WebRecord.FIELDS = tuple(WebRecord.__slots__)
+AppRecord.FIELDS = tuple(AppRecord.__slots__)
+ResolvedWebRecord.FIELDS = WebRecord.FIELDS + tuple(ResolvedWebRecord.__slots__)
+
+Record = Union[WebRecord, ResolvedWebRecord, AppRecord]
+
+
+def record_class(service_type: int) -> type:
+    """按服务类型返回记录类"""
+    return WebRecord if service_type == 1 else AppRecord
@@ -0,0 +1,114 @@
+"""
+查询调度模块 — 失败任务进入延迟重试队列，新任务继续执行，不再阻塞后续单位
+
+每个任务（单位, 类型）单次执行只做有限次请求；失败后按指数退避放入重试队列，
+期间继续处理新的任务。多次执行仍失败的任务写入死信文件（每行一个单位名称），
+可直接用 -f 重新查询。
+"""
+
+import heapq
+import itertools
+import logging
+import random
+import time
+from typing import Callable, Generic, Iterable, List, NamedTuple, Optional, Set, Tuple, TypeVar
+
+from constants import MAX_WORK_ATTEMPTS, RETRY_BASE_DELAY, RETRY_MAX_DELAY
+from query import QueryError
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class WorkItem(NamedTuple):
+    """批量查询的一个任务：单位（原始输入写法）与查询类型"""
+    unit: str
+    query_type: str
+
+    def __str__(self) -> str:
+        return f"{self.unit} [{self.query_type}]"
+
+
+class DeadLetterWriter:
+    """死信输出：按首次失败顺序写出单位名称（同一单位只写一次），格式与 -f 输入一致"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._written: Set[str] = set()
+
+    def write(self, unit: str, reason: str) -> None:
+        logger.error(f"{unit} 已达到最大尝试次数，写入死信文件 {self.path}: {reason}")
+        if unit in self._written:
+            return
+        self._written.add(unit)
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(unit + "\n")
+
+    @property
+    def count(self) -> int:
+        return len(self._written)
+
+
+class WorkScheduler(Generic[T]):
+    """带延迟重试队列的任务调度器（单线程，按到期时间优先执行重试任务）"""
+
+    def __init__(self, handler: Callable[[T], None], on_dead: Callable[[T, Exception], None],
+                 max_attempts: int = MAX_WORK_ATTEMPTS, base_delay: float = RETRY_BASE_DELAY,
+                 max_delay: float = RETRY_MAX_DELAY):
+        self.handler = handler
+        self.on_dead = on_dead
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        # (到期时间, 序号, 已尝试次数, 任务)
+        self._retry: List[Tuple[float, int, int, T]] = []
+        self._seq = itertools.count()
+        self.retried = 0
+        self.dead = 0
+
+    def _backoff(self, attempt: int) -> float:
+        delay = min(self.base_delay * (2 ** (attempt - 1)), self.max_delay)
+        return delay * random.uniform(0.8, 1.2)
+
+    def _execute(self, work: T, attempt: int) -> None:
+        try:
+            self.handler(work)
+        except QueryError as e:
+            if attempt >= self.max_attempts:
+                self.dead += 1
+                self.on_dead(work, e)
+                return
+            delay = self._backoff(attempt)
+            self.retried += 1
+            logger.warning(f"{work} 第{attempt}次执行失败（{e}），{delay:.0f}秒后重试，继续处理其他任务")
+            heapq.heappush(self._retry, (time.monotonic() + delay, next(self._seq), attempt, work))
+
+    def pending(self) -> List[T]:
+        """重试队列中尚未完成的任务（例如中断时）"""
+        return [item for _, _, _, item in sorted(self._retry)]
+
+    def run(self, work: Iterable[T]) -> None:
+        """执行全部任务：到期的重试任务优先，其余时间处理新任务；新任务耗尽后等待重试队列清空"""
+        fresh = iter(work)
+        exhausted = False
+        while True:
+            if self._retry and self._retry[0][0] <= time.monotonic():
+                _, _, attempt, item = heapq.heappop(self._retry)
+                logger.info(f"\n重试任务（第{attempt + 1}次）：{item}")
+                self._execute(item, attempt + 1)
+                continue
+
+            if not exhausted:
+                item: Optional[T] = next(fresh, None)
+                if item is not None:
+                    self._execute(item, 1)
+                    continue
+                exhausted = True
+
+            if not self._retry:
+                return
+            wait = self._retry[0][0] - time.monotonic()
+            if wait > 0:
+                logger.info(f"等待重试队列（{len(self._retry)} 个任务），{wait:.0f}秒后执行下一个")
+                time.sleep(wait)
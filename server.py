@@ -0,0 +1,240 @@
+"""
+常驻查询服务 — 本地 HTTP/JSON 接口，认证与模型只加载一次
+
+    python main.py serve --port 8765
+    curl 'http://127.0.0.1:8765/icp?unit=xxxx有限公司&type=app'
+
+进程常驻：cv2/ddddocr/ONNX 模型与认证凭据只在启动时加载一次，后台线程在凭据过期前主动刷新。
+相同 (单位, 类型) 的结果在 TTL 内直接返回缓存；同时到达的相同请求合并为一次上游查询。
+不同单位的上游查询最多 --upstream-concurrency 个同时进行（共用同一客户端的连接会话与代理轮换状态），
+等待名额超过 SERVE_UPSTREAM_WAIT 秒时返回 503，慢查询不会无限期阻塞其他单位。每个响应附带 latency_ms。
+"""
+
+import argparse
+import json
+import logging
+import threading
+import time
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+from constants import (
+    TYPE_MAPPING, RESULTS_DB_PATH, WORK_TRY_REQUESTS,
+    SERVE_HOST, SERVE_PORT, SERVE_CACHE_TTL, SERVE_CACHE_MAX, SERVE_AUTH_MAX_AGE,
+    SERVE_UPSTREAM_CONCURRENCY, SERVE_UPSTREAM_WAIT,
+)
+from normalize import canonical_unit_name, clean_unit_name
+from query import QueryClient, QueryError
+from store import ResultStore
+from proxy_pool import load_proxy_pool
+
+logger = logging.getLogger(__name__)
+
+Rows = List[Dict[str, Any]]
+
+
+class ServiceBusyError(QueryError):
+    """等待上游查询名额超时"""
+
+
+class QueryService:
+    """带结果缓存与请求合并的查询服务（线程安全）"""
+
+    def __init__(self, client: QueryClient, store: Optional[ResultStore] = None,
+                 cache_ttl: float = SERVE_CACHE_TTL, cache_max: int = SERVE_CACHE_MAX,
+                 upstream_concurrency: int = SERVE_UPSTREAM_CONCURRENCY, upstream_wait: float = SERVE_UPSTREAM_WAIT):
+        self.client = client
+        self.store = store
+        self.cache_ttl = cache_ttl
+        self.cache_max = cache_max
+        self.upstream_wait = upstream_wait
+        self._cache: Dict[Tuple[str, int], Tuple[float, Rows]] = {}  # 键 -> (过期时间, 结果)
+        self._inflight: Dict[Tuple[str, int], Future] = {}
+        self._guard = threading.Lock()
+        # 限制同时进行的上游查询数；QueryClient 自身对轮换状态加锁，可在多个线程中共用
+        self._upstream = threading.BoundedSemaphore(upstream_concurrency)
+        self._store_lock = threading.Lock()  # 结果库连接在请求线程间共用，写入串行
+        self.stats = {"requests": 0, "cache_hits": 0, "coalesced": 0, "upstream": 0, "errors": 0}
+
+    def snapshot_stats(self) -> Dict[str, int]:
+        with self._guard:
+            return dict(self.stats)
+
+    def _cache_put(self, key: Tuple[str, int], rows: Rows) -> None:
+        now = time.monotonic()
+        if len(self._cache) >= self.cache_max:
+            for k in [k for k, (expires, _) in self._cache.items() if expires <= now]:
+                del self._cache[k]
+            while len(self._cache) >= self.cache_max:
+                del self._cache[next(iter(self._cache))]
+        self._cache[key] = (now + self.cache_ttl, rows)
+
+    def lookup(self, unit: str, query_type: str) -> Tuple[Rows, str]:
+        """
+        查询单位在指定类型下的备案信息，返回 (记录列表, 来源)
+
+        来源为 cache（缓存命中）、coalesced（合并到进行中的相同查询）或 upstream（实际查询）。
+
+        Raises:
+            ServiceBusyError: upstream_wait 秒内未轮到上游查询
+            QueryError: 上游查询失败
+        """
+        service_type = TYPE_MAPPING[query_type]
+        key = (canonical_unit_name(unit), service_type)
+        with self._guard:
+            self.stats["requests"] += 1
+            cached = self._cache.get(key)
+            if cached and cached[0] > time.monotonic():
+                self.stats["cache_hits"] += 1
+                return cached[1], "cache"
+            future = self._inflight.get(key)
+            owner = future is None
+            if owner:
+                future = self._inflight[key] = Future()
+            else:
+                self.stats["coalesced"] += 1
+
+        if not owner:
+            return future.result(), "coalesced"
+
+        try:
+            if not self._upstream.acquire(timeout=self.upstream_wait):
+                raise ServiceBusyError(f"上游查询繁忙，{self.upstream_wait:.0f} 秒内未轮到，请稍后重试")
+            try:
+                records = self.client.query(clean_unit_name(unit), service_type, max_attempts=WORK_TRY_REQUESTS)
+            finally:
+                self._upstream.release()
+            if self.store:
+                with self._store_lock:
+                    self.store.upsert(service_type, records)
+            rows = [{k: v for k, v in r.as_dict().items() if k != "queryName"} for r in records]
+            with self._guard:
+                self.stats["upstream"] += 1
+                self._cache_put(key, rows)
+            future.set_result(rows)
+            return rows, "upstream"
+        except BaseException as e:
+            with self._guard:
+                self.stats["errors"] += 1
+            future.set_exception(e)
+            raise
+        finally:
+            with self._guard:
+                self._inflight.pop(key, None)
+
+
+def _keep_auth_warm(auth_manager: Any, max_age: float, stop: threading.Event) -> None:
+    """后台线程：凭据接近过期时主动刷新，请求到来时无需等待认证与验证码"""
+    while not stop.wait(min(60.0, max_age / 4)):
+        try:
+            auth_manager.refresh_stale(max_age)
+        except Exception as e:
+            logger.error(f"后台刷新凭据失败: {e}")
+
+
+def make_handler(service: QueryService):
+    class Handler(BaseHTTPRequestHandler):
+        def _send(self, status: int, body: Dict[str, Any]) -> None:
+            data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            start = time.perf_counter()
+            url = urlparse(self.path)
+            params = {k: v[0] for k, v in parse_qs(url.query).items()}
+
+            if url.path == "/health":
+                self._send(200, {"ok": True, "stats": service.snapshot_stats()})
+                return
+            if url.path != "/icp":
+                self._send(404, {"error": "未知路径，使用 /icp?unit=...&type=..."})
+                return
+
+            unit = clean_unit_name(params.get("unit", ""))
+            query_type = params.get("type", "web")
+            if not unit:
+                self._send(400, {"error": "缺少参数 unit"})
+                return
+            if query_type != "all" and query_type not in TYPE_MAPPING:
+                self._send(400, {"error": f"type 须为 {'/'.join(TYPE_MAPPING)}/all"})
+                return
+
+            results: Dict[str, Rows] = {}
+            sources: Dict[str, str] = {}
+            status, error = 200, None
+            for t in (list(TYPE_MAPPING) if query_type == "all" else [query_type]):
+                try:
+                    results[t], sources[t] = service.lookup(unit, t)
+                except ServiceBusyError as e:
+                    status, error = 503, f"{t}: {e}"
+                    break
+                except QueryError as e:
+                    status, error = 502, f"{t}: {e}"
+                    break
+                except Exception as e:
+                    logger.exception(f"{unit} [{t}] 查询异常")
+                    status, error = 500, f"{t}: {e}"
+                    break
+            latency_ms = round((time.perf_counter() - start) * 1000, 1)
+            body: Dict[str, Any] = {"unit": unit, "results": results, "source": sources, "latency_ms": latency_ms}
+            if error:
+                body["error"] = error
+            self._send(status, body)
+            logger.info(f"{unit} [{query_type}] {status} {'/'.join(sources.values()) or '-'} {latency_ms}ms")
+
+        def log_message(self, format: str, *args: Any) -> None:
+            # 访问日志由 do_GET 输出（含来源与耗时）
+            pass
+
+    return Handler
+
+
+def serve_main(argv: List[str]) -> int:
+    """serve 子命令：启动常驻 HTTP 查询服务"""
+    parser = argparse.ArgumentParser(prog="main.py serve", description="常驻 HTTP/JSON 查询服务")
+    parser.add_argument("--host", default=SERVE_HOST, help=f"监听地址（默认 {SERVE_HOST}）")
+    parser.add_argument("--port", type=int, default=SERVE_PORT, help=f"监听端口（默认 {SERVE_PORT}）")
+    parser.add_argument("--cache-ttl", type=float, default=SERVE_CACHE_TTL,
+                        help=f"结果缓存时间（秒，默认 {SERVE_CACHE_TTL}，0 表示不缓存）")
+    parser.add_argument("--upstream-concurrency", type=int, default=SERVE_UPSTREAM_CONCURRENCY,
+                        help=f"同时进行的上游查询数上限（默认 {SERVE_UPSTREAM_CONCURRENCY}）")
+    parser.add_argument("-p", "--proxy_rotate", type=int, help="代理轮换间隔（每个代理处理N个请求后切换）")
+    parser.add_argument("--proxy-provider", action="append", default=[], metavar="SPEC",
+                        help="代理补充来源，可重复指定：cmd:命令 / dir:投放目录 / http(s)://接口")
+    parser.add_argument("--proxy-auth", action="store_true", help="按代理分别认证（验证码与 token 经由各代理获取）")
+    parser.add_argument("--db", default=RESULTS_DB_PATH, help=f"结果库路径（默认 {RESULTS_DB_PATH}）")
+    parser.add_argument("--no-db", action="store_true", help="不写入本地结果库")
+    args = parser.parse_args(argv)
+
+    # 启动时完成模型加载与认证，之后的请求不再承担这部分开销
+    from auth import AuthManager
+
+    pool = load_proxy_pool(args.proxy_rotate, args.proxy_provider)
+    auth_manager = AuthManager(proxy_affine=args.proxy_auth and pool is not None)
+    client = QueryClient(auth_manager, proxy_rotate=args.proxy_rotate, pool=pool)
+    store = None if args.no_db else ResultStore(args.db, check_same_thread=False)
+    service = QueryService(client, store, args.cache_ttl, upstream_concurrency=args.upstream_concurrency)
+
+    stop = threading.Event()
+    threading.Thread(target=_keep_auth_warm, args=(auth_manager, SERVE_AUTH_MAX_AGE, stop), daemon=True).start()
+
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(service))
+    logger.info(f"查询服务已启动：http://{args.host}:{args.port}/icp?unit=...&type=web")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        logger.info("\n服务已停止")
+    finally:
+        stop.set()
+        server.server_close()
+        client.close()
+        client.profiles.report()
+        if store:
+            store.close()
+    return 0
@@ -0,0 +1,237 @@
+"""
+本地结果库模块 — 将查询结果写入带索引的 SQLite 数据库，支持离线反查
+
+按 (serviceType, serviceLicence, domain) 去重更新（一个网站备案号可包含多个域名，
+每个域名一行；APP 等类型 domain 为空串），domain / mainLicence / serviceLicence /
+unitName 均建有索引，"域名归属哪个单位"、"某备案号下有哪些资产"可离线毫秒级回答。
+"""
+
+import argparse
+import json
+import logging
+import sqlite3
+import sys
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+
+from constants import RESULTS_DB_PATH, TYPE_MAPPING
+from records import Record
+
+logger = logging.getLogger(__name__)
+
+# 服务类型编号 -> 名称（与 TYPE_MAPPING 互逆）
+TYPE_NAMES = {v: k for k, v in TYPE_MAPPING.items()}
+
+EntryKey = Tuple[str, str]  # (serviceLicence, 规范化域名)，没有域名时为空串
+
+COLUMNS = ["unitName", "mainLicence", "serviceLicence", "domain", "serviceName", "updateRecordTime"]
+
+# domain 作为主键的一部分不能为 NULL（SQLite 主键中的 NULL 互不相等，无法去重），没有域名时存空串
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS records (
+    serviceType      INTEGER NOT NULL,
+    serviceLicence   TEXT    NOT NULL,
+    unitName         TEXT,
+    mainLicence      TEXT,
+    domain           TEXT    NOT NULL DEFAULT '',
+    serviceName      TEXT,
+    updateRecordTime TEXT,
+    firstSeen        REAL    NOT NULL,
+    lastSeen         REAL    NOT NULL,
+    PRIMARY KEY (serviceType, serviceLicence, domain)
+);
+CREATE INDEX IF NOT EXISTS idx_records_domain ON records(domain);
+CREATE INDEX IF NOT EXISTS idx_records_main_licence ON records(mainLicence);
+CREATE INDEX IF NOT EXISTS idx_records_service_licence ON records(serviceLicence);
+CREATE INDEX IF NOT EXISTS idx_records_unit_name ON records(unitName);
+
+-- 监控模式快照：按查询单位（规范键）+ 服务类型保存上一次的完整结果，条目键与 records 表一致
+CREATE TABLE IF NOT EXISTS snapshots (
+    queryKey       TEXT    NOT NULL,
+    serviceType    INTEGER NOT NULL,
+    serviceLicence TEXT    NOT NULL,
+    domain         TEXT    NOT NULL DEFAULT '',
+    record         TEXT    NOT NULL,
+    PRIMARY KEY (queryKey, serviceType, serviceLicence, domain)
+);
+CREATE TABLE IF NOT EXISTS snapshot_checks (
+    queryKey    TEXT    NOT NULL,
+    serviceType INTEGER NOT NULL,
+    checkedAt   REAL    NOT NULL,
+    PRIMARY KEY (queryKey, serviceType)
+);
+"""
+
+_UPSERT = """
+INSERT INTO records (serviceType, serviceLicence, unitName, mainLicence, domain,
+                     serviceName, updateRecordTime, firstSeen, lastSeen)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT(serviceType, serviceLicence, domain) DO UPDATE SET
+    unitName = excluded.unitName,
+    mainLicence = excluded.mainLicence,
+    serviceName = COALESCE(excluded.serviceName, records.serviceName),
+    updateRecordTime = excluded.updateRecordTime,
+    lastSeen = excluded.lastSeen
+"""
+
+
+def _normalize_domain(domain: Optional[str]) -> str:
+    return domain.strip().lower() if domain else ""
+
+
+def entry_key(record: Union[Record, Dict[str, Any]]) -> Optional[EntryKey]:
+    """条目键 (serviceLicence, 域名)：一个网站备案号下的每个域名是一个条目，缺少备案号时返回 None"""
+    licence = record.get("serviceLicence")
+    if not licence:
+        return None
+    return licence, _normalize_domain(record.get("domain"))
+
+
+class ResultStore:
+    """SQLite 结果库"""
+
+    def __init__(self, path: str = RESULTS_DB_PATH, check_same_thread: bool = True):
+        self.path = path
+        # 常驻服务在多个请求线程中使用同一个连接（由调用方加锁串行写入）
+        self.conn = sqlite3.connect(path, check_same_thread=check_same_thread)
+        self.conn.row_factory = sqlite3.Row
+        # WAL 模式：批量写入时也可以同时执行 lookup
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(_SCHEMA)
+
+    def upsert(self, service_type: int, records: Iterable[Union[Record, Dict[str, Any]]]) -> int:
+        """写入一批记录（记录对象或 dict），返回写入条数（缺少 serviceLicence 的记录被跳过）"""
+        now = time.time()
+        rows = []
+        for r in records:
+            licence = r.get("serviceLicence")
+            if not licence:
+                continue
+            rows.append((
+                service_type, licence, r.get("unitName"), r.get("mainLicence"),
+                _normalize_domain(r.get("domain")), r.get("serviceName"),
+                r.get("updateRecordTime"), now, now,
+            ))
+        with self.conn:
+            self.conn.executemany(_UPSERT, rows)
+        return len(rows)
+
+    def lookup(self, domain: Optional[str] = None, licence: Optional[str] = None,
+               unit: Optional[str] = None, like: bool = False) -> List[Dict[str, Any]]:
+        """按域名、备案号（主体或服务）或单位名称查询；like=True 时单位名称模糊匹配（不走索引）"""
+        clauses, params = [], []
+        if domain:
+            clauses.append("domain = ?")
+            params.append(_normalize_domain(domain))
+        if licence:
+            clauses.append("(mainLicence = ? OR serviceLicence = ?)")
+            params.extend([licence, licence])
+        if unit:
+            clauses.append("unitName LIKE ?" if like else "unitName = ?")
+            params.append(f"%{unit}%" if like else unit)
+        if not clauses:
+            raise ValueError("至少需要指定一个查询条件")
+        # 空串表示没有域名，输出时还原为 NULL
+        columns = ["NULLIF(domain, '') AS domain" if c == "domain" else c for c in COLUMNS]
+        sql = (
+            "SELECT serviceType, " + ", ".join(columns) + ", lastSeen FROM records WHERE "
+            + " AND ".join(clauses) + " ORDER BY unitName, serviceType, serviceLicence, domain"
+        )
+        return [dict(row) for row in self.conn.execute(sql, params)]
+
+    def import_xlsx(self, path: str) -> int:
+        """导入已有的 results_*.xlsx 输出（工作表名即查询类型），返回导入条数"""
+        from openpyxl import load_workbook
+
+        wb = load_workbook(path, read_only=True, data_only=True)
+        total = 0
+        try:
+            for ws in wb.worksheets:
+                service_type = TYPE_MAPPING.get(ws.title)
+                if service_type is None:
+                    logger.warning(f"跳过无法识别的工作表: {ws.title}")
+                    continue
+                rows = ws.iter_rows(values_only=True)
+                header = next(rows, None)
+                if not header:
+                    continue
+                names = [str(h) if h is not None else "" for h in header]
+                total += self.upsert(service_type, (dict(zip(names, row)) for row in rows))
+        finally:
+            wb.close()
+        logger.info(f"已从 {path} 导入 {total} 条记录")
+        return total
+
+    def load_snapshot(self, query_key: str, service_type: int) -> Optional[Dict[EntryKey, Dict[str, Any]]]:
+        """读取上一次的快照（条目键 (serviceLicence, 域名) -> 记录），从未检查过时返回 None"""
+        checked = self.conn.execute(
+            "SELECT 1 FROM snapshot_checks WHERE queryKey = ? AND serviceType = ?",
+            (query_key, service_type),
+        ).fetchone()
+        if not checked:
+            return None
+        rows = self.conn.execute(
+            "SELECT serviceLicence, domain, record FROM snapshots WHERE queryKey = ? AND serviceType = ?",
+            (query_key, service_type),
+        )
+        return {(row["serviceLicence"], row["domain"]): json.loads(row["record"]) for row in rows}
+
+    def save_snapshot(self, query_key: str, service_type: int, records: Iterable[Record]) -> None:
+        """用本次结果整体替换快照"""
+        rows = [
+            (query_key, service_type, *key, json.dumps(r.as_dict(), ensure_ascii=False))
+            for r, key in ((r, entry_key(r)) for r in records) if key
+        ]
+        with self.conn:
+            self.conn.execute(
+                "DELETE FROM snapshots WHERE queryKey = ? AND serviceType = ?", (query_key, service_type)
+            )
+            self.conn.executemany("INSERT OR REPLACE INTO snapshots VALUES (?, ?, ?, ?, ?)", rows)
+            self.conn.execute(
+                "INSERT OR REPLACE INTO snapshot_checks VALUES (?, ?, ?)", (query_key, service_type, time.time())
+            )
+
+    def close(self) -> None:
+        self.conn.close()
+
+
+def lookup_main(argv: List[str]) -> int:
+    """lookup 子命令：离线查询本地结果库"""
+    parser = argparse.ArgumentParser(prog="main.py lookup", description="离线查询本地备案结果库")
+    parser.add_argument("--db", default=RESULTS_DB_PATH, help=f"结果库路径（默认 {RESULTS_DB_PATH}）")
+    parser.add_argument("-d", "--domain", help="按域名查询归属单位")
+    parser.add_argument("-l", "--licence", help="按主体备案号或服务备案号查询")
+    parser.add_argument("-u", "--unit", help="按单位名称查询")
+    parser.add_argument("--like", action="store_true", help="单位名称模糊匹配")
+    parser.add_argument("--json", action="store_true", help="以 JSON Lines 输出")
+    parser.add_argument("--import-xlsx", nargs="+", metavar="FILE", help="导入已有的 xlsx 结果文件")
+    args = parser.parse_args(argv)
+
+    store = ResultStore(args.db)
+    try:
+        if args.import_xlsx:
+            for path in args.import_xlsx:
+                store.import_xlsx(path)
+        if not (args.domain or args.licence or args.unit):
+            if not args.import_xlsx:
+                parser.error("请指定 --domain / --licence / --unit 或 --import-xlsx")
+            return 0
+
+        start = time.perf_counter()
+        rows = store.lookup(args.domain, args.licence, args.unit, args.like)
+        elapsed = (time.perf_counter() - start) * 1000
+        for row in rows:
+            row["type"] = TYPE_NAMES.get(row.pop("serviceType"), "")
+            if args.json:
+                print(json.dumps(row, ensure_ascii=False))
+            else:
+                print("\t".join(str(row.get(c) or "") for c in ["type"] + COLUMNS))
+        logger.info(f"共 {len(rows)} 条记录，耗时 {elapsed:.1f} ms")
+        return 0 if rows else 1
+    finally:
+        store.close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    sys.exit(lookup_main(sys.argv[1:]))
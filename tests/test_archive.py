@@ -0,0 +1,54 @@
+"""响应归档测试"""
+
+import pytest
+
+from archive import ResponseArchive
+
+
+def test_replay_of_missing_archive_fails_without_creating(tmp_path):
+    directory = tmp_path / "raw_archve"  # 拼错的目录名
+    with pytest.raises(FileNotFoundError):
+        ResponseArchive(str(directory), create=False)
+    assert not directory.exists()
+
+
+def test_replay_reads_existing_archive(tmp_path):
+    archive = ResponseArchive(str(tmp_path))
+    archive.put("U", 1, None, {"success": True, "params": {"list": []}})
+    archive.close()
+
+    archive = ResponseArchive(str(tmp_path), create=False)
+    try:
+        assert list(archive.units()) == ["U"]
+        assert archive.latest("U", 1) == {"success": True, "params": {"list": []}}
+    finally:
+        archive.close()
+
+
+def test_replay_rebuilds_records_with_details(tmp_path):
+    listing = {"success": True, "params": {"list": [
+        {"unitName": "U", "mainLicence": "京ICP备1号", "serviceLicence": "京ICP备1号-1A",
+         "updateRecordTime": "2025-01-01", "dataId": 101},
+        {"unitName": "U", "mainLicence": "京ICP备1号", "serviceLicence": "京ICP备1号-2A",
+         "updateRecordTime": "2025-01-02", "dataId": 102},
+    ]}}
+    archive = ResponseArchive(str(tmp_path))
+    archive.put("U", 6, None, listing)
+    archive.put("U", 6, 101, {"success": True, "params": {"mainLicence": "京ICP备9号", "serviceName": "应用一"}})
+    archive.close()
+
+    archive = ResponseArchive(str(tmp_path), create=False)
+    try:
+        records = archive.replay("U", 6)
+        assert archive.replay("从未归档的单位", 6) is None
+        assert archive.replay("U", 7) is None  # 同一单位的其他类型也没有归档
+    finally:
+        archive.close()
+
+    assert [r.as_dict() for r in records] == [
+        {"queryName": None, "unitName": "U", "mainLicence": "京ICP备9号", "serviceLicence": "京ICP备1号-1A",
+         "updateRecordTime": "2025-01-01", "dataId": 101, "serviceName": "应用一"},
+        # 没有归档详情的条目保留列表字段
+        {"queryName": None, "unitName": "U", "mainLicence": "京ICP备1号", "serviceLicence": "京ICP备1号-2A",
+         "updateRecordTime": "2025-01-02", "dataId": 102, "serviceName": None},
+    ]
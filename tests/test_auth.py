@@ -0,0 +1,163 @@
+"""认证刷新的单飞测试：验证码与 token 请求被替换为计数桩，不访问网络"""
+
+import os
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+
+import auth
+from auth import AuthManager
+from credential_store import CredentialStore
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+
+@pytest.fixture
+def solves(monkeypatch):
+    """替换 token / 验证码请求，返回验证码求解计数"""
+    counter = {"captcha": 0}
+    lock = threading.Lock()
+
+    def get_token(self, cred):
+        cred.token = f"token-{time.monotonic_ns()}"
+
+    def solve(self, cred):
+        time.sleep(0.2)  # 模拟验证码识别耗时，使并发刷新真正重叠
+        with lock:
+            counter["captcha"] += 1
+        cred.sign = "sign"
+        cred.uuid_token = "uuid"
+
+    monkeypatch.setattr(auth, "Crack", lambda: None)
+    monkeypatch.setattr(AuthManager, "_get_auth_token", get_token)
+    monkeypatch.setattr(AuthManager, "_process_captcha", solve)
+    return counter
+
+
+def test_concurrent_401s_refresh_once(solves):
+    manager = AuthManager(store_path=None)
+    assert solves["captcha"] == 1
+    stale = manager.credential_for(None).version
+
+    barrier = threading.Barrier(8)
+
+    def on_401():
+        barrier.wait()
+        manager.update_headers(None, stale_version=stale)
+
+    threads = [threading.Thread(target=on_401) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert solves["captcha"] == 2
+    assert manager.credential_for(None).version == stale + 1
+
+
+def test_stale_version_reuses_newer_credential(solves):
+    manager = AuthManager(store_path=None)
+    version = manager.credential_for(None).version
+    manager.update_headers(None, stale_version=version)
+    manager.update_headers(None, stale_version=version)  # 已被上一次刷新替换，直接复用
+    assert solves["captcha"] == 2
+    assert manager.credential_for(None).version == version + 1
+
+
+_CHILD = """
+import os, sys, time
+sys.path.insert(0, {root!r})
+import auth
+from auth import AuthManager
+
+store, counter, go = sys.argv[1:4]
+
+def get_token(self, cred):
+    cred.token = f"token-{{os.getpid()}}"
+
+def solve(self, cred):
+    time.sleep(0.5)
+    with open(counter, "a") as f:
+        f.write(f"{{os.getpid()}}\\n")
+    cred.sign = "sign"
+    cred.uuid_token = "uuid"
+
+auth.Crack = lambda: None
+AuthManager._get_auth_token = get_token
+AuthManager._process_captcha = solve
+while not os.path.exists(go):
+    time.sleep(0.01)
+print(AuthManager(store_path=store).credential_for(None).token)
+"""
+
+
+def test_concurrent_processes_solve_one_captcha(tmp_path):
+    """四个进程同时启动：只有一个执行验证码，其余等待文件锁后复用其保存的凭据"""
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    store, counter, go = tmp_path / "credentials.json", tmp_path / "solves.txt", tmp_path / "go"
+    script = _CHILD.format(root=root)
+    children = [
+        subprocess.Popen([sys.executable, "-c", script, str(store), str(counter), str(go)],
+                         stdout=subprocess.PIPE, text=True)
+        for _ in range(4)
+    ]
+    time.sleep(1)  # 等子进程完成导入，在起跑文件处等待
+    go.touch()
+    tokens = [child.communicate(timeout=60)[0].strip() for child in children]
+
+    assert all(child.returncode == 0 for child in children)
+    assert len(counter.read_text().split()) == 1
+    assert len(set(tokens)) == 1
+
+
+def test_refresh_lock_is_per_egress(tmp_path):
+    store = CredentialStore(str(tmp_path / "credentials.json"))
+    acquired = threading.Event()
+
+    def refresh_b():
+        with store.lock("http://b:8080"):
+            acquired.set()
+
+    with store.lock("http://a:8080"):
+        threading.Thread(target=refresh_b).start()
+        assert acquired.wait(2), "刷新代理 A 时代理 B 的刷新被阻塞"
+
+
+@pytest.mark.skipif(fcntl is None, reason="需要 fcntl")
+def test_backoff_sleeps_outside_file_lock(solves, monkeypatch, tmp_path):
+    manager = AuthManager(proxy_affine=True, store_path=str(tmp_path / "credentials.json"))
+    proxy = "http://a:8080"
+    lock_path = manager.store.lock_path(proxy)
+    attempts = {"n": 0}
+    free_during_sleep = []
+
+    def flaky_token(self, cred):
+        attempts["n"] += 1
+        if attempts["n"] == 1:
+            raise RuntimeError("token 接口超时")
+        cred.token = "token"
+
+    def sleep(seconds):
+        if seconds < 5:  # 验证码桩的模拟耗时，不是退避等待
+            return
+        with open(lock_path, "a+b") as f:
+            try:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                free_during_sleep.append(False)
+            else:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+                free_during_sleep.append(True)
+
+    monkeypatch.setattr(AuthManager, "_get_auth_token", flaky_token)
+    monkeypatch.setattr(auth.time, "sleep", sleep)
+    manager.credential_for(proxy)
+
+    assert attempts["n"] == 2
+    assert free_during_sleep == [True]
@@ -0,0 +1,238 @@
+"""DnsResolver 测试：本地 UDP 桩解析服务器，不访问外网"""
+
+import socket
+import struct
+import threading
+import time
+
+import pytest
+
+from constants import DNS_NEGATIVE_TTL
+from dns_resolve import (
+    TYPE_A, TYPE_AAAA, TYPE_CNAME, DnsCache, DnsResolver, _read_name, encode_name, parse_server,
+)
+from records import WebRecord
+
+ZONE = {
+    ("www.example.com", TYPE_CNAME): ("edge.cdn.example.net", 300),
+    ("edge.cdn.example.net", TYPE_CNAME): ("edge2.cdn.example.net", 120),
+    ("edge2.cdn.example.net", TYPE_A): ("192.0.2.10", 60),
+    ("edge2.cdn.example.net", TYPE_AAAA): ("2001:db8::10", 60),
+    ("plain.example.com", TYPE_A): ("192.0.2.20", 600),
+}
+
+
+def _rr(name, rtype, ttl, rdata):
+    return encode_name(name) + struct.pack("!HHIH", rtype, 1, ttl, len(rdata)) + rdata
+
+
+def answer(query):
+    """按 ZONE 构造应答：沿 CNAME 链逐条返回，域名不存在时 rcode=NXDOMAIN"""
+    qid = struct.unpack("!H", query[:2])[0]
+    name, offset = _read_name(query, 12)
+    qtype = struct.unpack("!H", query[offset:offset + 2])[0]
+    question = query[12:offset + 4]
+
+    records, rcode = [], 0
+    current = name
+    while (current, TYPE_CNAME) in ZONE:
+        target, ttl = ZONE[(current, TYPE_CNAME)]
+        records.append(_rr(current, TYPE_CNAME, ttl, encode_name(target)))
+        current = target
+    if (current, qtype) in ZONE:
+        value, ttl = ZONE[(current, qtype)]
+        family = socket.AF_INET if qtype == TYPE_A else socket.AF_INET6
+        records.append(_rr(current, qtype, ttl, socket.inet_pton(family, value)))
+    elif not records and not any(key[0] == current for key in ZONE):
+        rcode = 3
+    header = struct.pack("!HHHHHH", qid, 0x8180 | rcode, 1, len(records), 0, 0)
+    return header + question + b"".join(records)
+
+
+def truncated(query):
+    """只含问题部分、设置了 TC 标志的应答"""
+    question = query[12:-11]  # 去掉查询末尾的 EDNS0 OPT 记录（11 字节）
+    return query[:2] + struct.pack("!HHHHH", 0x8380, 1, 0, 0, 0) + question
+
+
+class StubServer:
+    """UDP 桩解析服务器；truncate=True 时 UDP 只返回截断应答，tcp=True 时同一端口另提供 TCP 查询"""
+
+    def __init__(self, host="127.0.0.1", truncate=False, tcp=False):
+        family = socket.AF_INET6 if ":" in host else socket.AF_INET
+        self.sock = socket.socket(family, socket.SOCK_DGRAM)
+        self.sock.bind((host, 0))
+        self.sock.settimeout(0.2)
+        self.port = self.sock.getsockname()[1]
+        self.truncate = truncate
+        self.queries = 0
+        self.tcp_queries = 0
+        self._stop = threading.Event()
+        self._threads = [threading.Thread(target=self._serve, daemon=True)]
+        self.tcp_sock = None
+        if tcp:
+            self.tcp_sock = socket.socket(family, socket.SOCK_STREAM)
+            self.tcp_sock.bind((host, self.port))
+            self.tcp_sock.listen()
+            self.tcp_sock.settimeout(0.2)
+            self._threads.append(threading.Thread(target=self._serve_tcp, daemon=True))
+        for thread in self._threads:
+            thread.start()
+
+    def _serve(self):
+        while not self._stop.is_set():
+            try:
+                data, addr = self.sock.recvfrom(4096)
+            except socket.timeout:
+                continue
+            self.queries += 1
+            self.sock.sendto(truncated(data) if self.truncate else answer(data), addr)
+
+    def _serve_tcp(self):
+        while not self._stop.is_set():
+            try:
+                conn, _ = self.tcp_sock.accept()
+            except socket.timeout:
+                continue
+            with conn:
+                conn.settimeout(1)
+                length = struct.unpack("!H", conn.recv(2))[0]
+                data = b""
+                while len(data) < length:
+                    data += conn.recv(length - len(data))
+                self.tcp_queries += 1
+                response = answer(data)
+                conn.sendall(struct.pack("!H", len(response)) + response)
+
+    def close(self):
+        self._stop.set()
+        for thread in self._threads:
+            thread.join()
+        self.sock.close()
+        if self.tcp_sock:
+            self.tcp_sock.close()
+
+
+@pytest.fixture
+def stub():
+    server = StubServer()
+    yield server
+    server.close()
+
+
+def make_resolver(stub, cache=None, address=None):
+    return DnsResolver(address or f"127.0.0.1:{stub.port}", cache or DnsCache(None), timeout=1, retries=0)
+
+
+def test_cname_chain_and_addresses(stub):
+    resolver = make_resolver(stub)
+    [record] = resolver.enrich([WebRecord(unitName="U", serviceLicence="L-1", domain="WWW.example.com ")])
+
+    assert record.cname == "edge.cdn.example.net;edge2.cdn.example.net"
+    assert record.ipv4 == "192.0.2.10"
+    assert record.ipv6 == "2001:db8::10"
+    assert resolver.stats["failures"] == 0
+
+
+def test_nxdomain_is_cached_with_negative_ttl(stub):
+    cache = DnsCache(None)
+    resolver = make_resolver(stub, cache)
+    [record] = resolver.enrich([WebRecord(unitName="U", serviceLicence="L-1", domain="missing.example.com")])
+    assert (record.ipv4, record.ipv6, record.cname) == ("", "", "")
+
+    expires, answers = cache._entries[f"{TYPE_A}:missing.example.com"]
+    assert answers == []
+    assert expires == pytest.approx(time.time() + DNS_NEGATIVE_TTL, abs=5)
+
+    queries = stub.queries
+    resolver.enrich([WebRecord(unitName="U", serviceLicence="L-1", domain="missing.example.com")])
+    assert stub.queries == queries
+    assert resolver.stats["cache_hits"] == 2
+
+
+def test_cache_persists_across_runs(stub, tmp_path):
+    path = str(tmp_path / "dns_cache.json")
+    first = make_resolver(stub, DnsCache(path))
+    first.enrich([WebRecord(unitName="U", serviceLicence="L-1", domain="plain.example.com")])
+    first.cache.save()
+    queries = stub.queries
+
+    second = make_resolver(stub, DnsCache(path))
+    [record] = second.enrich([WebRecord(unitName="U", serviceLicence="L-1", domain="plain.example.com")])
+    assert record.ipv4 == "192.0.2.20"
+    assert stub.queries == queries  # 全部来自磁盘缓存
+    assert second.stats["queries"] == 0
+
+
+def test_unreachable_server_marks_failure():
+    resolver = DnsResolver("127.0.0.1:9", DnsCache(None), timeout=0.2, retries=0)
+    [record] = resolver.enrich([WebRecord(unitName="U", serviceLicence="L-1", domain="plain.example.com")])
+    assert record.ipv4 is None
+    assert resolver.stats["failures"] == 1
+
+
+def test_truncated_answer_retried_over_tcp():
+    server = StubServer(truncate=True, tcp=True)
+    try:
+        resolver = make_resolver(server)
+        [record] = resolver.enrich([WebRecord(unitName="U", serviceLicence="L-1", domain="www.example.com")])
+        assert record.ipv4 == "192.0.2.10"
+        assert record.cname == "edge.cdn.example.net;edge2.cdn.example.net"
+        assert server.tcp_queries == 2  # A 与 AAAA 各一次
+    finally:
+        server.close()
+
+
+def test_truncated_answer_without_tcp_is_not_cached():
+    server = StubServer(truncate=True)
+    try:
+        cache = DnsCache(None)
+        resolver = make_resolver(server, cache)
+        [record] = resolver.enrich([WebRecord(unitName="U", serviceLicence="L-1", domain="plain.example.com")])
+        assert record.ipv4 is None  # 截断的空应答不当作“没有记录”
+        assert resolver.stats["failures"] == 1
+        assert cache._entries == {}
+    finally:
+        server.close()
+
+
+def test_event_loop_reused_across_units(stub):
+    resolver = make_resolver(stub)
+    resolver.enrich([WebRecord(unitName="U1", serviceLicence="L-1", domain="plain.example.com")])
+    loop = resolver._loop
+    resolver.enrich([WebRecord(unitName="U2", serviceLicence="L-2", domain="www.example.com")])
+    assert resolver._loop is loop and loop.is_running()
+
+    resolver.close()
+    assert loop.is_closed()
+
+
+@pytest.mark.parametrize("server, expected", [
+    ("223.5.5.5", ("223.5.5.5", 53)),
+    ("127.0.0.1:5353", ("127.0.0.1", 5353)),
+    ("2001:db8::1", ("2001:db8::1", 53)),
+    ("[::1]:5353", ("::1", 5353)),
+    ("[::1]", ("::1", 53)),
+])
+def test_parse_server(server, expected):
+    assert parse_server(server) == expected
+
+
+@pytest.mark.parametrize("server", ["[::1]5353", "[::1", "host:port", "host:70000", ":53"])
+def test_parse_server_rejects_malformed(server):
+    with pytest.raises(ValueError):
+        parse_server(server)
+
+
+def test_bracketed_ipv6_server():
+    try:
+        server = StubServer("::1")
+    except OSError:
+        pytest.skip("本机不支持 IPv6 回环")
+    try:
+        resolver = make_resolver(server, address=f"[::1]:{server.port}")
+        assert resolver.server == ("::1", server.port)
+        [record] = resolver.enrich([WebRecord(unitName="U", serviceLicence="L-1", domain="plain.example.com")])
+        assert record.ipv4 == "192.0.2.20"
+    finally:
+        server.close()
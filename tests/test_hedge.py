@@ -0,0 +1,72 @@
+"""对冲调度测试：请求由计时桩代替，不访问网络"""
+
+import threading
+import time
+
+from hedge import Hedger
+
+
+def test_primary_not_queued_behind_losing_requests():
+    """落败的慢请求仍在后台进行时，新的主请求立即开始，不因排队被误判为慢请求而对冲"""
+    hedger = Hedger(min_samples=1, budget=1.0)
+    hedger.observe(0.1)
+    release = threading.Event()
+
+    def send(proxy):
+        if proxy == "slow":
+            release.wait(5)
+        return proxy
+
+    for _ in range(4):  # 四个落败的慢主请求留在后台
+        start = time.perf_counter()
+        assert hedger.call(send, "slow", lambda primary: "fast", succeeded=lambda r: True) == "fast"
+        assert time.perf_counter() - start < 1
+    hedged = hedger.hedged
+
+    start = time.perf_counter()
+    assert hedger.call(send, "quick", lambda primary: "fast", succeeded=lambda r: True) == "quick"
+    assert time.perf_counter() - start < 0.1
+    assert hedger.hedged == hedged
+    release.set()
+
+
+def test_no_alternate_waits_for_primary():
+    hedger = Hedger(min_samples=1, budget=1.0)
+    hedger.observe(0.01)
+
+    def send(proxy):
+        time.sleep(0.05)
+        return proxy
+
+    assert hedger.call(send, "p1", lambda primary: None, succeeded=lambda r: True) == "p1"
+    assert hedger.hedged == 0
+
+
+def test_warm_up_calls_run_in_caller_thread():
+    """样本不足时不可能对冲：直接在调用线程发送并记录耗时，不经过线程池"""
+    hedger = Hedger(min_samples=2, budget=1.0)
+    threads = []
+
+    def send(proxy):
+        threads.append(threading.current_thread())
+        return proxy
+
+    for _ in range(2):
+        assert hedger.call(send, "p1", lambda primary: "p2", succeeded=lambda r: True) == "p1"
+    assert threads == [threading.current_thread()] * 2
+    assert hedger.threshold() is not None
+
+
+def test_no_thread_when_budget_spent():
+    hedger = Hedger(min_samples=1, budget=0.0)
+    hedger.observe(0.01)
+    threads = []
+
+    def send(proxy):
+        threads.append(threading.current_thread())
+        time.sleep(0.05)
+        return proxy
+
+    assert hedger.call(send, "p1", lambda primary: "p2", succeeded=lambda r: True) == "p1"
+    assert threads == [threading.current_thread()]
+    assert hedger.hedged == 0
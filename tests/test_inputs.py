@@ -0,0 +1,88 @@
+"""批量输入测试：表头与列选择、标准输入、预读中途出错"""
+
+import io
+
+import pytest
+
+import inputs
+from inputs import iter_units, prefetch
+
+
+def write(path, text):
+    path.write_text(text, encoding="utf-8")
+    return str(path)
+
+
+def test_csv_header_skipped_and_column_by_name(tmp_path):
+    path = write(tmp_path / "assets.csv", "序号,单位名称\n1,甲公司\n2, 乙公司 \n3,\n")
+    assert list(iter_units(path, "单位名称")) == ["甲公司", "乙公司"]
+
+
+def test_csv_column_by_index_still_skips_header(tmp_path):
+    path = write(tmp_path / "assets.csv", "序号,单位名称\n1,甲公司\n")
+    assert list(iter_units(path, "2")) == ["甲公司"]
+
+
+def test_csv_without_header(tmp_path):
+    path = write(tmp_path / "assets.csv", "甲公司,1\n乙公司,2\n")
+    assert list(iter_units(path, header=False)) == ["甲公司", "乙公司"]
+    assert list(iter_units(path, "2", header=False)) == ["1", "2"]
+    with pytest.raises(ValueError):
+        iter_units(path, "单位名称", header=False)  # 无表头时不能按列名选择
+
+
+def test_tsv_and_bom(tmp_path):
+    path = tmp_path / "assets.tsv"
+    path.write_bytes("\ufeff单位名称\t备注\n甲公司\tx\n".encode("utf-8"))
+    assert list(iter_units(str(path), "单位名称")) == ["甲公司"]
+
+
+def test_unknown_column_fails_before_iteration(tmp_path):
+    path = write(tmp_path / "assets.csv", "序号,单位名称\n1,甲公司\n")
+    with pytest.raises(ValueError, match="未找到列"):
+        iter_units(path, "公司")
+
+
+def test_xlsx_sheet_and_column(tmp_path):
+    openpyxl = pytest.importorskip("openpyxl")
+    wb = openpyxl.Workbook()
+    wb.active.title = "首页"
+    ws = wb.create_sheet("Sheet2")
+    for row in (["序号", "单位名称"], [1, "甲公司"], [2, None], [3, "乙公司"]):
+        ws.append(row)
+    path = str(tmp_path / "assets.xlsx")
+    wb.save(path)
+
+    assert list(iter_units(path, "单位名称", sheet="Sheet2")) == ["甲公司", "乙公司"]
+    with pytest.raises(ValueError, match="未找到工作表"):
+        iter_units(path, sheet="Sheet9")
+
+
+def test_plain_text_ignores_header_flag(tmp_path):
+    path = write(tmp_path / "Company.txt", "甲公司\n\n 乙公司 \n")
+    assert list(iter_units(path)) == ["甲公司", "乙公司"]
+
+
+def test_stdin_text_and_csv(monkeypatch):
+    monkeypatch.setattr(inputs.sys, "stdin", io.StringIO("甲公司\n乙公司\n"))
+    assert list(iter_units(inputs.STDIN_PATH)) == ["甲公司", "乙公司"]
+
+    monkeypatch.setattr(inputs.sys, "stdin", io.StringIO("id,name\n1,甲公司\n"))
+    assert list(iter_units(inputs.STDIN_PATH, "name")) == ["甲公司"]
+
+
+def test_prefetch_preserves_order():
+    assert list(prefetch((f"单位{i}" for i in range(100)), maxsize=3)) == [f"单位{i}" for i in range(100)]
+
+
+def test_prefetch_reraises_mid_read_error():
+    def source():
+        yield "甲公司"
+        yield "乙公司"
+        raise OSError("读取中断")
+
+    units = prefetch(source(), maxsize=1)
+    assert next(units) == "甲公司"
+    assert next(units) == "乙公司"
+    with pytest.raises(OSError, match="读取中断"):
+        next(units)
@@ -0,0 +1,109 @@
+"""监控模式测试：快照比较、详情复用与一轮复查（上游查询由桩客户端代替）"""
+
+import json
+
+import pytest
+
+from monitor import EventWriter, diff_snapshot, run_cycle, snapshot_detail_lookup
+from query import QueryError
+from records import AppRecord, WebRecord
+from store import ResultStore
+
+
+def app(licence, data_id, updated, service_name=None):
+    return AppRecord(unitName="甲公司", mainLicence="京ICP备1号", serviceLicence=licence,
+                     updateRecordTime=updated, dataId=data_id, serviceName=service_name)
+
+
+def web(domain, licence="京ICP备1号-1", updated="2025-01-01"):
+    return WebRecord(unitName="甲公司", mainLicence="京ICP备1号", serviceLicence=licence,
+                     updateRecordTime=updated, domain=domain)
+
+
+def snapshot(*records):
+    return {(r.serviceLicence, (r.get("domain") or "").lower()): r.as_dict() for r in records}
+
+
+def test_diff_snapshot_add_remove_change():
+    previous = snapshot(web("a.example.com"), web("b.example.com"), web("c.example.org", "京ICP备1号-2"))
+    current = [
+        web("A.example.com"),                          # 未变化（域名大小写不同）
+        web("c.example.org", "京ICP备1号-2", "2025-03-01"),  # 变更
+        web("d.example.com"),                          # 同一备案号下新增域名
+    ]
+    events = sorted((event, licence, (rec or old).get("domain")) for event, licence, rec, old
+                    in diff_snapshot(previous, current))
+    assert events == [
+        ("add", "京ICP备1号-1", "d.example.com"),
+        ("change", "京ICP备1号-2", "c.example.org"),
+        ("remove", "京ICP备1号-1", "b.example.com"),
+    ]
+
+
+def test_snapshot_detail_lookup_reuses_only_unchanged_entries():
+    lookup = snapshot_detail_lookup(snapshot(
+        app("京ICP备1号-1A", 101, "2025-01-01", "应用一"),
+        app("京ICP备1号-2A", 102, "2025-01-01", None),  # 上次详情未能获取
+    ))
+    assert lookup({"dataId": 101, "updateRecordTime": "2025-01-01"}) == {
+        "mainLicence": "京ICP备1号", "serviceName": "应用一"}
+    assert lookup({"dataId": 101, "updateRecordTime": "2025-02-01"}) is None  # 备案更新过，重新查询详情
+    assert lookup({"dataId": 102, "updateRecordTime": "2025-01-01"}) is None
+    assert lookup({"dataId": 999, "updateRecordTime": "2025-01-01"}) is None
+
+
+class StubClient:
+    """按轮次返回脚本化的列表项；未命中快照的条目计为一次详情接口调用"""
+
+    def __init__(self, rounds):
+        self.rounds = iter(rounds)
+        self.detail_calls = []
+
+    def query(self, unit_name, service_type, detail_lookup=None, max_attempts=None):
+        items = next(self.rounds)
+        if isinstance(items, Exception):
+            raise items
+        records = []
+        for item in items:
+            detail = detail_lookup(item) if detail_lookup else None
+            if detail is None:
+                self.detail_calls.append(item["dataId"])
+                detail = {"mainLicence": "京ICP备1号", "serviceName": f"应用{item['dataId']}"}
+            records.append(app(item["serviceLicence"], item["dataId"], item["updateRecordTime"], detail["serviceName"]))
+        return records
+
+
+def item(licence, data_id, updated="2025-01-01"):
+    return {"serviceLicence": licence, "dataId": data_id, "updateRecordTime": updated}
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = ResultStore(str(tmp_path / "icp.db"))
+    yield store
+    store.close()
+
+
+def test_run_cycle_emits_events_and_reuses_details(store, tmp_path):
+    path = tmp_path / "events.jsonl"
+    events = EventWriter(str(path))
+    client = StubClient([
+        [item("京ICP备1号-1A", 101), item("京ICP备1号-2A", 102)],            # 第一轮：建立基线
+        [item("京ICP备1号-1A", 101), item("京ICP备1号-2A", 102, "2025-02-01"),
+         item("京ICP备1号-3A", 103)],                                         # 第二轮：变更 + 新增
+        QueryError("上游失败"),                                               # 第三轮：失败保留快照
+        [item("京ICP备1号-1A", 101)],                                         # 第四轮：两条注销
+    ])
+
+    for _ in range(4):
+        run_cycle(client, store, events, ["甲公司"], ["app"], window=0, min_gap=0)
+
+    lines = [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+    assert [(e["event"], e["serviceLicence"]) for e in lines] == [
+        ("change", "京ICP备1号-2A"), ("add", "京ICP备1号-3A"),
+        ("remove", "京ICP备1号-2A"), ("remove", "京ICP备1号-3A"),
+    ]
+    # 第二轮 101 未变化复用快照详情；102 更新过、103 新增需要查询；第四轮 101 仍复用
+    assert client.detail_calls == [101, 102, 102, 103]
+    [row] = store.lookup(licence="京ICP备1号-2A")
+    assert row["updateRecordTime"] == "2025-02-01"
@@ -0,0 +1,54 @@
+"""单位名称规范化与去重测试"""
+
+import pytest
+
+from normalize import UnitDeduplicator, canonical_unit_name, clean_unit_name
+from records import WebRecord
+
+TENCENT_VARIANTS = [
+    "腾讯科技（深圳）有限公司",
+    " 腾讯科技 (深圳) 有限公司。",
+    "腾讯科技（ 深圳 ）有限公司，",
+    "腾讯科技(深圳)有限公司",
+    "“腾讯科技（深圳）有限公司”",
+    "腾讯科技　（深圳）有限公司",  # 全角空格
+]
+
+
+@pytest.mark.parametrize("variant", TENCENT_VARIANTS)
+def test_variants_share_key_and_query_name(variant):
+    assert canonical_unit_name(variant) == canonical_unit_name(TENCENT_VARIANTS[0])
+    # 查询名称与哪种写法先出现无关：统一为全角括号、无多余空白与首尾标点
+    assert clean_unit_name(variant) == "腾讯科技（深圳）有限公司"
+
+
+def test_clean_keeps_latin_names_intact():
+    assert clean_unit_name("Apple Inc.") == "Apple Inc."
+    assert clean_unit_name(" Apple  Inc.， ") == "Apple Inc."
+    assert clean_unit_name("Apple (China) Co., Ltd.") == "Apple (China) Co., Ltd."
+    assert clean_unit_name("ＡＢＣ科技有限公司") == "ABC科技有限公司"
+
+
+def test_key_ignores_latin_case_but_not_content():
+    assert canonical_unit_name("ABC科技有限公司") == canonical_unit_name("abc科技有限公司")
+    assert canonical_unit_name("甲科技有限公司") != canonical_unit_name("乙科技有限公司")
+
+
+def test_unique_yields_first_spelling_once():
+    dedup = UnitDeduplicator()
+    units = list(dedup.unique(TENCENT_VARIANTS[1:3] + ["乙公司", TENCENT_VARIANTS[0], "乙公司"]))
+
+    assert units == [TENCENT_VARIANTS[1], "乙公司"]
+    assert (dedup.total, dedup.duplicates) == (5, 3)
+    assert dedup.spellings(TENCENT_VARIANTS[1]) == [TENCENT_VARIANTS[1], TENCENT_VARIANTS[2], TENCENT_VARIANTS[0]]
+
+
+def test_fan_out_and_alias_pairs():
+    dedup = UnitDeduplicator()
+    first, alias = TENCENT_VARIANTS[0], TENCENT_VARIANTS[3]
+    list(dedup.unique([first, alias, "乙公司"]))
+    rows = [WebRecord(queryName=first, serviceLicence="粤B2-1"), WebRecord(queryName="乙公司", serviceLicence="京B2-2")]
+
+    fanned = [(r.queryName, r.serviceLicence) for r in dedup.fan_out(rows)]
+    assert fanned == [(first, "粤B2-1"), (alias, "粤B2-1"), ("乙公司", "京B2-2")]
+    assert list(dedup.alias_pairs()) == [(first, alias)]
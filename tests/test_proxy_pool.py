@@ -0,0 +1,164 @@
+"""ProxyPool 测试：proxy.txt 热加载、连续失败停用与提供方补充（临时目录代替真实来源）"""
+
+import os
+import sys
+import threading
+import time
+
+from proxy_pool import CommandProvider, FileDropProvider, ProxyPool, make_provider
+
+
+def write_proxies(path, proxies, mtime=None):
+    path.write_text("\n".join(proxies) + "\n", encoding="utf-8")
+    if mtime is not None:
+        os.utime(path, (mtime, mtime))  # 显式修改 mtime，避免文件系统时间精度导致未检测到变化
+
+
+def wait_until(predicate, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, "等待超时"
+        time.sleep(0.01)
+
+
+def make_pool(path, **kwargs):
+    kwargs.setdefault("reload_interval", 0)
+    kwargs.setdefault("refill_interval", 0)
+    return ProxyPool(str(path), **kwargs)
+
+
+def test_reloads_proxy_file_when_modified(tmp_path):
+    path = tmp_path / "proxy.txt"
+    write_proxies(path, ["http://a:1", "http://b:2"], mtime=1_000_000)
+    pool = make_pool(path)
+    assert pool.snapshot() == ["http://a:1", "http://b:2"]
+    version = pool.version
+
+    write_proxies(path, ["http://b:2", "http://c:3", "bad-entry"], mtime=1_000_100)
+    pool.refresh()
+    assert pool.snapshot() == ["http://b:2", "http://c:3"]
+    assert pool.version == version + 1
+
+    pool.refresh()  # 未修改时不重新加载
+    assert pool.version == version + 1
+
+
+def test_deleted_file_keeps_current_proxies(tmp_path):
+    path = tmp_path / "proxy.txt"
+    write_proxies(path, ["http://a:1"], mtime=1_000_000)
+    pool = make_pool(path)
+    path.unlink()
+    pool.refresh()
+    assert pool.snapshot() == ["http://a:1"]
+
+
+def test_retires_after_max_failures_but_keeps_last_proxy(tmp_path):
+    path = tmp_path / "proxy.txt"
+    write_proxies(path, ["http://a:1", "http://b:2"], mtime=1_000_000)
+    pool = make_pool(path, max_failures=3, min_size=0)
+
+    for _ in range(2):
+        pool.report("http://a:1", ok=False)
+    pool.report("http://a:1", ok=True)  # 成功清零连续失败计数
+    for _ in range(2):
+        pool.report("http://a:1", ok=False)
+    assert "http://a:1" in pool.snapshot()
+
+    pool.report("http://a:1", ok=False)
+    assert pool.snapshot() == ["http://b:2"]
+
+    for _ in range(5):
+        pool.report("http://b:2", ok=False)
+    assert pool.snapshot() == ["http://b:2"]  # 至少保留一个代理
+
+
+def test_relisting_in_file_revives_retired_proxy(tmp_path):
+    path = tmp_path / "proxy.txt"
+    write_proxies(path, ["http://a:1", "http://b:2"], mtime=1_000_000)
+    pool = make_pool(path, max_failures=1, min_size=0)
+    pool.report("http://a:1", ok=False)
+    assert pool.snapshot() == ["http://b:2"]
+
+    write_proxies(path, ["http://a:1", "http://b:2"], mtime=1_000_100)
+    pool.refresh()
+    assert pool.snapshot() == ["http://a:1", "http://b:2"]
+
+
+def test_dir_provider_loads_each_drop_once(tmp_path):
+    drop = tmp_path / "drop"
+    drop.mkdir()
+    (drop / "batch1.txt").write_text("http://d1:1\n# 注释\nhttp://d2:2\n", encoding="utf-8")
+    pool = make_pool(tmp_path / "missing.txt", providers=[make_provider(f"dir:{drop}")], min_size=2)
+
+    assert pool.snapshot() == ["http://d1:1", "http://d2:2"]
+    assert (drop / "batch1.loaded").exists() and not (drop / "batch1.txt").exists()
+    assert pool.refill() == 0  # 已读取的文件不会重复加载
+
+    (drop / "batch2.txt").write_text('["http://d3:3"]', encoding="utf-8")
+    assert pool.refill() == 1
+    assert pool.snapshot()[-1] == "http://d3:3"
+
+
+def test_retirement_below_min_size_triggers_refill(tmp_path):
+    path = tmp_path / "proxy.txt"
+    write_proxies(path, ["http://a:1", "http://b:2"], mtime=1_000_000)
+    drop = tmp_path / "drop"
+    drop.mkdir()
+    pool = make_pool(path, providers=[FileDropProvider(str(drop))], max_failures=1, min_size=2)
+
+    (drop / "fresh.txt").write_text("http://c:3\n", encoding="utf-8")
+    pool.report("http://a:1", ok=False)
+    wait_until(lambda: pool.snapshot() == ["http://b:2", "http://c:3"])  # 补充在后台进行
+
+
+class SlowProvider:
+    """gate 放行前 fetch 阻塞，模拟缓慢的提供方接口"""
+
+    def __init__(self, proxies):
+        self.proxies = proxies
+        self.started = threading.Event()
+        self.gate = threading.Event()
+        self.calls = 0
+
+    def fetch(self):
+        self.calls += 1
+        self.started.set()
+        self.gate.wait(5)
+        return self.proxies
+
+
+def test_slow_provider_does_not_block_report_or_snapshot(tmp_path):
+    path = tmp_path / "proxy.txt"
+    write_proxies(path, ["http://a:1", "http://b:2"], mtime=1_000_000)
+    provider = SlowProvider(["http://c:3"])
+    pool = make_pool(path, providers=[provider], max_failures=1, min_size=0)
+    pool.min_size = 2  # 初始化时不补充
+
+    pool.report("http://a:1", ok=False)
+    assert provider.started.wait(5)
+    # 补充进行中：其他线程照常报告与读取，并发的补充请求直接返回
+    start = time.perf_counter()
+    pool.report("http://b:2", ok=True)
+    assert pool.snapshot() == ["http://b:2"]
+    assert pool.failures("http://b:2") == 0
+    assert pool.refill() == 0
+    assert time.perf_counter() - start < 1
+
+    provider.gate.set()
+    wait_until(lambda: pool.snapshot() == ["http://b:2", "http://c:3"])
+    assert provider.calls == 1
+
+
+def test_cmd_provider_reads_stdout(tmp_path):
+    script = tmp_path / "emit.py"
+    script.write_text("print('http://c1:1')\nprint('socks5://c2:2')\n", encoding="utf-8")
+    provider = make_provider(f'cmd:"{sys.executable}" "{script}"')
+    assert isinstance(provider, CommandProvider)
+
+    pool = make_pool(tmp_path / "missing.txt", providers=[provider], min_size=1)
+    assert pool.snapshot() == ["http://c1:1", "socks5://c2:2"]
+
+
+def test_failing_provider_is_logged_not_raised(tmp_path):
+    pool = make_pool(tmp_path / "missing.txt", providers=[make_provider(f'cmd:"{sys.executable}" -c "raise SystemExit(3)"')])
+    assert pool.snapshot() == []
@@ -0,0 +1,255 @@
+"""QueryClient 重试预算测试：HTTP 请求被替换为脚本化响应，不访问网络"""
+
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+import query
+from hedge import Hedger
+from proxy_pool import ProxyPool
+from query import QueryClient, QueryError
+
+
+class FakeResponse:
+    def __init__(self, status_code, body=None):
+        self.status_code = status_code
+        self._body = body or {}
+
+    def json(self):
+        return self._body
+
+
+class FakeAuth:
+    def __init__(self, cold=()):
+        self.refreshes = 0
+        self.cold = set(cold)  # 尚未认证的代理
+        self.used = []
+
+    def has_credential(self, proxy):
+        return proxy not in self.cold
+
+    def credential_for(self, proxy):
+        self.used.append(proxy)
+        return SimpleNamespace(headers={}, version=1)
+
+    def update_headers(self, proxy=None, stale_version=None):
+        self.refreshes += 1
+
+
+LIST_BODY = {
+    "success": True,
+    "params": {"list": [
+        {"unitName": "U", "mainLicence": "L", "serviceLicence": f"L-{i}A", "updateRecordTime": "t", "dataId": i}
+        for i in range(1, 4)
+    ]},
+}
+
+
+@pytest.fixture
+def server(monkeypatch):
+    """按 URL 返回脚本化响应，记录每次请求"""
+    calls = []
+    handlers = {}
+
+    sessions = []
+
+    class FakeSession:
+        def __init__(self, impersonate=None):
+            self.cookies = {}
+            sessions.append(self)
+
+        def post(self, url, **kwargs):
+            calls.append((url, kwargs.get("proxies"), kwargs["json"]))
+            return handlers[url](kwargs["json"])
+
+        def close(self):
+            pass
+
+    monkeypatch.setattr(query.cffi_requests, "Session", FakeSession)
+    monkeypatch.setattr(query.time, "sleep", lambda seconds: None)
+    return SimpleNamespace(calls=calls, handlers=handlers, sessions=sessions)
+
+
+def make_client(proxies=("http://p1:1", "http://p2:2")):
+    return QueryClient(FakeAuth(), proxies=list(proxies), proxy_rotate=2)
+
+
+def test_failed_details_keep_list_rows(server):
+    server.handlers[query.QUERY_URL] = lambda payload: FakeResponse(200, LIST_BODY)
+    server.handlers[query.DETAIL_QUERY_URL] = lambda payload: FakeResponse(500)
+
+    records = make_client().query("U", 6, max_attempts=3)
+
+    # 列表记录全部保留，缺少的只是详情字段
+    assert [r.serviceLicence for r in records] == ["L-1A", "L-2A", "L-3A"]
+    assert all(r.serviceName is None for r in records)
+    # 列表 1 次 + 详情失败 3 次后预算用尽，其余详情不再请求
+    assert len(server.calls) == 4
+
+
+def test_budget_is_shared_between_list_and_details(server):
+    list_results = iter([FakeResponse(500), FakeResponse(200, LIST_BODY)])
+    server.handlers[query.QUERY_URL] = lambda payload: next(list_results)
+    detail_results = iter([FakeResponse(500)] + [FakeResponse(200, {"success": True, "params": {}})] * 10)
+    server.handlers[query.DETAIL_QUERY_URL] = lambda payload: next(detail_results)
+
+    records = make_client().query("U", 6, max_attempts=2)
+    # 列表失败 1 次 + 详情失败 1 次即用尽预算：三条记录都没有详情
+    assert len(records) == 3
+    assert len(server.calls) == 3
+
+
+def test_list_failures_still_raise(server):
+    server.handlers[query.QUERY_URL] = lambda payload: FakeResponse(500)
+
+    with pytest.raises(QueryError):
+        make_client().query("U", 6, max_attempts=2)
+    assert len(server.calls) == 2
+
+
+def test_successful_requests_do_not_consume_budget(server):
+    server.handlers[query.QUERY_URL] = lambda payload: FakeResponse(200, LIST_BODY)
+    server.handlers[query.DETAIL_QUERY_URL] = lambda payload: FakeResponse(
+        200, {"success": True, "params": {"mainLicence": "L", "serviceName": f"app{payload['dataId']}"}})
+
+    records = make_client().query("U", 6, max_attempts=1)
+    assert [r.serviceName for r in records] == ["app1", "app2", "app3"]
+
+
+def test_detail_lookup_hits_skip_the_detail_api(server):
+    server.handlers[query.QUERY_URL] = lambda payload: FakeResponse(200, LIST_BODY)
+
+    records = make_client().query("U", 6, detail_lookup=lambda item: {"serviceName": "cached"}, max_attempts=1)
+    assert [r.serviceName for r in records] == ["cached"] * 3
+    assert len(server.calls) == 1
+
+
+def test_sessions_are_reused_per_egress(server):
+    server.handlers[query.QUERY_URL] = lambda payload: FakeResponse(200, {"success": True, "params": {"list": []}})
+
+    client = make_client()
+    for i in range(6):
+        client.query(f"U{i}", 1)
+    # 两个代理各一个会话，轮换回同一代理时复用原会话
+    assert len(server.calls) == 6
+    assert len(server.sessions) == 2
+
+
+def make_hedging_client(server, cold=(), pool=None, slow_error=None):
+    """p1 上的请求 0.3 秒后才返回（指定 slow_error 时改为抛出该异常），其余代理立即返回；对冲阈值固定为 0.05 秒"""
+    slow = threading.Event()
+    server.finished = threading.Event()
+
+    def handle(payload):
+        if slow_error and server.calls[-1][1]["https"] == "http://p1:1":
+            raise slow_error
+        return FakeResponse(200, LIST_BODY)
+
+    server.handlers[query.QUERY_URL] = handle
+    hedger = Hedger(min_samples=1, budget=1.0)
+    hedger.observe(0.05)
+    client = QueryClient(FakeAuth(cold), proxies=["http://p1:1", "http://p2:2", "http://p3:3"],
+                         proxy_rotate=2, pool=pool, hedger=hedger)
+    send = client._send
+
+    def delayed_send(url, payload, proxy, settled=None):
+        if proxy != "http://p1:1":
+            return send(url, payload, proxy, settled)
+        slow.wait(0.3)  # time.sleep 已被替换为空操作
+        try:
+            return send(url, payload, proxy, settled)
+        finally:
+            server.finished.set()
+
+    client._send = delayed_send
+    return client
+
+
+def test_hedged_requests_count_against_alternate(server):
+    client = make_hedging_client(server)
+    _, _, egress = client._post(query.QUERY_URL, {}, "http://p1:1")
+    client._count_request("http://p1:1")
+
+    assert egress == "http://p2:2"
+    assert client.requests_per_proxy == 1
+    # 轮换到 p2 时，对冲期间经由它发出的请求已计入
+    assert client._rotate_proxy() == "http://p2:2"
+    assert client.requests_per_proxy == 1
+
+
+def test_losing_request_is_not_counted_or_reported(server, tmp_path):
+    """主请求落败后才失败：不计入 p1 的失败次数（不会因此停用），对冲请求胜出后计入 p2"""
+    path = tmp_path / "proxy.txt"
+    path.write_text("http://p1:1\nhttp://p2:2\nhttp://p3:3\n", encoding="utf-8")
+    pool = ProxyPool(str(path), max_failures=1, reload_interval=0, refill_interval=0)
+    client = make_hedging_client(server, pool=pool, slow_error=ConnectionError("超时"))
+
+    _, _, egress = client._post(query.QUERY_URL, {}, "http://p1:1")
+    assert server.finished.wait(5)
+
+    assert egress == "http://p2:2"
+    assert pool.failures("http://p1:1") == 0
+    assert pool.snapshot() == ["http://p1:1", "http://p2:2", "http://p3:3"]
+    assert client._pending_counts == {"http://p2:2": 1}
+
+
+def test_hedge_skips_proxies_without_credential(server):
+    client = make_hedging_client(server, cold={"http://p2:2"})
+    _, _, egress = client._post(query.QUERY_URL, {}, "http://p1:1")
+
+    assert egress == "http://p3:3"
+    assert "http://p2:2" not in client.auth_manager.used  # 不为对冲触发 p2 的认证与验证码
+
+
+class FailingAuth(FakeAuth):
+    """经由 broken 代理认证总是失败（如验证码接口被该代理屏蔽）"""
+
+    def __init__(self, broken):
+        super().__init__()
+        self.broken = broken
+        self.attempts = 0
+
+    def credential_for(self, proxy):
+        if proxy == self.broken:
+            self.attempts += 1
+            raise RuntimeError("无法完成认证")
+        return super().credential_for(proxy)
+
+
+def test_auth_failures_retire_proxy(server, tmp_path):
+    path = tmp_path / "proxy.txt"
+    path.write_text("http://p1:1\nhttp://p2:2\n", encoding="utf-8")
+    pool = ProxyPool(str(path), max_failures=3, reload_interval=0, refill_interval=0)
+    server.handlers[query.QUERY_URL] = lambda payload: FakeResponse(200, LIST_BODY)
+    auth = FailingAuth("http://p1:1")
+    client = QueryClient(auth, proxy_rotate=100, pool=pool)
+
+    records = client.query("U", 1)
+
+    assert len(records) == 3
+    assert auth.attempts == 3  # 连续失败 3 次后停用，不再经由它认证
+    assert pool.snapshot() == ["http://p2:2"]
+    assert server.calls[-1][1]["https"] == "http://p2:2"
+
+
+def test_concurrent_403s_rotate_once(server):
+    """两个线程同时在 p1 上收到 403：只切换一次（到 p2），而不是各切一次跳过 p2"""
+    barrier = threading.Barrier(2)
+
+    def handle(payload):
+        if server.calls[-1][1]["https"] == "http://p1:1" and len(server.calls) <= 2:
+            barrier.wait(5)
+            return FakeResponse(403)
+        return FakeResponse(200, LIST_BODY)
+
+    server.handlers[query.QUERY_URL] = handle
+    client = QueryClient(FakeAuth(), proxies=["http://p1:1", "http://p2:2", "http://p3:3"], proxy_rotate=100)
+    threads = [threading.Thread(target=client.query, args=(f"U{i}", 1)) for i in range(2)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert client.current_proxy == "http://p2:2"
+    assert [c[1]["https"] for c in server.calls[2:]] == ["http://p2:2"] * 2
@@ -0,0 +1,63 @@
+"""WorkScheduler 测试：延迟重试、死信与不阻塞后续任务"""
+
+import pytest
+
+from query import QueryError
+from scheduler import DeadLetterWriter, WorkItem, WorkScheduler
+
+
+def run(handler, work, max_attempts=3):
+    dead = []
+    scheduler = WorkScheduler(handler, on_dead=lambda item, e: dead.append(item),
+                              max_attempts=max_attempts, base_delay=0.01, max_delay=0.05)
+    scheduler.run(work)
+    return scheduler, dead
+
+
+def test_failing_unit_does_not_block_later_units():
+    order = []
+
+    def handler(item):
+        order.append(item.unit)
+        if item.unit == "BAD":
+            raise QueryError("boom")
+
+    work = [WorkItem("BAD", "web")] + [WorkItem(f"U{i}", "web") for i in range(3)]
+    scheduler, dead = run(handler, work)
+
+    assert order[:4] == ["BAD", "U0", "U1", "U2"]  # 失败任务进入重试队列，新任务继续执行
+    assert order.count("BAD") == 3
+    assert dead == [WorkItem("BAD", "web")]
+    assert (scheduler.retried, scheduler.dead) == (2, 1)
+    assert scheduler.pending() == []
+
+
+def test_transient_failure_is_retried_until_success():
+    failures = {"FLAKY": 2}
+
+    def handler(item):
+        if failures.get(item.unit):
+            failures[item.unit] -= 1
+            raise QueryError("temporary")
+
+    scheduler, dead = run(handler, [WorkItem("FLAKY", "app"), WorkItem("OK", "app")])
+    assert dead == []
+    assert scheduler.retried == 2
+
+
+def test_other_exceptions_are_not_retried():
+    def handler(item):
+        raise ValueError("bug")
+
+    with pytest.raises(ValueError):
+        run(handler, [WorkItem("U", "web")])
+
+
+def test_dead_letter_writes_each_unit_once(tmp_path):
+    path = tmp_path / "dead.txt"
+    writer = DeadLetterWriter(str(path))
+    writer.write("A公司", "web: boom")
+    writer.write("A公司", "app: boom")
+    writer.write("B公司", "web: boom")
+    assert path.read_text(encoding="utf-8").splitlines() == ["A公司", "B公司"]
+    assert writer.count == 2
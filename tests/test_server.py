@@ -0,0 +1,116 @@
+"""QueryService 测试：缓存、相同请求合并与上游并发上限（上游查询由桩客户端代替）"""
+
+import json
+import threading
+import time
+import urllib.error
+import urllib.request
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+from records import WebRecord
+from server import QueryService, ServiceBusyError, make_handler
+
+
+class StubClient:
+    """记录上游查询次数；gate 未放行时查询阻塞，用于制造进行中的请求"""
+
+    def __init__(self):
+        self.calls = []
+        self.started = threading.Event()
+        self.gate = threading.Event()
+        self.gate.set()
+
+    def query(self, unit_name, service_type, max_attempts=None):
+        self.calls.append((unit_name, service_type))
+        self.started.set()
+        self.gate.wait(5)
+        return [WebRecord(unitName=unit_name, serviceLicence="京ICP备1号-1", domain="example.com")]
+
+
+def wait_until(predicate, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, "等待超时"
+        time.sleep(0.01)
+
+
+def test_concurrent_identical_requests_share_one_upstream_call():
+    client = StubClient()
+    client.gate.clear()
+    service = QueryService(client)
+    results = {}
+
+    def lookup(name):
+        results[name] = service.lookup("腾讯科技（深圳）有限公司", "web")
+
+    first = threading.Thread(target=lookup, args=("first",))
+    first.start()
+    assert client.started.wait(5)
+    second = threading.Thread(target=lookup, args=("second",))
+    second.start()
+    wait_until(lambda: service.snapshot_stats()["coalesced"] == 1)
+    client.gate.set()
+    first.join()
+    second.join()
+
+    assert len(client.calls) == 1
+    assert results["first"][1] == "upstream"
+    assert results["second"] == (results["first"][0], "coalesced")
+
+
+def test_cached_result_skips_upstream():
+    client = StubClient()
+    service = QueryService(client)
+
+    rows, source = service.lookup("腾讯科技（深圳）有限公司", "web")
+    assert source == "upstream"
+    # 不同写法规范化后是同一单位，命中缓存
+    assert service.lookup("腾讯科技(深圳)有限公司 ", "web") == (rows, "cache")
+    assert len(client.calls) == 1
+    assert rows[0]["domain"] == "example.com"
+
+
+def test_saturated_upstream_returns_busy():
+    client = StubClient()
+    client.gate.clear()
+    service = QueryService(client, upstream_concurrency=1, upstream_wait=0.05)
+    blocker = threading.Thread(target=service.lookup, args=("甲公司", "web"))
+    blocker.start()
+    assert client.started.wait(5)
+
+    with pytest.raises(ServiceBusyError):
+        service.lookup("乙公司", "web")
+    client.gate.set()
+    blocker.join()
+    assert [unit for unit, _ in client.calls] == ["甲公司"]
+
+
+def test_http_busy_returns_503_with_latency():
+    client = StubClient()
+    client.gate.clear()
+    service = QueryService(client, upstream_concurrency=1, upstream_wait=0.05)
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), make_handler(service))
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{httpd.server_address[1]}/icp?type=web&unit="
+    try:
+        blocker = threading.Thread(target=urllib.request.urlopen, args=(base + "%E7%94%B2",))
+        blocker.start()
+        assert client.started.wait(5)
+        with pytest.raises(urllib.error.HTTPError) as excinfo:
+            urllib.request.urlopen(base + "%E4%B9%99")
+        body = json.loads(excinfo.value.read())
+        assert excinfo.value.code == 503
+        assert "繁忙" in body["error"]
+        assert body["latency_ms"] >= 50
+
+        client.gate.set()
+        blocker.join()
+        with urllib.request.urlopen(base + "%E7%94%B2") as resp:
+            body = json.loads(resp.read())
+        assert body["source"] == {"web": "cache"}
+        assert "latency_ms" in body
+    finally:
+        httpd.shutdown()
+        httpd.server_close()
@@ -0,0 +1,78 @@
+"""本地结果库测试：按 (备案号, 域名) 去重更新、离线反查与 lookup 子命令"""
+
+import json
+
+import pytest
+
+from records import AppRecord, WebRecord
+from store import ResultStore, entry_key, lookup_main
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = ResultStore(str(tmp_path / "icp.db"))
+    yield store
+    store.close()
+
+
+def web(domain, licence="京ICP备1号-1", unit="甲公司", updated="2025-01-01"):
+    return WebRecord(unitName=unit, mainLicence=licence.split("-")[0], serviceLicence=licence,
+                     updateRecordTime=updated, domain=domain)
+
+
+def test_upsert_keeps_one_row_per_licence_and_domain(store):
+    assert store.upsert(1, [web("a.example.com"), web("b.example.com")]) == 2
+    # 域名大小写与首尾空白不同视为同一条目，更新而不是新增
+    store.upsert(1, [web(" A.Example.com ", updated="2025-02-01")])
+
+    rows = store.lookup(licence="京ICP备1号-1")
+    assert [(r["domain"], r["updateRecordTime"]) for r in rows] == [
+        ("a.example.com", "2025-02-01"), ("b.example.com", "2025-01-01"),
+    ]
+
+
+def test_upsert_skips_rows_without_licence_and_keeps_detail(store):
+    app = AppRecord(unitName="甲公司", mainLicence="京ICP备1号", serviceLicence="京ICP备1号-2A", serviceName="应用")
+    assert store.upsert(6, [app, AppRecord(unitName="甲公司")]) == 1
+    # 详情缺失的更新不覆盖已有的服务名称
+    store.upsert(6, [AppRecord(unitName="甲公司", mainLicence="京ICP备1号", serviceLicence="京ICP备1号-2A")])
+
+    [row] = store.lookup(licence="京ICP备1号-2A")
+    assert row["serviceName"] == "应用"
+    assert row["domain"] is None  # 没有域名的类型输出为空而不是空串
+
+
+def test_lookup_by_domain_licence_and_unit(store):
+    store.upsert(1, [web("a.example.com"), web("c.example.org", licence="京ICP备2号-1", unit="乙公司")])
+
+    assert [r["unitName"] for r in store.lookup(domain="C.EXAMPLE.ORG")] == ["乙公司"]
+    assert [r["domain"] for r in store.lookup(licence="京ICP备1号")] == ["a.example.com"]  # 主体备案号
+    assert [r["domain"] for r in store.lookup(unit="乙", like=True)] == ["c.example.org"]
+    assert store.lookup(domain="missing.example.com") == []
+    with pytest.raises(ValueError):
+        store.lookup()
+
+
+def test_entry_key_normalizes_domain():
+    assert entry_key(web(" A.Example.com")) == ("京ICP备1号-1", "a.example.com")
+    assert entry_key({"serviceLicence": "京ICP备1号-2A"}) == ("京ICP备1号-2A", "")
+    assert entry_key({"domain": "a.example.com"}) is None
+
+
+def test_lookup_cli(tmp_path, capsys):
+    db = str(tmp_path / "icp.db")
+    store = ResultStore(db)
+    store.upsert(1, [web("a.example.com")])
+    store.close()
+
+    assert lookup_main(["--db", db, "-d", "a.example.com", "--json"]) == 0
+    [line] = capsys.readouterr().out.splitlines()
+    row = json.loads(line)
+    assert (row["type"], row["unitName"], row["domain"]) == ("web", "甲公司", "a.example.com")
+
+    assert lookup_main(["--db", db, "-l", "京ICP备1号-1"]) == 0
+    assert capsys.readouterr().out.split("\t")[:2] == ["web", "甲公司"]
+
+    assert lookup_main(["--db", db, "-d", "missing.example.com"]) == 1
+    with pytest.raises(SystemExit):
+        lookup_main(["--db", db])
@@ -1,47 +1,14 @@
-import pandas as pd
-import random
+import csv
 import time
 import os
 import logging
-from typing import Dict, List, Any, Optional
-from curl_cffi import requests as cffi_requests
-from constants import DETAIL_QUERY_URL, TYPE_MAPPING, PROXY_TEST_URL, DEFAULT_TIMEOUT, MAX_DETAIL_QUERY_RETRIES
+from typing import Callable, Dict, List, Any, Optional
+from constants import TYPE_MAPPING, PROXY_TEST_URL, PROXY_FILE
+from fingerprint import BrowserProfile, random_profile
+from records import AppRecord, Record, WebRecord, intern_str
 
 logger = logging.getLogger(__name__)
 
-# 生成浏览器 UA 头的辅助常量（与 generate_modern_headers 保持一致，避免循环引用）
-_USER_AGENT_TMPL = (
-    "Mozilla/5.0 ({platform}) "
-    "AppleWebKit/537.36 (KHTML, like Gecko) "
-    "Chrome/{version}.0.0.0 Safari/537.36"
-)
-_PLATFORM_MAP = {"Windows": "Windows NT 10.0; Win64; x64", "macOS": "Macintosh; Intel Mac OS X 10_15_7"}
-
-
-def _make_browser_headers(auth_headers: Dict[str, str]) -> Dict[str, str]:
-    """生成现代浏览器请求头（与 generate_modern_headers 逻辑一致）"""
-    browser_version = random.choice(["124", "123", "122"])
-    platform = random.choice(["Windows", "macOS"])
-    return {
-        "Host": "hlwicpfwc.miit.gov.cn",
-        "Sec-Ch-Ua": (
-            f"\"Chromium\";v=\"{browser_version}\", "
-            f"\"Google Chrome\";v=\"{browser_version}\", "
-            f"\"Not-A.Brand\";v=\"99\""
-        ),
-        "Sec-Ch-Ua-Mobile": "?0",
-        "Sec-Ch-Ua-Platform": f"\"{platform}\"",
-        "User-Agent": _USER_AGENT_TMPL.format(
-            platform=_PLATFORM_MAP.get(platform, platform),
-            version=browser_version,
-        ),
-        "Accept": "application/json, text/plain, */*",
-        "Content-Type": "application/json",
-        "Referer": "https://beian.miit.gov.cn/",
-        "Origin": "https://beian.miit.gov.cn",
-        **auth_headers,
-    }
-
 
 def retry(max_retries: int, initial_delay: float = 2, backoff_factor: float = 2):
     """通用重试装饰器"""
@@ -69,227 +36,69 @@ def get_current_time_filename() -> str:
     return f"results_{time.strftime('%Y%m%d_%H%M%S')}.xlsx"
 
 
-def generate_modern_headers(auth_headers: Dict[str, str]) -> Dict[str, str]:
-    """生成现代浏览器请求头"""
-    browser_version = random.choice(["124", "123", "122"])
-    platform = random.choice(["Windows", "macOS"])
-    base_headers = {
-        "Host": "hlwicpfwc.miit.gov.cn",
-        "Sec-Ch-Ua": f"\"Chromium\";v=\"{browser_version}\", \"Google Chrome\";v=\"{browser_version}\", \"Not-A.Brand\";v=\"99\"",
-        "Sec-Ch-Ua-Mobile": "?0",
-        "Sec-Ch-Ua-Platform": f"\"{platform}\"",
-        "User-Agent": f"Mozilla/5.0 ({'Windows NT 10.0; Win64; x64' if 'Windows' in platform else 'Macintosh; Intel Mac OS X 10_15_7'}) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/{browser_version}.0.0.0 Safari/537.36",
-        "Accept": "application/json, text/plain, */*",
-        "Content-Type": "application/json",
-        "Referer": "https://beian.miit.gov.cn/",
-        "Origin": "https://beian.miit.gov.cn"
-    }
-    return {** base_headers, **auth_headers}
+def generate_modern_headers(auth_headers: Dict[str, str], profile: Optional[BrowserProfile] = None) -> Dict[str, str]:
+    """生成现代浏览器请求头（请求头与 profile 的 impersonate 目标一致，未指定时随机选择配置）"""
+    return (profile or random_profile()).headers(auth_headers)
+
 
+def process_response(response_data: Dict[str, Any], service_type: int,
+                     fetch_detail: Optional[Callable[[Dict[str, Any]], Optional[Dict[str, Any]]]] = None
+                     ) -> List[Record]:
+    """
+    处理API响应数据，提取备案信息
 
-def process_response(response_data: Dict[str, Any], service_type: int, headers: Dict[str, str], 
-                     current_proxy: Optional[str] = None, available_proxies: Optional[List[str]] = None,
-                     proxy_index_ref: Optional[list] = None, proxy_rotate: Optional[int] = None,
-                     requests_per_proxy_ref: Optional[list] = None,
-                     auth_manager: Any = None) -> List[Dict[str, Any]]:
-    """处理API响应数据，提取备案信息"""
-    results = []
+    APP、小程序和快应用类型通过 fetch_detail 回调（传入列表项，返回详情 params 或 None）
+    补充主体备案号与服务名称；网络请求、重试和代理轮换由调用方（QueryClient）负责。
+    """
+    results: List[Record] = []
     if response_data.get("success"):
         for item in response_data["params"]["list"]:
-            # 基础信息提取
-            result = {
-                "unitName": item.get("unitName"),
-                "mainLicence": item.get("mainLicence"),  # 临时值，后续可能更新
-                "serviceLicence": item.get("serviceLicence"),
-                "updateRecordTime": item.get("updateRecordTime")
-            }
-
             # 处理APP、小程序和快应用类型：调用详情接口补充信息
             if service_type in [6, 7, 8]:  # 6=app, 7=miniapp, 8=quickapp
-                data_id = item.get("dataId")
-                if data_id:
-                    # 详情查询重试机制（支持代理轮换 + token 过期自动刷新）
-                    detail_success = False
-                    detail_proxy = current_proxy  # 使用传入的代理
-                    detail_proxy_index = proxy_index_ref[0] if proxy_index_ref else 0
-                    detail_requests_count = requests_per_proxy_ref[0] if requests_per_proxy_ref else 0
-                    detail_retry = 0
-                    use_proxy_for_detail = available_proxies is not None and len(available_proxies) > 0
-                    # token 是否已刷新过（避免反复刷新还失败时无限循环）
-                    token_refreshed = False
-
-                    # 使用代理时无限重试，未使用代理时有限重试
-                    max_detail_retries = float('inf') if use_proxy_for_detail else MAX_DETAIL_QUERY_RETRIES
-                    
-                    while not detail_success:
-                        detail_retry += 1
-                        # 使用代理时：检查是否需要轮换代理
-                        if available_proxies and proxy_rotate and detail_requests_count >= proxy_rotate:
-                            detail_proxy_index = (detail_proxy_index + 1) % len(available_proxies)
-                            detail_proxy = available_proxies[detail_proxy_index]
-                            detail_requests_count = 0
-                            if proxy_index_ref:
-                                proxy_index_ref[0] = detail_proxy_index
-                            if requests_per_proxy_ref:
-                                requests_per_proxy_ref[0] = detail_requests_count
-                            logger.info(f"达到轮换间隔，切换到代理 #{detail_proxy_index + 1}: {detail_proxy}")
-                        
-                        try:
-                            # 调用详情接口
-                            detail_resp = cffi_requests.post(
-                                DETAIL_QUERY_URL,
-                                headers=headers,
-                                json={"dataId": data_id, "serviceType": service_type},
-                                impersonate="chrome110",
-                                proxies=format_proxy(detail_proxy) if detail_proxy else None,
-                                timeout=DEFAULT_TIMEOUT,
-                                verify=False  # 禁用SSL证书验证
-                            )
-                            
-                            # 增加代理请求计数
-                            if detail_proxy:
-                                detail_requests_count += 1
-                                if requests_per_proxy_ref:
-                                    requests_per_proxy_ref[0] = detail_requests_count
-                            
-                            if detail_resp.status_code == 200:
-                                detail_data = detail_resp.json()
-                                # HTTP 200 但 code=401（token 过期）
-                                if detail_data.get("code") == 401:
-                                    if auth_manager and not token_refreshed:
-                                        logger.warning(f"详情查询 token 过期 (dataId={data_id}, code=401)，正在刷新认证...")
-                                        try:
-                                            auth_manager.update_headers()
-                                            headers.update(_make_browser_headers(auth_manager.headers))
-                                            token_refreshed = True
-                                            detail_retry = 0
-                                            detail_requests_count = 0
-                                            if requests_per_proxy_ref:
-                                                requests_per_proxy_ref[0] = detail_requests_count
-                                            logger.info("认证已刷新，继续重试...")
-                                            time.sleep(random.uniform(1, 2))
-                                            continue
-                                        except Exception as refresh_err:
-                                            logger.error(f"刷新认证失败: {refresh_err}")
-                                            token_refreshed = True
-                                    if detail_retry < max_detail_retries:
-                                        logger.warning(f"详情查询 code=401 (dataId={data_id}, 第{detail_retry}次)，正在重试...")
-                                        time.sleep(random.uniform(1, 2))
-                                        continue
-                                    else:
-                                        logger.warning(f"详情查询 code=401 (dataId={data_id}, 已重试{detail_retry}次)")
-                                        break
-                                
-                                if detail_data.get("success") and "params" in detail_data:
-                                    detail = detail_data["params"]
-                                    # 更新详情字段
-                                    result["mainLicence"] = detail.get("mainLicence", result["mainLicence"])
-                                    result["serviceName"] = detail.get("serviceName", "")  # 从详情接口获取
-                                    detail_success = True
-                                    break  # 成功，跳出重试循环
-                                else:
-                                    error_msg = detail_data.get('msg', '未知错误')
-                                    
-                                    # ===== token 过期自动刷新 =====
-                                    if auth_manager and "token" in error_msg.lower() and not token_refreshed:
-                                        logger.warning(f"详情查询 token 过期 (dataId={data_id})，正在刷新认证...")
-                                        try:
-                                            auth_manager.update_headers()
-                                            # 用新认证信息重新生成请求头
-                                            headers.update(_make_browser_headers(auth_manager.headers))
-                                            token_refreshed = True
-                                            detail_retry = 0  # 重置重试计数，用新 token 重新尝试
-                                            # 重置代理计数（新 token 意味着新开始）
-                                            detail_requests_count = 0
-                                            if requests_per_proxy_ref:
-                                                requests_per_proxy_ref[0] = detail_requests_count
-                                            logger.info("认证已刷新，继续重试详情查询...")
-                                            time.sleep(random.uniform(1, 2))
-                                            continue
-                                        except Exception as refresh_err:
-                                            logger.error(f"刷新认证失败: {refresh_err}")
-                                            # 刷新失败也标记已尝试过，避免无限刷新
-                                            token_refreshed = True
-                                    
-                                    if detail_retry < max_detail_retries:
-                                        logger.warning(f"详情查询失败 (dataId={data_id}, 第{detail_retry}次): {error_msg}，正在重试...")
-                                        time.sleep(random.uniform(1, 2))  # 短暂延迟后重试
-                                        continue
-                                    else:
-                                        logger.warning(f"详情查询失败 (dataId={data_id}, 已重试{detail_retry}次): {error_msg}")
-                                        break  # 未使用代理时，达到重试上限才退出
-                            elif detail_resp.status_code == 403:
-                                # 403错误：切换代理（请求已计数，切换代理时重置计数）
-                                if available_proxies and len(available_proxies) > 1:
-                                    detail_proxy_index = (detail_proxy_index + 1) % len(available_proxies)
-                                    detail_proxy = available_proxies[detail_proxy_index]
-                                    detail_requests_count = 0  # 切换代理时重置计数
-                                    if proxy_index_ref:
-                                        proxy_index_ref[0] = detail_proxy_index
-                                    if requests_per_proxy_ref:
-                                        requests_per_proxy_ref[0] = detail_requests_count
-                                    logger.warning(f"详情查询403错误 (dataId={data_id}, 第{detail_retry}次)，切换到代理: {detail_proxy}")
-                                    time.sleep(random.uniform(1, 2))
-                                    continue
-                                else:
-                                    if detail_retry < max_detail_retries:
-                                        logger.warning(f"详情接口HTTP错误 (dataId={data_id}, 第{detail_retry}次): 状态码403，正在重试...")
-                                        time.sleep(random.uniform(1, 2))
-                                        continue
-                                    else:
-                                        logger.warning(f"详情接口HTTP错误 (dataId={data_id}, 已重试{detail_retry}次): 状态码403")
-                                        break  # 未使用代理时，达到重试上限才退出
-                            else:
-                                if detail_retry < max_detail_retries:
-                                    logger.warning(f"详情接口HTTP错误 (dataId={data_id}, 第{detail_retry}次): 状态码{detail_resp.status_code}，正在重试...")
-                                    time.sleep(random.uniform(1, 2))
-                                    continue
-                                else:
-                                    logger.warning(f"详情接口HTTP错误 (dataId={data_id}, 已重试{detail_retry}次): 状态码{detail_resp.status_code}")
-                                    break  # 未使用代理时，达到重试上限才退出
-                        except Exception as e:
-                            error_msg = str(e)
-                            # 增加代理请求计数（失败也计数）
-                            if detail_proxy:
-                                detail_requests_count += 1
-                                if requests_per_proxy_ref:
-                                    requests_per_proxy_ref[0] = detail_requests_count
-                            
-                            # 检查是否达到代理使用次数限制
-                            if available_proxies and proxy_rotate and detail_requests_count >= proxy_rotate:
-                                if len(available_proxies) > 1:
-                                    detail_proxy_index = (detail_proxy_index + 1) % len(available_proxies)
-                                    detail_proxy = available_proxies[detail_proxy_index]
-                                    detail_requests_count = 0
-                                    if proxy_index_ref:
-                                        proxy_index_ref[0] = detail_proxy_index
-                                    if requests_per_proxy_ref:
-                                        requests_per_proxy_ref[0] = detail_requests_count
-                                    logger.warning(f"详情查询异常 (dataId={data_id}, 第{detail_retry}次): {error_msg}，代理使用次数达上限，切换到代理: {detail_proxy}")
-                                    time.sleep(random.uniform(1, 2))
-                                    continue  # 切换代理后继续重试（不检查重试次数）
-                            
-                            # 未使用代理或未达到代理使用次数限制时，检查重试次数
-                            if detail_retry < max_detail_retries:
-                                logger.warning(f"详情查询异常 (dataId={data_id}, 第{detail_retry}次): {error_msg}，正在重试...")
-                                time.sleep(random.uniform(1, 2))
-                                continue
-                            else:
-                                logger.error(f"详情查询异常 (dataId={data_id}, 已重试{detail_retry}次): {error_msg}")
-                                break  # 未使用代理时，达到重试上限才退出
+                result = AppRecord(
+                    unitName=item.get("unitName"),
+                    mainLicence=item.get("mainLicence"),  # 临时值，后续可能更新
+                    serviceLicence=item.get("serviceLicence"),
+                    updateRecordTime=item.get("updateRecordTime"),
+                    dataId=item.get("dataId"),
+                )
+                if result.dataId:
+                    detail = fetch_detail(item) if fetch_detail else None
+                    if detail:
+                        # 更新详情字段
+                        result.mainLicence = intern_str(detail.get("mainLicence", result.mainLicence))
+                        result.serviceName = detail.get("serviceName", "")  # 从详情接口获取
                 else:
                     logger.warning("缺少dataId，无法查询详情")
 
             # 处理Web类型：保留原有逻辑
             else:
-                result["domain"] = item.get("domain")
+                result = WebRecord(
+                    unitName=item.get("unitName"),
+                    mainLicence=item.get("mainLicence"),
+                    serviceLicence=item.get("serviceLicence"),
+                    updateRecordTime=item.get("updateRecordTime"),
+                    domain=item.get("domain"),
+                )
 
             results.append(result)
     return results
 
 
-def write_to_excel(results_dict: Dict[str, List[Dict]], output_file: Optional[str] = None) -> None:
+def _to_frame(data: List[Any]):
+    """记录列表转 DataFrame：记录对象按类定义的列顺序构造，避免逐行生成 dict"""
+    import pandas as pd
+
+    first = data[0]
+    if isinstance(first, dict):
+        return pd.DataFrame(data)
+    return pd.DataFrame.from_records([r.as_tuple() for r in data], columns=list(first.FIELDS))
+
+
+def write_to_excel(results_dict: Dict[str, List[Record]], output_file: Optional[str] = None) -> None:
     """将查询结果写入Excel文件"""
+    import pandas as pd  # 延迟导入，离线子命令无需加载 pandas
+
     output_file = output_file or get_current_time_filename()
     has_data = any(bool(data) for data in results_dict.values())
     
@@ -299,7 +108,7 @@ def write_to_excel(results_dict: Dict[str, List[Dict]], output_file: Optional[st
         else:
             for sheet_name, data in results_dict.items():
                 if data:
-                    df = pd.DataFrame(data)
+                    df = _to_frame(data)
                     # Excel工作表名称最大31字符
                     safe_name = sheet_name[:31]
                     df.to_excel(writer, sheet_name=safe_name, index=False)
@@ -307,10 +116,33 @@ def write_to_excel(results_dict: Dict[str, List[Dict]], output_file: Optional[st
     logger.info(f"结果已保存至：{output_file}")
 
 
-def load_proxies() -> List[str]:
+def write_to_csv(results_dict: Dict[str, List[Record]], output_file: str) -> None:
+    """将查询结果按类型写入 CSV 文件（<文件名>_<类型>.csv），逐行写出不经过 DataFrame"""
+    stem = os.path.splitext(output_file)[0]
+    for query_type, data in results_dict.items():
+        if not data:
+            continue
+        path = f"{stem}_{query_type}.csv"
+        # utf-8-sig：Excel 直接打开不乱码
+        with open(path, "w", encoding="utf-8-sig", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(data[0].FIELDS)
+            writer.writerows(r.as_tuple() for r in data)
+        logger.info(f"结果已保存至：{path}")
+
+
+def write_results(results_dict: Dict[str, List[Record]], output_file: Optional[str] = None) -> None:
+    """按输出文件扩展名选择写出格式（.csv 为 CSV，其余为 Excel）"""
+    if output_file and output_file.lower().endswith(".csv"):
+        write_to_csv(results_dict, output_file)
+    else:
+        write_to_excel(results_dict, output_file)
+
+
+def load_proxies(path: str = PROXY_FILE) -> List[str]:
     """从proxy.txt加载代理列表（自动去重）"""
     try:
-        with open('proxy.txt', 'r') as f:
+        with open(path, 'r') as f:
             proxies = [line.strip() for line in f if line.strip()]
         # 去重且保持顺序
         seen = set()
@@ -324,7 +156,7 @@ def load_proxies() -> List[str]:
         logger.info(f"已加载 {len(unique)} 个代理（去重前 {len(proxies)} 个）")
         return unique
     except FileNotFoundError:
-        logger.warning("未找到proxy.txt文件，不使用代理")
+        logger.warning(f"未找到{path}文件，不使用代理")
         return []
 
 